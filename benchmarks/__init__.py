@@ -0,0 +1,10 @@
+"""
+Benchmarks for the Voting System.
+
+Each module can be run from the project root, e.g.::
+
+    python -m benchmarks.bench_vote
+
+Benchmarks run against a throwaway test database and print one JSON object
+per measurement so results can be compared between runs.
+"""
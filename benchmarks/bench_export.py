@@ -0,0 +1,74 @@
+"""
+Benchmark the streaming vote export.
+
+Exports N votes in each format and reports throughput and peak Python heap
+use (tracemalloc); peak memory should stay flat as N grows.
+
+Usage:
+    python -m benchmarks.bench_export [--votes 1000 100000]
+"""
+
+import argparse
+import tracemalloc
+
+from benchmarks.harness import emit, test_database, timer
+
+
+def seed_votes(count):
+    """Insert ``count`` votes spread over a handful of candidates."""
+    from votes_app.models import Candidate, CandidateTally, Vote, Voter
+
+    candidates = [
+        Candidate.objects.create(name=f"Candidate {i}", party=f"Party {i % 3}")
+        for i in range(5)
+    ]
+    Voter.objects.bulk_create(
+        (Voter(uid=f"V{i}", name=f"Voter {i}") for i in range(count)),
+        batch_size=5000,
+    )
+    voter_ids = Voter.objects.order_by('id').values_list('id', flat=True).iterator()
+    Vote.objects.bulk_create(
+        (Vote(voter_id=voter_id, candidate=candidates[i % 5]) for i, voter_id in enumerate(voter_ids)),
+        batch_size=5000,
+    )
+    for candidate in candidates:
+        CandidateTally.objects.filter(candidate=candidate).update(
+            vote_count=Vote.objects.filter(candidate=candidate).count(),
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--votes', type=int, nargs='+', default=[1000, 100000])
+    args = parser.parse_args()
+
+    for count in args.votes:
+        with test_database():
+            from votes_app.exports import EXPORT_FORMATS, export_rows, stream_export
+
+            seed_votes(count)
+            for fmt in EXPORT_FORMATS:
+                try:
+                    chunks = stream_export(export_rows(), fmt)
+                except ImportError:
+                    continue
+                tracemalloc.start()
+                size = 0
+                with timer() as elapsed:
+                    for chunk in chunks:
+                        size += len(chunk)
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                emit(
+                    'export',
+                    format=fmt,
+                    votes=count,
+                    bytes=size,
+                    seconds=round(elapsed['seconds'], 3),
+                    rows_per_second=round(count / elapsed['seconds']),
+                    peak_heap_kb=round(peak / 1024),
+                )
+
+
+if __name__ == '__main__':
+    main()
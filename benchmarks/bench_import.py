@@ -0,0 +1,75 @@
+"""
+Benchmark bulk ballot ingestion.
+
+Generates a CSV upload of N ballots (a small share of them duplicates or for
+unknown candidates) and reports rows per second through
+``parse_ballots`` + ``import_ballots``, both for voters that are already on
+the roll and for voters registered during the import.
+
+Usage:
+    python -m benchmarks.bench_import [--ballots N] [--chunk-size C]
+"""
+
+import argparse
+import io
+import random
+
+from benchmarks.harness import emit, test_database, timer
+
+
+def make_upload(ballots, candidate_ids, seed=0):
+    """Build a CSV upload with ~1% duplicate and ~1% invalid-candidate rows."""
+    rng = random.Random(seed)
+    buffer = io.StringIO()
+    buffer.write('voter_uid,candidate_id,timestamp\n')
+    for i in range(ballots):
+        uid = f"V{rng.randrange(i)}" if i and rng.random() < 0.01 else f"V{i}"
+        candidate_id = -1 if rng.random() < 0.01 else rng.choice(candidate_ids)
+        buffer.write(f"{uid},{candidate_id},2025-01-01T{i % 24:02d}:00:00Z\n")
+    buffer.seek(0)
+    return buffer
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--ballots', type=int, default=50000)
+    parser.add_argument('--chunk-size', type=int, default=None)
+    args = parser.parse_args()
+
+    for registered in (True, False):
+        with test_database():
+            run(args.ballots, args.chunk_size, registered)
+
+
+def run(ballots, chunk_size, registered):
+    """Import one generated upload and emit the measurements."""
+    from votes_app.ballots import IMPORT_CHUNK_SIZE, import_ballots, parse_ballots
+    from votes_app.models import Candidate, Voter
+    from votes_app.tallies import verify_tallies
+
+    candidate_ids = [
+        Candidate.objects.create(name=f"Candidate {i}", party=f"Party {i % 3}").id
+        for i in range(10)
+    ]
+    if registered:
+        Voter.objects.bulk_create(Voter(uid=f"V{i}", name=f"Voter {i}") for i in range(ballots))
+    upload = make_upload(ballots, candidate_ids)
+    chunk_size = chunk_size or IMPORT_CHUNK_SIZE
+
+    with timer() as elapsed:
+        result = import_ballots(parse_ballots(upload, 'csv'), chunk_size=chunk_size)
+
+    emit(
+        'import_ballots_registered' if registered else 'import_ballots_new_voters',
+        rows=ballots,
+        chunk_size=chunk_size,
+        accepted=result['accepted'],
+        rejected=result['rejected'],
+        seconds=round(elapsed['seconds'], 3),
+        rows_per_second=round(ballots / elapsed['seconds']),
+        tallies_consistent=not verify_tallies(),
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,206 @@
+"""
+Load-test the read endpoints under the WSGI and ASGI handlers.
+
+Drives Django's real ``WSGIHandler`` from a pool of threads (like a threaded
+WSGI server) and its ``ASGIHandler`` from concurrent coroutines on one event
+loop (like uvicorn), with the same request mix, and reports throughput and
+latency percentiles for each. Runs in-process, so no server needs to be
+installed; network and HTTP parsing costs are left out of both sides.
+
+By default the chart cache is warmed first, so serving is measured rather
+than matplotlib; with ``--cold`` it is cleared before every run instead, so
+the first requests of each run wait on a render.
+
+Usage:
+    python -m benchmarks.bench_serving [--requests N] [--concurrency 1 16 64] [--cold]
+"""
+
+import argparse
+import asyncio
+import io
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.harness import emit, test_database, timer
+
+# Read endpoints served by async views
+ENDPOINTS = {
+    'results': '/results/',
+    'analytics': '/analytics/',
+    'chart_bar': '/chart/?format=png',
+    'chart_line': '/chart/line/?format=png',
+}
+
+
+def seed(candidates, votes):
+    """Create candidates and cast ``votes`` ballots spread across them."""
+    from votes_app.ballots import import_ballots
+    from votes_app.models import Candidate
+
+    candidate_ids = [
+        Candidate.objects.create(name=f"Candidate {i}", party=f"Party {i % 3}").id
+        for i in range(candidates)
+    ]
+    import_ballots(
+        (i + 2, f"V{i}", candidate_ids[i % candidates], None, None)
+        for i in range(votes)
+    )
+
+
+def wsgi_request(handler, path):
+    """Send one GET through ``handler`` and return the status code."""
+    path, _, query = path.partition('?')
+    environ = {
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': path,
+        'QUERY_STRING': query,
+        'SCRIPT_NAME': '',
+        'SERVER_NAME': 'testserver',
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'wsgi.input': io.BytesIO(),
+        'wsgi.errors': io.StringIO(),
+        'wsgi.url_scheme': 'http',
+        'wsgi.version': (1, 0),
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    status = []
+    body = handler(environ, lambda s, headers, exc_info=None: status.append(s))
+    try:
+        for _ in body:
+            pass
+    finally:
+        if hasattr(body, 'close'):
+            body.close()
+    return int(status[0].split()[0])
+
+
+async def asgi_request(application, path):
+    """Send one GET through ``application`` and return the status code."""
+    path, _, query = path.partition('?')
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'root_path': '',
+        'query_string': query.encode(),
+        'headers': [(b'host', b'testserver')],
+        'server': ('testserver', 80),
+        'client': ('127.0.0.1', 50000),
+    }
+    messages = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+    status = []
+    done = asyncio.Event()
+
+    async def receive():
+        if messages:
+            return messages.pop()
+        # Only reached once the response is complete
+        await done.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            status.append(message['status'])
+        elif not message.get('more_body'):
+            done.set()
+
+    await application(scope, receive, send)
+    return status[0]
+
+
+def run_wsgi(path, requests, concurrency):
+    """Issue ``requests`` GETs from ``concurrency`` threads; return latencies."""
+    from django.core.handlers.wsgi import WSGIHandler
+
+    handler = WSGIHandler()
+
+    def timed(_):
+        start = time.perf_counter()
+        status = wsgi_request(handler, path)
+        return status, time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return list(pool.map(timed, range(requests)))
+
+
+def run_asgi(path, requests, concurrency):
+    """Issue ``requests`` GETs from ``concurrency`` coroutines; return latencies."""
+    from django.core.handlers.asgi import ASGIHandler
+
+    application = ASGIHandler()
+
+    async def client(count, results):
+        for _ in range(count):
+            start = time.perf_counter()
+            status = await asgi_request(application, path)
+            results.append((status, time.perf_counter() - start))
+
+    async def main():
+        results = []
+        share, extra = divmod(requests, concurrency)
+        await asyncio.gather(*(
+            client(share + (i < extra), results) for i in range(concurrency)
+        ))
+        return results
+
+    return asyncio.run(main())
+
+
+def report(handler, endpoint, concurrency, cold, results, seconds):
+    """Emit throughput and latency percentiles for one run."""
+    latencies = sorted(latency for _, latency in results)
+    errors = sum(status >= 400 for status, _ in results)
+    centiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    emit(
+        'serving',
+        handler=handler,
+        endpoint=endpoint,
+        concurrency=concurrency,
+        cold=cold,
+        requests=len(results),
+        errors=errors,
+        requests_per_second=round(len(results) / seconds, 1),
+        p50_ms=round(centiles[49] * 1000, 2),
+        p95_ms=round(centiles[94] * 1000, 2),
+        p99_ms=round(centiles[98] * 1000, 2),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 16, 64])
+    parser.add_argument('--candidates', type=int, default=8)
+    parser.add_argument('--votes', type=int, default=5000)
+    parser.add_argument('--cold', action='store_true', help="Clear the chart cache before every run")
+    args = parser.parse_args()
+
+    with test_database():
+        from django.core.handlers.wsgi import WSGIHandler
+        from votes_app.chart_cache import chart_cache
+
+        seed(args.candidates, args.votes)
+        runners = {'wsgi': run_wsgi, 'asgi': run_asgi}
+        for endpoint, path in ENDPOINTS.items():
+            for concurrency in args.concurrency:
+                for handler, run in runners.items():
+                    if args.cold:
+                        chart_cache.clear()
+                    else:
+                        # Warm the chart cache so only serving is measured
+                        wsgi_request(WSGIHandler(), path)
+                    with timer() as elapsed:
+                        results = run(path, args.requests, concurrency)
+                    report(handler, endpoint, concurrency, args.cold, results, elapsed['seconds'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""
+Benchmark worker cold start.
+
+Boots a fresh interpreter per run, loads what a web worker loads before its
+first request (settings, apps, the WSGI handler and the URLconf, which
+imports every view) and reports wall time, total import time as measured by
+``python -X importtime``, peak RSS and which heavy libraries got loaded.
+
+Scenarios:
+- ``worker``: the current tree
+- ``worker_eager_stack``: the same, plus numpy, pandas and matplotlib's
+  pyplot imported up front, which is what ``views.py`` used to do at import
+  time (the "before" numbers)
+- ``manage_check``: ``manage.py check``, which also loads the URLconf, as
+  every management command start-up does
+
+Usage:
+    python -m benchmarks.bench_startup [--runs N]
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+from benchmarks.harness import PROJECT_ROOT, emit
+
+# Libraries that dominated start-up before the views were split
+HEAVY_MODULES = ('numpy', 'pandas', 'matplotlib', 'pyarrow')
+
+WORKER = """
+import os, time
+start = time.perf_counter()
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'voting_project.settings')
+{preload}
+import voting_project.wsgi
+from django.urls import get_resolver
+get_resolver().url_patterns
+"""
+
+MANAGE_CHECK = """
+import os, sys, time
+start = time.perf_counter()
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'voting_project.settings')
+from django.core.management import execute_from_command_line
+execute_from_command_line(['manage.py', 'check', '--verbosity', '0'])
+"""
+
+REPORT = """
+import json, resource, sys
+print(json.dumps({{
+    'seconds': time.perf_counter() - start,
+    'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    'heavy_modules': [m for m in {heavy!r} if m in sys.modules],
+}}))
+"""
+
+SCENARIOS = {
+    'worker': WORKER.format(preload=''),
+    'worker_eager_stack': WORKER.format(
+        preload="import numpy, pandas, matplotlib\nmatplotlib.use('Agg')\nimport matplotlib.pyplot",
+    ),
+    'manage_check': MANAGE_CHECK,
+}
+
+
+def total_import_time(stderr):
+    """Sum the cumulative time (in microseconds) of top-level imports."""
+    total = 0
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        _, cumulative, name = line.split('|')
+        # Nested imports are indented; only count the outermost ones
+        if cumulative.strip().isdigit() and not name.startswith('  '):
+            total += int(cumulative)
+    return total
+
+
+def run_once(code):
+    """Run ``code`` in a fresh interpreter; return its report and import time."""
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code + REPORT.format(heavy=HEAVY_MODULES)],
+        cwd=PROJECT_ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    result['import_us'] = total_import_time(completed.stderr)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    for scenario, code in SCENARIOS.items():
+        runs = [run_once(code) for _ in range(args.runs)]
+        emit(
+            'startup',
+            scenario=scenario,
+            runs=args.runs,
+            wall_ms=round(statistics.median(r['seconds'] for r in runs) * 1000, 1),
+            import_ms=round(statistics.median(r['import_us'] for r in runs) / 1000, 1),
+            max_rss_mb=round(statistics.median(r['max_rss_kb'] for r in runs) / 1024, 1),
+            heavy_modules=runs[-1]['heavy_modules'],
+        )
+
+
+if __name__ == '__main__':
+    main()
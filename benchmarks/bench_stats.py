@@ -0,0 +1,77 @@
+"""
+Benchmark the vectorized analytics statistics.
+
+Times ``stats.summarize`` on synthetic tallies of N candidates (no database
+involved) against the per-candidate Python loop the analytics and results
+views used to run (mean/median via ``np.array`` of model attributes plus a
+percentage per candidate).
+
+Usage:
+    python -m benchmarks.bench_stats [--candidates 10 1000 10000]
+"""
+
+import argparse
+import statistics
+import timeit
+
+from benchmarks.harness import emit, setup_django
+
+
+def synthetic_tallies(count):
+    """Build ``load_tallies``-shaped columns for ``count`` candidates."""
+    import numpy as np
+
+    rng = np.random.default_rng(0)
+    votes = np.sort(rng.zipf(1.5, size=count).astype(np.int64))[::-1]
+    return {
+        'ids': list(range(1, count + 1)),
+        'names': [f"Candidate {i}" for i in range(count)],
+        'parties': [f"Party {i % 25}" for i in range(count)],
+        'party_index': np.arange(count, dtype=np.int64) % 25,
+        'votes': votes,
+    }
+
+
+def legacy_statistics(rows):
+    """The loops the views ran before ``stats`` existed."""
+    import numpy as np
+
+    vote_counts = np.array([row['vote_count'] for row in rows])
+    mean_votes = np.mean(vote_counts)
+    median_votes = np.median(vote_counts)
+    total = sum(row['vote_count'] for row in rows)
+    for row in rows:
+        row['percentage'] = round(row['vote_count'] / total * 100, 2)
+    return mean_votes, median_votes
+
+
+def best_of(func, repeat=7):
+    """Return the median seconds per call of ``func``."""
+    number = max(1, int(0.05 / max(timeit.timeit(func, number=1), 1e-7)))
+    return statistics.median(timeit.repeat(func, number=number, repeat=repeat)) / number
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--candidates', type=int, nargs='+', default=[10, 1000, 10000])
+    args = parser.parse_args()
+
+    setup_django()
+    from votes_app.stats import summarize
+
+    for count in args.candidates:
+        tallies = synthetic_tallies(count)
+        rows = [
+            {'vote_count': int(v), 'party': p}
+            for v, p in zip(tallies['votes'], tallies['parties'])
+        ]
+        emit(
+            'stats',
+            candidates=count,
+            summarize_us=round(best_of(lambda: summarize(tallies)) * 1e6, 1),
+            legacy_loop_us=round(best_of(lambda: legacy_statistics(rows)) * 1e6, 1),
+        )
+
+
+if __name__ == '__main__':
+    main()
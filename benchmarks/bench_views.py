@@ -0,0 +1,136 @@
+"""
+Micro-benchmark every view against a synthetic election.
+
+Seeds a fresh database with ``benchmarks.datagen`` and requests each view
+through Django's test client: once cold, then ``--repeat`` more times. For
+each view it reports the database queries of a warm request, the cold and
+median warm wall time, and the peak Python heap (tracemalloc) of one more
+request. Ballots are cast by registered voters who haven't voted yet, so
+every ``vote`` and ``upload_ballots`` request writes. The live results
+stream never ends and is left out.
+
+Usage:
+    python -m benchmarks.bench_views [--voters N] [--candidates M] [--repeat R] [--only VIEW ...]
+"""
+
+import argparse
+import statistics
+import tracemalloc
+from itertools import islice
+from unittest import mock
+
+from benchmarks.datagen import generate
+from benchmarks.harness import capture_queries, emit, test_database, timer
+
+# Ballots per bulk upload request
+UPLOAD_BALLOTS = 100
+
+
+def view_requests(candidate_ids, abstainers):
+    """
+    Return ``{name: request}``, where ``request(client)`` makes one request.
+
+    ``vote`` and ``upload_ballots`` take the next unused abstainer UIDs on
+    every call.
+    """
+    uids = iter(abstainers)
+
+    def vote(client):
+        return client.post('/vote/', {'voter_uid': next(uids), 'candidate_id': candidate_ids[0]})
+
+    def upload_ballots(client):
+        body = 'voter_uid,candidate_id\n' + ''.join(
+            f"{uid},{candidate_ids[i % len(candidate_ids)]}\n"
+            for i, uid in enumerate(islice(uids, UPLOAD_BALLOTS))
+        )
+        return client.post(
+            '/ballots/import/', body, content_type='text/csv',
+            headers={'Authorization': 'Bearer bench'},
+        )
+
+    def get(path):
+        return lambda client: client.get(path)
+
+    return {
+        'home': get('/'),
+        'home_uid': get('/?uid=V0'),
+        'vote': vote,
+        'upload_ballots': upload_ballots,
+        'results': get('/results/'),
+        'analytics': get('/analytics/'),
+        'analytics_stats': get('/analytics/stats/'),
+        'analytics_timeseries': get('/analytics/timeseries/?granularity=hour&window=7d'),
+        'generate_chart': get('/chart/?format=png'),
+        'generate_pie_chart': get('/chart/pie/?format=png'),
+        'generate_horizontal_chart': get('/chart/horizontal/?format=png'),
+        'generate_party_chart': get('/chart/party/?format=png'),
+        'generate_line_chart': get('/chart/line/?format=png'),
+        'chart_data': get('/chart/data/'),
+        'export_results': get('/export/'),
+        'metrics': lambda client: client.get('/metrics', headers={'Authorization': 'Bearer bench'}),
+        'audit_digest': get('/audit/?seq=0'),
+    }
+
+
+def run(client, request):
+    """Make one request, read the whole body and return the status code."""
+    response = request(client)
+    if response.streaming:
+        for _ in response.streaming_content:
+            pass
+    return response.status_code
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--voters', type=int, default=10000)
+    parser.add_argument('--candidates', type=int, default=8)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--only', nargs='+', help="Views to run (default: all)")
+    args = parser.parse_args()
+
+    with test_database():
+        from django.test import Client, override_settings
+
+        from votes_app.metrics import request_metrics
+
+        # Enough abstainers for every write request, with some left over
+        writes = (args.repeat + 2) * (UPLOAD_BALLOTS + 1)
+        summary = generate(voters=args.voters + writes, candidates=args.candidates,
+                           turnout=args.voters / (args.voters + writes))
+        requests = view_requests(summary['candidate_ids'], summary['abstainers'])
+        client = Client()
+
+        with override_settings(BALLOT_IMPORT_TOKEN='bench'), mock.patch.object(request_metrics, 'token', 'bench'):
+            for name, request in requests.items():
+                if args.only and name not in args.only:
+                    continue
+
+                with timer() as cold:
+                    status = run(client, request)
+                warm = []
+                for _ in range(args.repeat):
+                    with capture_queries() as queries, timer() as elapsed:
+                        run(client, request)
+                    warm.append(elapsed['seconds'])
+
+                tracemalloc.start()
+                run(client, request)
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+
+                emit(
+                    'views',
+                    view=name,
+                    voters=args.voters,
+                    candidates=args.candidates,
+                    status=status,
+                    queries=len(queries),
+                    cold_ms=round(cold['seconds'] * 1000, 2),
+                    median_ms=round(statistics.median(warm) * 1000, 3),
+                    peak_heap_kb=round(peak / 1024, 1),
+                )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+Benchmark the vote casting path.
+
+Compares the legacy check-then-insert flow (get_or_create, exists, get,
+create + full_clean) against ``ballots.cast_vote`` and reports statements
+and wall time per ballot. Exits with an error if ``cast_vote`` issues more
+statements for a registered voter than ``ballots.CAST_VOTE_BUDGET`` allows.
+
+Usage:
+    python -m benchmarks.bench_vote [--ballots N] [--candidates M]
+"""
+
+import argparse
+import sys
+
+from benchmarks.harness import capture_queries, emit, test_database, timer
+
+
+def legacy_cast(voter_uid, candidate_id):
+    """The original ``vote`` view logic, kept here for comparison."""
+    from votes_app.models import Candidate, Voter, Vote
+
+    voter, created = Voter.objects.get_or_create(
+        uid=voter_uid, defaults={'name': f"Voter {voter_uid}"},
+    )
+    if Vote.objects.filter(voter=voter).exists():
+        return
+    candidate = Candidate.objects.get(id=candidate_id)
+    Vote.objects.create(voter=voter, candidate=candidate)
+
+
+def run_path(name, cast, uids, candidate_ids):
+    """
+    Cast one ballot per UID with ``cast`` and emit the measurements.
+    
+    Returns:
+        float: Statements issued per ballot
+    """
+    queries = 0
+    with timer() as elapsed:
+        for i, uid in enumerate(uids):
+            with capture_queries() as statements:
+                cast(uid, candidate_ids[i % len(candidate_ids)])
+            queries += len(statements)
+    emit(
+        name,
+        ballots=len(uids),
+        queries_per_vote=round(queries / len(uids), 2),
+        ms_per_vote=round(elapsed['seconds'] * 1000 / len(uids), 3),
+    )
+    return queries / len(uids)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--ballots', type=int, default=500)
+    parser.add_argument('--candidates', type=int, default=5)
+    args = parser.parse_args()
+
+    with test_database():
+        from votes_app.ballots import CAST_VOTE_BUDGET, AlreadyVoted, cast_vote
+        from votes_app.models import Candidate, Voter
+
+        candidate_ids = [
+            Candidate.objects.create(name=f"Candidate {i}", party=f"Party {i % 3}").id
+            for i in range(args.candidates)
+        ]
+
+        def cast_or_ignore(uid, candidate_id):
+            try:
+                cast_vote(uid, candidate_id)
+            except AlreadyVoted:
+                pass
+
+        registered = [f"REG{i}" for i in range(args.ballots)]
+        Voter.objects.bulk_create(Voter(uid=uid, name=uid) for uid in registered)
+
+        run_path('legacy_new_voter', legacy_cast, [f"OLD{i}" for i in range(args.ballots)], candidate_ids)
+        per_vote = run_path('cast_vote_registered_voter', cast_or_ignore, registered, candidate_ids)
+        run_path('cast_vote_new_voter', cast_or_ignore, [f"NEW{i}" for i in range(args.ballots)], candidate_ids)
+        run_path('cast_vote_duplicate', cast_or_ignore, registered, candidate_ids)
+
+    budget = sum(CAST_VOTE_BUDGET.values())
+    if per_vote > budget:
+        sys.exit(
+            f"cast_vote issued {per_vote:.2f} statements per registered voter's ballot, "
+            f"over its budget of {budget} (see ballots.CAST_VOTE_BUDGET)"
+        )
+
+
+if __name__ == '__main__':
+    main()
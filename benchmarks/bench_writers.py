@@ -0,0 +1,171 @@
+"""
+Benchmark concurrent vote writers under each database configuration.
+
+Starts N writer processes (like N WSGI workers) that cast their share of the
+ballots through ``ballots.cast_vote`` at the same time, and reports votes
+per second, latency percentiles and how many ballots failed (e.g. with
+"database is locked"). Every run gets a fresh database and is started in its
+own interpreter, since the configuration is read from the environment by
+``settings.DATABASES``.
+
+Configurations:
+- ``sqlite_default``: SQLite's defaults (rollback journal, deferred
+  transactions, Python's 5 s busy timeout), i.e. the settings before the
+  database configuration became environment-driven
+- ``sqlite_tuned``: WAL, busy_timeout, synchronous=NORMAL, mmap and
+  BEGIN IMMEDIATE (the default)
+- ``postgresql`` and ``postgresql_pool``: persistent connections vs a
+  psycopg pool; only run with ``--postgres``, against the server described
+  by the DB_* variables in the environment (a ``test_`` database is created
+  and dropped)
+
+Usage:
+    python -m benchmarks.bench_writers [--writers 1 4 16] [--ballots N] [--postgres]
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.harness import PROJECT_ROOT, emit, setup_django
+
+# Environment overrides per configuration
+CONFIGS = {
+    'sqlite_default': {'DB_ENGINE': 'sqlite', 'DB_SQLITE_TUNING': '0', 'DB_CONN_MAX_AGE': '0'},
+    'sqlite_tuned': {'DB_ENGINE': 'sqlite', 'DB_SQLITE_TUNING': '1'},
+    'postgresql': {'DB_ENGINE': 'postgresql'},
+    'postgresql_pool': {'DB_ENGINE': 'postgresql', 'DB_POOL_MAX_SIZE': '4'},
+}
+
+CANDIDATES = 5
+
+
+def write_ballots(uids, candidate_ids, barrier, results):
+    """Writer process: cast a ballot for every UID, then report timings."""
+    setup_django()
+    from django.db import DatabaseError, connection
+    from votes_app.ballots import cast_vote
+
+    # Connect before the start line so set-up isn't measured
+    connection.ensure_connection()
+    barrier.wait()
+    latencies = []
+    errors = []
+    for i, uid in enumerate(uids):
+        start = time.perf_counter()
+        try:
+            cast_vote(uid, candidate_ids[i % len(candidate_ids)])
+        except DatabaseError as e:
+            errors.append(str(e))
+        latencies.append(time.perf_counter() - start)
+    results.put({'latencies': latencies, 'errors': errors, 'finished': time.perf_counter()})
+
+
+def run_config(config, writers, ballots):
+    """Set up a fresh database, race ``writers`` processes and emit the result."""
+    setup_django()
+    from django.core.management import call_command
+    from django.db import connection
+    from votes_app.models import Candidate, Vote, Voter
+
+    test_name = None
+    if connection.vendor == 'sqlite':
+        call_command('migrate', verbosity=0)
+    else:
+        test_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        # Spawned writers inherit the environment, not this process's settings
+        os.environ['DB_NAME'] = test_name
+
+    try:
+        candidate_ids = [
+            Candidate.objects.create(name=f"Candidate {i}", party=f"Party {i % 3}").id
+            for i in range(CANDIDATES)
+        ]
+        uids = [f"W{i}" for i in range(ballots)]
+        Voter.objects.bulk_create(Voter(uid=uid, name=f"Voter {uid}") for uid in uids)
+        connection.close()
+
+        context = multiprocessing.get_context('spawn')
+        barrier = context.Barrier(writers + 1)
+        results = context.Queue()
+        processes = [
+            context.Process(target=write_ballots, args=(uids[i::writers], candidate_ids, barrier, results))
+            for i in range(writers)
+        ]
+        for process in processes:
+            process.start()
+        barrier.wait()
+        start = time.perf_counter()
+        reports = [results.get(timeout=600) for _ in processes]
+        for process in processes:
+            process.join()
+
+        seconds = max(report['finished'] for report in reports) - start
+        latencies = sorted(latency for report in reports for latency in report['latencies'])
+        errors = [error for report in reports for error in report['errors']]
+        centiles = statistics.quantiles(latencies, n=100)
+        recorded = Vote.objects.count()
+        emit(
+            'writers',
+            config=config,
+            vendor=connection.vendor,
+            writers=writers,
+            ballots=ballots,
+            recorded=recorded,
+            errors=len(errors),
+            first_error=errors[0] if errors else None,
+            votes_per_second=round(recorded / seconds, 1),
+            p50_ms=round(centiles[49] * 1000, 2),
+            p99_ms=round(centiles[98] * 1000, 2),
+            max_ms=round(latencies[-1] * 1000, 2),
+        )
+    finally:
+        if test_name:
+            connection.creation.destroy_test_db(test_name, verbosity=0)
+
+
+def launch(config, writers, ballots):
+    """Run one configuration in a fresh interpreter; return its result line."""
+    with tempfile.TemporaryDirectory() as directory:
+        env = {**os.environ, **CONFIGS[config]}
+        if env['DB_ENGINE'] == 'sqlite':
+            env['DB_NAME'] = str(Path(directory) / 'bench.sqlite3')
+        completed = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.bench_writers',
+             '--run', config, '--writers', str(writers), '--ballots', str(ballots)],
+            cwd=PROJECT_ROOT,
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--writers', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--ballots', type=int, default=2000)
+    parser.add_argument('--postgres', action='store_true', help="Also run the PostgreSQL configurations")
+    parser.add_argument('--run', choices=CONFIGS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        run_config(args.run, args.writers[0], args.ballots)
+        return
+
+    configs = [name for name in CONFIGS if args.postgres or name.startswith('sqlite')]
+    for config in configs:
+        for writers in args.writers:
+            print(json.dumps(launch(config, writers, args.ballots)), flush=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""
+Compare two benchmark runs and flag regressions.
+
+Every benchmark prints JSON lines; save a run with ``> baseline.jsonl`` and
+compare a later one against it. Results are matched on the benchmark name
+and their parameters (the non-metric fields, e.g. ``view`` or ``writers``).
+Metrics are recognised by their names: ``*_per_second`` should go up, while
+times (``_ms``, ``_us``, ``seconds``), memory (``_kb``, ``_mb``, ``bytes``),
+``queries`` and ``errors`` should go down. A metric that moves the wrong way
+by more than ``--threshold`` (relative) is a regression; query and error
+counts regress on any increase.
+
+Usage:
+    python -m benchmarks.bench_views > baseline.jsonl
+    ...
+    python -m benchmarks.bench_views > current.jsonl
+    python -m benchmarks.compare baseline.jsonl current.jsonl [--threshold 0.1] [--fail]
+"""
+
+import argparse
+import json
+import re
+import sys
+
+HIGHER_IS_BETTER = re.compile(r'per_second$')
+LOWER_IS_BETTER = re.compile(r'(^|_)(ms|us|kb|mb|seconds|bytes|queries|errors)(_|$)')
+# Counts that must not grow at all, whatever the threshold
+EXACT = re.compile(r'(^|_)(queries|errors)(_|$)')
+
+
+def metric_direction(name):
+    """Return 1 if ``name`` should go up, -1 if it should go down, else None."""
+    if HIGHER_IS_BETTER.search(name):
+        return 1
+    if LOWER_IS_BETTER.search(name):
+        return -1
+    return None
+
+
+def load(path):
+    """Read a JSON lines result file into ``{key: metrics}``."""
+    results = {}
+    with open(path) as lines:
+        for line in lines:
+            line = line.strip()
+            if not line.startswith('{'):
+                continue
+            record = json.loads(line)
+            params = tuple(sorted(
+                (name, json.dumps(value)) for name, value in record.items()
+                if metric_direction(name) is None
+            ))
+            results[params] = {
+                name: value for name, value in record.items()
+                if metric_direction(name) is not None and isinstance(value, (int, float))
+            }
+    return results
+
+
+def compare(baseline, current, threshold):
+    """
+    Yield a row per metric present in both runs.
+
+    Returns:
+        iterator: ``(key, metric, old, new, change, regressed)`` tuples, where
+        ``change`` is relative (None when ``old`` is 0)
+    """
+    for key, metrics in current.items():
+        for name, new in metrics.items():
+            old = baseline.get(key, {}).get(name)
+            if old is None:
+                continue
+            change = (new - old) / abs(old) if old else None
+            worse = (new - old) * metric_direction(name) < 0
+            if EXACT.search(name):
+                regressed = worse
+            else:
+                regressed = worse and (change is None or abs(change) > threshold)
+            yield key, name, old, new, change, regressed
+
+
+def describe(key):
+    """Render a result key as ``benchmark[param=value ...]``."""
+    params = dict(key)
+    benchmark = json.loads(params.pop('benchmark', '"?"'))
+    details = ' '.join(f"{name}={json.loads(value)}" for name, value in params.items())
+    return f"{benchmark}[{details}]" if details else benchmark
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('baseline')
+    parser.add_argument('current')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help="Relative change tolerated before flagging (default 0.1)")
+    parser.add_argument('--fail', action='store_true', help="Exit with status 1 on a regression")
+    args = parser.parse_args()
+
+    baseline, current = load(args.baseline), load(args.current)
+    regressions = 0
+    for key, name, old, new, change, regressed in compare(baseline, current, args.threshold):
+        regressions += regressed
+        change = f"{change:+.1%}" if change is not None else 'n/a'
+        flag = '  REGRESSION' if regressed else ''
+        print(f"{describe(key)} {name}: {old} -> {new} ({change}){flag}")
+    for key in baseline.keys() - current.keys():
+        # E.g. a view whose status code changed
+        print(f"{describe(key)}: missing from {args.current}")
+    print(f"{regressions} regression(s)")
+    if args.fail and regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""
+Synthetic election data for the benchmarks.
+
+Creates M candidates and N registered voters, of whom a ``turnout`` share
+cast a ballot. Support follows a Zipf-like distribution (candidate ``k`` gets
+a share proportional to ``1 / k ** skew``, so a couple of front-runners take
+most of the votes) and ballots are spread over the last ``days`` days with a
+daytime peak. Ballots go through ``import_ballots``, so tallies and rollups
+are consistent with the Vote table exactly as in production.
+
+Voters who vote have UIDs ``V0``, ``V1``, ...; registered voters who haven't
+voted yet are ``A0``, ``A1``, ... and are what the view benchmarks and the
+load driver cast fresh ballots with.
+
+Used as a library by the other benchmarks, or from the command line to seed
+the configured database for ``benchmarks.load`` (point ``DB_NAME`` at a
+scratch file first; the database is migrated but not emptied):
+
+Usage:
+    DB_NAME=/tmp/load.sqlite3 python -m benchmarks.datagen [--voters N] [--candidates M] [--days D] [--skew S]
+"""
+
+import argparse
+import datetime
+import random
+
+from benchmarks.harness import emit, setup_django, timer
+
+PARTIES = ['Blue Party', 'Red Party', 'Green Party', 'Independent']
+
+# Relative activity per hour of day (UTC): quiet at night, peaking at lunch
+# and after work
+HOURLY_WEIGHTS = [1, 1, 1, 1, 1, 2, 4, 7, 9, 9, 9, 10, 12, 10, 9, 9, 10, 12, 12, 10, 7, 5, 3, 2]
+
+
+def generate(voters=10000, candidates=8, days=7, skew=1.2, turnout=0.8, seed=0):
+    """
+    Populate the current database with a synthetic election.
+
+    Args:
+        voters (int): Registered voters
+        candidates (int): Candidates standing
+        days (int): Days the ballots are spread over, ending now
+        skew (float): Zipf exponent of candidate support (0 = uniform)
+        turnout (float): Share of voters who have voted (0..1)
+        seed (int): Random seed, so runs are comparable
+
+    Returns:
+        dict: ``voters``, ``candidates``, ``ballots`` and ``seconds``, plus
+        ``candidate_ids`` and ``abstainers`` (UIDs of registered voters
+        without a ballot)
+    """
+    from django.utils import timezone
+    from votes_app.ballots import import_ballots
+    from votes_app.models import Candidate, Voter
+
+    rng = random.Random(seed)
+    with timer() as elapsed:
+        # One by one so each candidate gets its tally row
+        candidate_ids = [
+            Candidate.objects.create(name=f"Candidate {i}", party=PARTIES[i % len(PARTIES)]).id
+            for i in range(candidates)
+        ]
+        ballots = int(voters * turnout)
+        abstainers = [f"A{i}" for i in range(voters - ballots)]
+        Voter.objects.bulk_create(
+            (Voter(uid=uid, name=f"Voter {uid}") for uid in abstainers),
+            batch_size=5000,
+        )
+
+        support = [1 / (rank + 1) ** skew for rank in range(candidates)]
+        choices = rng.choices(candidate_ids, weights=support, k=ballots)
+        end = timezone.now().replace(minute=0, second=0, microsecond=0)
+        start = end - datetime.timedelta(days=days)
+        # Ballots carry their own timestamps; import_ballots registers the voters
+        import_ballots(
+            (i + 2, f"V{i}", candidate_id, _ballot_time(rng, start, days), None)
+            for i, candidate_id in enumerate(choices)
+        )
+
+    return {
+        'voters': voters,
+        'candidates': candidates,
+        'ballots': ballots,
+        'seconds': elapsed['seconds'],
+        'candidate_ids': candidate_ids,
+        'abstainers': abstainers,
+    }
+
+
+def _ballot_time(rng, start, days):
+    """Return a random time within ``days`` days of ``start``, following ``HOURLY_WEIGHTS``."""
+    day = rng.randrange(days)
+    hour = rng.choices(range(24), weights=HOURLY_WEIGHTS)[0]
+    return start + datetime.timedelta(days=day, hours=hour, seconds=rng.randrange(3600))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--voters', type=int, default=10000)
+    parser.add_argument('--candidates', type=int, default=8)
+    parser.add_argument('--days', type=int, default=7)
+    parser.add_argument('--skew', type=float, default=1.2)
+    parser.add_argument('--turnout', type=float, default=0.8)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.core.management import call_command
+
+    call_command('migrate', verbosity=0)
+    summary = generate(args.voters, args.candidates, args.days, args.skew, args.turnout, args.seed)
+    emit(
+        'datagen',
+        voters=summary['voters'],
+        candidates=summary['candidates'],
+        ballots=summary['ballots'],
+        abstainers=len(summary['abstainers']),
+        seconds=round(summary['seconds'], 3),
+    )
+
+
+if __name__ == '__main__':
+    main()
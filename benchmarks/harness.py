@@ -0,0 +1,96 @@
+"""
+Shared helpers for the benchmark scripts.
+
+Provides Django bootstrapping, a throwaway test database, query counting
+and machine-readable (JSON lines) result output.
+"""
+
+import json
+import os
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+# Make the project importable when run as ``python -m benchmarks.<name>``
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+# Transaction control statements aren't round trips that do work
+TRANSACTION_CONTROL = ('BEGIN', 'COMMIT', 'ROLLBACK', 'SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')
+
+
+def setup_django():
+    """Configure settings and initialise Django."""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'voting_project.settings')
+    import django
+    django.setup()
+
+
+@contextmanager
+def test_database():
+    """
+    Create a fresh test database for the duration of the block.
+
+    SQLite test databases are files in a temporary directory rather than
+    in memory: background threads (e.g. the audit log sealer) write to the
+    database too, and an in-memory database fails them with "database table
+    is locked" instead of waiting like a file does.
+    """
+    setup_django()
+    from django.core.management import call_command
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    with tempfile.TemporaryDirectory() as directory:
+        if connection.vendor == 'sqlite':
+            connection.settings_dict['TEST']['NAME'] = str(Path(directory) / 'bench.sqlite3')
+        setup_test_environment(debug=False)
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        # Make sure every block starts empty
+        call_command('flush', interactive=False, verbosity=0)
+        try:
+            yield connection
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+
+@contextmanager
+def capture_queries():
+    """
+    Capture the SQL executed inside the block.
+    
+    Yields a list that is filled with the executed statements, excluding
+    transaction control (BEGIN/COMMIT/SAVEPOINT...).
+    """
+    from django.db import connection, reset_queries
+    from django.test.utils import CaptureQueriesContext
+
+    # The query log is a bounded deque; start empty so long runs stay accurate
+    reset_queries()
+    statements = []
+    with CaptureQueriesContext(connection) as ctx:
+        yield statements
+    statements.extend(
+        query['sql'] for query in ctx.captured_queries
+        if not query['sql'].upper().startswith(TRANSACTION_CONTROL)
+    )
+
+
+@contextmanager
+def timer():
+    """Yield a dict whose ``seconds`` key is set when the block exits."""
+    result = {}
+    start = time.perf_counter()
+    try:
+        yield result
+    finally:
+        result['seconds'] = time.perf_counter() - start
+
+
+def emit(benchmark, **metrics):
+    """Print a single benchmark result as a JSON line."""
+    print(json.dumps({'benchmark': benchmark, **metrics}, default=str), flush=True)
@@ -0,0 +1,195 @@
+"""
+Multi-process HTTP load driver for a running server.
+
+Points concurrent voter and reader processes at a live server (``runserver``,
+gunicorn or uvicorn) for ``--duration`` seconds over keep-alive connections:
+- voters fetch the voting form once for a CSRF token, then keep POSTing
+  ballots to ``/vote/`` for the seeded abstainers ``A0``, ``A1``, ... (split
+  between processes; past the seeded ones, new voters are registered)
+- readers GET a weighted mix of the results, analytics, chart and
+  timeseries endpoints
+
+Reports requests, errors (HTTP >= 400 and dropped connections), throughput and
+latency percentiles per endpoint and in total. Nothing Django-specific runs
+here, so the server is measured as deployed. Seed the server's database with
+``benchmarks.datagen`` first, and again before repeating a run.
+
+Usage:
+    DB_NAME=/tmp/load.sqlite3 python -m benchmarks.datagen
+    DB_NAME=/tmp/load.sqlite3 uvicorn voting_project.asgi:application --workers 4
+    python -m benchmarks.load --url http://127.0.0.1:8000 [--voters 4] [--readers 8] [--duration 30]
+"""
+
+import argparse
+import http.client
+import json
+import multiprocessing
+import random
+import statistics
+import time
+from collections import defaultdict
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode, urlsplit
+
+from benchmarks.harness import emit
+
+# Reader traffic: (endpoint name, path, relative weight)
+READ_MIX = [
+    ('results', '/results/', 40),
+    ('analytics', '/analytics/', 15),
+    ('analytics_stats', '/analytics/stats/', 15),
+    ('chart', '/chart/?format=png', 15),
+    ('timeseries', '/analytics/timeseries/?granularity=hour&window=24h', 15),
+]
+
+
+class Session:
+    """A keep-alive HTTP connection that reconnects when the server drops it."""
+
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.cookies = {}
+        self.connection = None
+
+    def request(self, method, path, body=None, headers=None):
+        """Send a request, read the response and return ``(status, body)``."""
+        if self.connection is None:
+            self.connection = http.client.HTTPConnection(self.host, self.port, timeout=30)
+        headers = dict(headers or {})
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f"{name}={value}" for name, value in self.cookies.items())
+        try:
+            self.connection.request(method, path, body=body, headers=headers)
+            response = self.connection.getresponse()
+            data = response.read()
+        except (OSError, http.client.HTTPException):
+            self.connection.close()
+            self.connection = None
+            raise
+        for header in response.headers.get_all('Set-Cookie') or []:
+            for name, morsel in SimpleCookie(header).items():
+                self.cookies[name] = morsel.value
+        if response.will_close:
+            self.connection.close()
+            self.connection = None
+        return response.status, data
+
+
+def voter(url, index, processes, candidate_ids, duration, barrier, results):
+    """Voter process: cast ballots for ``duration`` seconds."""
+    session = Session(url)
+    session.request('GET', '/')
+    token = session.cookies.get('csrftoken', '')
+    headers = {'Content-Type': 'application/x-www-form-urlencoded', 'X-CSRFToken': token}
+    samples = defaultdict(list)
+    errors = defaultdict(int)
+
+    barrier.wait()
+    deadline = time.perf_counter() + duration
+    ballot = index
+    while time.perf_counter() < deadline:
+        body = urlencode({'voter_uid': f"A{ballot}", 'candidate_id': random.choice(candidate_ids)})
+        ballot += processes
+        start = time.perf_counter()
+        try:
+            status, _ = session.request('POST', '/vote/', body=body, headers=headers)
+        except (OSError, http.client.HTTPException):
+            status = None
+        samples['vote'].append(time.perf_counter() - start)
+        if status is None or status >= 400:
+            errors['vote'] += 1
+    results.put((dict(samples), dict(errors)))
+
+
+def reader(url, index, processes, candidate_ids, duration, barrier, results):
+    """Reader process: GET the ``READ_MIX`` endpoints for ``duration`` seconds."""
+    session = Session(url)
+    rng = random.Random(index)
+    names, paths, weights = zip(*READ_MIX)
+    samples = defaultdict(list)
+    errors = defaultdict(int)
+
+    barrier.wait()
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        choice = rng.choices(range(len(names)), weights=weights)[0]
+        start = time.perf_counter()
+        try:
+            status, _ = session.request('GET', paths[choice])
+        except (OSError, http.client.HTTPException):
+            status = None
+        samples[names[choice]].append(time.perf_counter() - start)
+        if status is None or status >= 400:
+            errors[names[choice]] += 1
+    results.put((dict(samples), dict(errors)))
+
+
+def candidate_ids(url):
+    """Read the candidate IDs from the server's statistics endpoint."""
+    status, body = Session(url).request('GET', '/analytics/stats/')
+    if status != 200:
+        raise SystemExit(f"{url}/analytics/stats/ answered {status}; is the server running and seeded?")
+    return json.loads(body)['candidate_ids']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--voters', type=int, default=4, help="Voter processes")
+    parser.add_argument('--readers', type=int, default=8, help="Reader processes")
+    parser.add_argument('--duration', type=float, default=30.0, help="Seconds of load")
+    args = parser.parse_args()
+
+    ids = candidate_ids(args.url)
+    context = multiprocessing.get_context('spawn')
+    # Everyone starts the clock together once all processes are connected
+    barrier = context.Barrier(args.voters + args.readers + 1)
+    results = context.Queue()
+    processes = [
+        context.Process(target=target, args=(args.url, i, count, ids, args.duration, barrier, results))
+        for target, count in ((voter, args.voters), (reader, args.readers))
+        for i in range(count)
+    ]
+    for process in processes:
+        process.start()
+    barrier.wait()
+    start = time.perf_counter()
+    reports = [results.get(timeout=args.duration + 120) for _ in processes]
+    seconds = time.perf_counter() - start
+    for process in processes:
+        process.join()
+
+    samples = defaultdict(list)
+    errors = defaultdict(int)
+    for process_samples, process_errors in reports:
+        for name, latencies in process_samples.items():
+            samples[name].extend(latencies)
+        for name, count in process_errors.items():
+            errors[name] += count
+    samples['total'] = [latency for name in list(samples) for latency in samples[name]]
+    errors['total'] = sum(errors.values())
+
+    for name, latencies in samples.items():
+        if len(latencies) < 2:
+            continue
+        centiles = statistics.quantiles(latencies, n=100)
+        emit(
+            'load',
+            endpoint=name,
+            url=args.url,
+            voters=args.voters,
+            readers=args.readers,
+            duration=args.duration,
+            requests=len(latencies),
+            errors=errors[name],
+            requests_per_second=round(len(latencies) / seconds, 1),
+            p50_ms=round(centiles[49] * 1000, 2),
+            p95_ms=round(centiles[94] * 1000, 2),
+            p99_ms=round(centiles[98] * 1000, 2),
+        )
+
+
+if __name__ == '__main__':
+    main()
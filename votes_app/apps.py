@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class VotesAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'votes_app'
+    
+    def ready(self):
+        # Register signal handlers that keep CandidateTally in step with Vote
+        from . import signals  # noqa: F401
@@ -0,0 +1,437 @@
+"""
+Audit log sealing, reads and verification for the Voting System application.
+
+Every vote write is staged for a Merkle tree log (``models.AuditEntry``,
+see ``merkle`` for the hashing) in its own transaction, and staged writes
+are sealed into the log in batches, so the log's head is locked once per
+batch rather than once per vote:
+- imports seal after each chunk (``ballots.import_ballots``, which the vote
+  journal drains through)
+- single writes schedule ``audit_sealer``, which seals everything staged
+  ``DELAY`` seconds after the first of them commits
+- ``manage.py verify_votes`` seals before verifying
+
+This module also reads the log:
+- ``current_digest`` returns the size and root of the log, read from
+  ``AuditHead`` in one query however long the log is, and how many writes
+  are still waiting to be sealed
+- ``inclusion_proof`` proves that an entry is in the tree of a given size
+  with the O(log n) stored nodes on its path, so anyone holding a published
+  root can check a ballot without the rest of the log
+- ``verify_log`` checks the log against the votes and the stored tree: the
+  log is split into chunks aligned on perfect subtrees, each verified on
+  its own (``verify_chunk``, in worker processes with ``workers`` > 1), and
+  the chunk roots are folded into the root of the whole log
+
+An entry matches when hashing the current vote reproduces its leaf (a
+retraction matches when the vote is gone). An entry that no longer matches
+because a later entry records a newer write of the same vote is superseded,
+not a problem. Anything else (votes changed or deleted behind the
+application's back, votes missing from the log, altered entries or nodes)
+is reported.
+"""
+
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.conf import settings
+from django.db import connection
+from django.db.models import Exists, Max, OuterRef, Q
+
+from . import merkle
+from .models import AuditEntry, AuditHead, AuditNode, PendingAuditEntry, Vote
+
+logger = logging.getLogger(__name__)
+
+# Entries verified per task; a power of two so chunks are perfect subtrees
+VERIFY_CHUNK_SIZE = 65536
+
+# Votes fetched per query while verifying a chunk
+VOTE_BATCH_SIZE = 5000
+
+# Problems listed per kind in a verification report
+MAX_PROBLEMS = 1000
+
+
+class AuditError(Exception):
+    """Raised for a proof or verification request outside the log."""
+
+
+class AuditSealer:
+    """
+    Debounced sealing of staged vote writes into the audit log.
+    
+    Attributes:
+        delay (float): Seconds to wait after a write commits before
+            sealing, so a burst of votes is sealed in one batch
+        batch_size (int): Most writes sealed per transaction
+        seals (int): Sealing passes run by this process
+    """
+    
+    def __init__(self, delay=0.5, batch_size=AuditEntry.SEAL_BATCH_SIZE):
+        self.delay = delay
+        self.batch_size = batch_size
+        self.seals = 0
+        self._timer = None
+        self._lock = threading.Lock()
+    
+    @classmethod
+    def from_settings(cls):
+        """Build a sealer from ``settings.AUDIT_LOG``."""
+        options = getattr(settings, 'AUDIT_LOG', {})
+        return cls(
+            delay=options.get('SEAL_DELAY', 0.5),
+            batch_size=options.get('SEAL_BATCH_SIZE', AuditEntry.SEAL_BATCH_SIZE),
+        )
+    
+    def schedule(self):
+        """
+        Seal the staged writes in ``delay`` seconds unless a pass is pending.
+        
+        Safe to call from any thread.
+        """
+        with self._lock:
+            if self._timer is not None:
+                return
+            self._timer = threading.Timer(self.delay, self._seal_scheduled)
+            self._timer.daemon = True
+            self._timer.start()
+    
+    def seal(self):
+        """
+        Seal everything staged so far.
+        
+        Returns:
+            int: Number of entries appended to the log
+        """
+        self.seals += 1
+        return AuditEntry.seal(self.batch_size)
+    
+    def _seal_scheduled(self):
+        """Timer callback: seal, logging rather than raising failures."""
+        with self._lock:
+            # Writes committed from now on need another pass
+            self._timer = None
+        try:
+            self.seal()
+        except Exception:
+            # The writes stay staged for the next pass
+            logger.exception("Failed to seal the audit log")
+        finally:
+            connection.close()
+
+
+def current_head():
+    """Return the log's ``AuditHead``, or an unsaved empty one."""
+    try:
+        return AuditHead.objects.get(pk=AuditHead.SINGLETON)
+    except AuditHead.DoesNotExist:
+        return AuditHead(pk=AuditHead.SINGLETON)
+
+
+def current_digest():
+    """
+    Return the size and root of the audit log.
+    
+    Returns:
+        dict: ``size`` and hex ``root``, with the ``algorithm`` and
+        ``tree`` format needed to check proofs against it, and the number
+        of writes ``pending`` (staged but not sealed into the log yet)
+    """
+    head = current_head()
+    return {
+        'algorithm': 'sha256',
+        'tree': 'rfc6962',
+        'size': head.size,
+        'root': bytes(head.root).hex(),
+        'updated_at': head.updated_at.isoformat() if head.updated_at else None,
+        'pending': PendingAuditEntry.objects.count(),
+    }
+
+
+def inclusion_proof(seq, size=None):
+    """
+    Prove that entry ``seq`` is in the tree of the first ``size`` entries.
+    
+    Args:
+        seq (int): Position of the entry
+        size (int): Size of the tree to prove inclusion in, e.g. one whose
+            root was published earlier (default: the current size)
+    
+    Returns:
+        dict: The entry (``seq``, ``vote_id``, ``action``, hex ``leaf``),
+        ``size``, hex ``root`` of that tree and the hex ``path``, bottom
+        up; ``merkle.root_from_proof`` turns the leaf and path back into
+        the root
+    
+    Raises:
+        AuditError: If the log has no tree of ``size`` entries or no entry ``seq``
+    """
+    head = current_head()
+    size = head.size if size is None else size
+    if not 0 < size <= head.size:
+        raise AuditError(f"The audit log has {head.size} entries, so no tree of {size}.")
+    if not 0 <= seq < size:
+        raise AuditError(f"No entry {seq} in a tree of {size} entries.")
+    
+    groups = merkle.proof_nodes(seq, size)
+    peaks = merkle.peak_positions(0, size)
+    digests = _stored_digests({(0, seq), *peaks, *(position for group in groups for position in group)})
+    entry = AuditEntry.objects.values('seq', 'vote_id', 'action').get(seq=seq)
+    return {
+        **entry,
+        'leaf': digests[(0, seq)].hex(),
+        'size': size,
+        'root': merkle.fold([digests[position] for position in peaks]).hex(),
+        'path': [merkle.fold([digests[position] for position in group]).hex() for group in groups],
+    }
+
+
+def _stored_digests(positions):
+    """
+    Fetch the stored digests of tree positions.
+    
+    Args:
+        positions (iterable): ``(level, index)`` pairs; level 0 are entries
+    
+    Returns:
+        dict: Digest per position found
+    """
+    positions = set(positions)
+    leaves = [index for level, index in positions if level == 0]
+    nodes = Q()
+    for level, index in positions:
+        if level:
+            nodes |= Q(level=level, index=index)
+    digests = {
+        (0, seq): bytes(digest)
+        for seq, digest in AuditEntry.objects.filter(seq__in=leaves).values_list('seq', 'digest')
+    }
+    if nodes:
+        digests.update(
+            ((level, index), bytes(digest))
+            for level, index, digest in AuditNode.objects.filter(nodes).values_list('level', 'index', 'digest')
+        )
+    return digests
+
+
+def verify_chunk(start, stop):
+    """
+    Verify entries ``[start, stop)`` against the votes and the stored nodes.
+    
+    ``start`` must be a multiple of the chunk size (a power of two) and the
+    chunk no larger, so the nodes it completes lie entirely inside it.
+    
+    Returns:
+        dict: ``start``, ``stop``, the chunk's ``peaks`` as ``(level,
+        digest)`` pairs for folding into the whole tree, and ``problems``:
+        ``entries`` (``seq``, ``vote_id``, ``reason``) and ``nodes``
+        (``level``, ``index``, ``reason``)
+    """
+    entries = list(
+        AuditEntry.objects.filter(seq__gte=start, seq__lt=stop)
+        .order_by('seq')
+        .values_list('seq', 'vote_id', 'action', 'digest')
+    )
+    vote_ids = list({vote_id for _, vote_id, _, _ in entries})
+    votes = Vote.objects.order_by().values_list('id', 'voter__uid', 'candidate_id', 'timestamp')
+    if vote_ids and max(vote_ids) - min(vote_ids) < 2 * len(vote_ids):
+        # Entries mostly record votes in insertion order: scan their id range
+        batches = [votes.filter(id__gte=min(vote_ids), id__lte=max(vote_ids))]
+    else:
+        batches = [
+            votes.filter(id__in=vote_ids[offset:offset + VOTE_BATCH_SIZE])
+            for offset in range(0, len(vote_ids), VOTE_BATCH_SIZE)
+        ]
+    votes = {vote_id: rest for batch in batches for vote_id, *rest in batch}
+    
+    tree = merkle.MerkleAccumulator()
+    computed = {}
+    problems = {'entries': [], 'nodes': []}
+    expected = start
+    for seq, vote_id, action, digest in entries:
+        if seq != expected:
+            problems['entries'].extend(
+                {'seq': missing, 'vote_id': None, 'reason': "entry missing"} for missing in range(expected, seq)
+            )
+            # The tree can't be rebuilt past a gap
+            return {'start': start, 'stop': stop, 'peaks': None, 'problems': problems}
+        expected += 1
+        digest = bytes(digest)
+        vote = votes.get(vote_id)
+        if action == 'retract':
+            if vote is not None:
+                problems['entries'].append({'seq': seq, 'vote_id': vote_id, 'reason': "retracted vote exists"})
+        elif vote is None:
+            problems['entries'].append({'seq': seq, 'vote_id': vote_id, 'reason': "vote missing"})
+        elif merkle.leaf_hash(merkle.ballot_record(action, vote_id, *vote)) != digest:
+            problems['entries'].append({'seq': seq, 'vote_id': vote_id, 'reason': "vote differs from entry"})
+        for level, index, node in tree.push(digest):
+            computed[(level, (start >> level) + index)] = node
+    if expected != stop:
+        problems['entries'].extend(
+            {'seq': missing, 'vote_id': None, 'reason': "entry missing"} for missing in range(expected, stop)
+        )
+        return {'start': start, 'stop': stop, 'peaks': None, 'problems': problems}
+    
+    problems['nodes'] = _compare_nodes(computed)
+    peaks = [(level, digest) for (level, _), digest in zip(merkle.peak_positions(0, tree.size), tree.peaks)]
+    return {'start': start, 'stop': stop, 'peaks': peaks, 'problems': problems}
+
+
+def _compare_nodes(computed):
+    """
+    Compare recomputed nodes with the stored ones.
+    
+    Args:
+        computed (dict): Digest per ``(level, index)``
+    
+    Returns:
+        list: ``level``, ``index`` and ``reason`` of every node that is
+        missing or differs
+    """
+    if not computed:
+        return []
+    levels = {}
+    for level, index in computed:
+        low, high = levels.get(level, (index, index))
+        levels[level] = (min(low, index), max(high, index))
+    stored = {}
+    query = Q()
+    for level, (low, high) in levels.items():
+        query |= Q(level=level, index__gte=low, index__lte=high)
+    for level, index, digest in AuditNode.objects.filter(query).values_list('level', 'index', 'digest'):
+        stored[(level, index)] = bytes(digest)
+    
+    problems = []
+    for (level, index), digest in sorted(computed.items()):
+        if (level, index) not in stored:
+            problems.append({'level': level, 'index': index, 'reason': "node missing"})
+        elif stored[(level, index)] != digest:
+            problems.append({'level': level, 'index': index, 'reason': "node differs"})
+    return problems
+
+
+def _verify_range(bounds):
+    """``verify_chunk`` taking its bounds as one argument, for ``map``."""
+    return verify_chunk(*bounds)
+
+
+def verify_log(workers=1, chunk_size=VERIFY_CHUNK_SIZE, start=0, stop=None, progress=None):
+    """
+    Verify the audit log, or part of it, in parallel chunks.
+    
+    Entries written after verification starts are not checked, nor are
+    writes still staged (``manage.py verify_votes`` seals them first), but
+    their votes don't count as missing from the log. When the
+    whole log is verified, the chunk roots are folded into the tree's root
+    (checking the stored nodes above the chunks on the way) and compared
+    with the head, and votes that have no entry are looked for as well.
+    
+    Args:
+        workers (int): Processes verifying chunks; 1 verifies in this
+            process. Workers are spawned and open their own database
+            connections, so the database must be reachable from them (not
+            an in-memory SQLite database)
+        chunk_size (int): Entries per chunk, a power of two
+        start (int): First entry to verify (rounded down to a chunk boundary)
+        stop (int): Entry to stop before (default: the end of the log)
+        progress (callable): Called with the number of entries verified
+            after each chunk
+    
+    Returns:
+        dict: ``size`` (of the log when verification started), ``start``,
+        ``stop``, ``root_matches`` (None unless the whole log was verified),
+        ``superseded`` entries, ``unaudited`` votes (None unless the whole
+        log was verified) and the ``problems`` found (at most
+        ``MAX_PROBLEMS`` of each kind: ``entries``, ``nodes`` and
+        ``unaudited`` vote ids)
+    
+    Raises:
+        AuditError: If ``chunk_size`` is not a power of two
+    """
+    if chunk_size < 1 or chunk_size & (chunk_size - 1):
+        raise AuditError(f"The chunk size must be a power of two, not {chunk_size}.")
+    head = current_head()
+    stop = head.size if stop is None else min(stop, head.size)
+    start = max(start - start % chunk_size, 0)
+    ranges = [(low, min(low + chunk_size, stop)) for low in range(start, stop, chunk_size)]
+    whole = start == 0 and stop == head.size
+    
+    problems = {'entries': [], 'nodes': [], 'unaudited': []}
+    tree = merkle.MerkleAccumulator()
+    upper = {}
+    done = 0
+    pool = None
+    if workers > 1 and len(ranges) > 1:
+        pool = ProcessPoolExecutor(
+            max_workers=min(workers, len(ranges)),
+            mp_context=multiprocessing.get_context('spawn'),
+            # Referenced by the task, this module can only be imported once
+            # Django is set up in the worker
+            initializer=django.setup,
+        )
+    try:
+        results = pool.map(_verify_range, ranges) if pool else map(_verify_range, ranges)
+        for result in results:
+            for kind in ('entries', 'nodes'):
+                problems[kind].extend(result['problems'][kind])
+            if result['peaks'] is None:
+                whole = False
+            elif whole:
+                for level, digest in result['peaks']:
+                    upper.update(((level, index), node) for level, index, node in tree.push(digest, level))
+            done += result['stop'] - result['start']
+            if progress:
+                progress(done)
+    finally:
+        if pool:
+            pool.shutdown(cancel_futures=True)
+    
+    # Entries whose vote was written again since are expected to differ
+    stale = [problem for problem in problems['entries'] if problem['vote_id'] is not None]
+    latest = {}
+    vote_ids = list({problem['vote_id'] for problem in stale})
+    for offset in range(0, len(vote_ids), VOTE_BATCH_SIZE):
+        latest.update(
+            AuditEntry.objects.filter(vote_id__in=vote_ids[offset:offset + VOTE_BATCH_SIZE])
+            .values('vote_id')
+            .annotate(latest=Max('seq'))
+            .values_list('vote_id', 'latest')
+        )
+    problems['entries'] = [
+        problem for problem in problems['entries']
+        if problem['vote_id'] is None or problem['seq'] >= latest.get(problem['vote_id'], -1)
+    ]
+    superseded = len(stale) - sum(1 for problem in problems['entries'] if problem['vote_id'] is not None)
+    
+    root_matches = None
+    unaudited = None
+    if whole:
+        problems['nodes'] += _compare_nodes(upper)
+        root_matches = tree.size == head.size and tree.root() == bytes(head.root)
+        missing = Vote.objects.filter(
+            ~Exists(AuditEntry.objects.filter(vote_id=OuterRef('pk'))),
+            # Staged writes are in the log as soon as they are sealed
+            ~Exists(PendingAuditEntry.objects.filter(vote_id=OuterRef('pk'))),
+        ).order_by()
+        unaudited = missing.count()
+        problems['unaudited'] = list(missing.order_by('pk').values_list('pk', flat=True)[:MAX_PROBLEMS])
+    
+    return {
+        'size': head.size,
+        'start': start,
+        'stop': stop,
+        'root': bytes(head.root).hex(),
+        'root_matches': root_matches,
+        'superseded': superseded,
+        'unaudited': unaudited,
+        'problems': {kind: found[:MAX_PROBLEMS] for kind, found in problems.items()},
+    }
+
+
+# Process-wide sealer, scheduled by vote writes (see ``signals``)
+audit_sealer = AuditSealer.from_settings()
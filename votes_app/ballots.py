@@ -0,0 +1,468 @@
+"""
+Ballot casting for the Voting System application.
+
+``cast_vote`` is the hot path used by the ``vote`` view. Instead of checking
+for an existing vote before inserting (a check-then-insert race that also
+costs several queries), it relies on the ``unique_together = [['voter']]``
+constraint on Vote: the ballot is inserted directly and an IntegrityError is
+translated into ``AlreadyVoted``. Voters the voter cache already knows to
+have voted are turned away after a single existence check instead.
+
+For a registered voter the fast path issues these statements inside a
+single transaction (``CAST_VOTE_BUDGET`` says what each one is for):
+1. UPDATE the candidate's tally (zero rows means the candidate doesn't exist)
+2. INSERT the vote, resolving the voter from its UID with a subquery
+3. UPSERT the vote's minute, hour and day rollup buckets, in the same
+   transaction so the trend charts never miss a committed vote
+4. INSERT the vote's audit log leaf into the staging table
+   (``AuditEntry.stage``); nothing is locked, and the staged leaves are
+   sealed into the log in batches once they commit (see ``audit``)
+
+``import_ballots`` is the batch path used by polling stations that sync many
+ballots at once (the ``ballots/import/`` endpoint and ``manage.py
+import_ballots``). Voters and their existing votes are resolved with one
+query per chunk, and new voters and accepted ballots are written with
+multi-row ``INSERT ... RETURNING`` statements; tallies and rollups get one
+write per candidate and per batch of buckets rather than per ballot, and the
+audit log is sealed once per chunk.
+"""
+
+import csv
+import json
+from collections import Counter
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, connections, router, transaction
+from django.db.models import DateTimeField, Subquery
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .live import notify_tally_change
+from .models import AuditEntry, Candidate, CandidateTally, Voter, Vote, VoteRollup
+from .voter_cache import voter_cache
+
+
+# Statements ``cast_vote`` may issue for a registered voter, by purpose.
+# Anything added to the fast path has to raise the budget here;
+# ``benchmarks.bench_vote`` fails when the fast path goes over it.
+CAST_VOTE_BUDGET = {
+    # Tally UPDATE and vote INSERT
+    'ballot': 2,
+    # Rollup bucket UPSERT for the trend charts
+    'rollup': 1,
+    # Audit leaf INSERT into the staging table
+    'audit': 1,
+}
+
+
+class AlreadyVoted(Exception):
+    """
+    Raised when a voter tries to cast a second ballot.
+    
+    Attributes:
+        voter_name (str): Name of the voter who has already voted
+    """
+    
+    def __init__(self, voter_name):
+        self.voter_name = voter_name
+        super().__init__(f"Voter {voter_name} has already cast their vote!")
+
+
+def check_voter_fields(voter_uid, voter_name=None):
+    """
+    Check that a voter's UID and name fit the ``Voter`` columns.
+    
+    Databases that enforce column lengths (PostgreSQL) would otherwise fail
+    the insert that registers the voter with a DataError.
+    
+    Raises:
+        ValidationError: If either is longer than its column allows
+    """
+    for field, value in (('uid', voter_uid), ('name', voter_name)):
+        max_length = Voter._meta.get_field(field).max_length
+        if value and len(value) > max_length:
+            raise ValidationError(f"Voter {field} is longer than {max_length} characters.")
+
+
+def _insert_ballot(voter_uid, candidate_id):
+    """
+    Insert a single ballot and bump the candidate's tally and rollups atomically.
+    
+    Raises:
+        Candidate.DoesNotExist: If no candidate has ``candidate_id``
+        IntegrityError: If the voter is unknown or has already voted
+    """
+    with transaction.atomic():
+        tallied = CandidateTally.objects.filter(candidate_id=candidate_id).update(
+            **CandidateTally.changes(1)
+        )
+        if not tallied:
+            raise Candidate.DoesNotExist(f"Candidate {candidate_id} does not exist.")
+        
+        # save_base skips Vote.save, whose full_clean would repeat the
+        # duplicate-vote check the unique constraint already enforces
+        ballot = Vote(
+            voter_id=Subquery(Voter.objects.filter(uid=voter_uid).unordered().values('id')),
+            candidate_id=candidate_id,
+        )
+        ballot.save_base(force_insert=True)
+        VoteRollup.record([(candidate_id, ballot.timestamp)])
+        AuditEntry.stage([('cast', ballot.pk, voter_uid, candidate_id, ballot.timestamp)])
+        voter_cache.invalidate_on_commit(voter_uid)
+    return ballot
+
+
+def cast_vote(voter_uid, candidate_id, voter_name=None):
+    """
+    Record a ballot for ``voter_uid``, registering the voter if needed.
+    
+    Args:
+        voter_uid (str): Unique voter identifier
+        candidate_id (int): Primary key of the chosen candidate
+        voter_name (str): Name used if the voter has to be registered
+    
+    Returns:
+        Vote: The newly created vote
+    
+    Raises:
+        Candidate.DoesNotExist: If the candidate doesn't exist
+        AlreadyVoted: If the voter has already cast a ballot
+        ValidationError: If the UID or name is too long to be stored
+    """
+    check_voter_fields(voter_uid, voter_name)
+    cached = voter_cache.peek(voter_uid)
+    if cached is not None and cached.has_voted:
+        # The entry can be stale (the vote was deleted in another process),
+        # so confirm before turning the voter away
+        if Vote.objects.filter(voter_id=cached.id).exists():
+            raise AlreadyVoted(cached.name)
+        voter_cache.invalidate(voter_uid)
+    
+    try:
+        return _insert_ballot(voter_uid, candidate_id)
+    except IntegrityError:
+        pass
+    
+    # Slow path: either the voter isn't registered yet or already voted.
+    # The failed transaction was rolled back, so the tally is untouched.
+    voter, created = Voter.objects.get_or_create(
+        uid=voter_uid,
+        defaults={'name': voter_name or f"Voter {voter_uid}"},
+    )
+    if not created and Vote.objects.filter(voter=voter).exists():
+        raise AlreadyVoted(voter.name)
+    
+    try:
+        return _insert_ballot(voter_uid, candidate_id)
+    except IntegrityError:
+        # Lost a race with a concurrent ballot from the same voter
+        raise AlreadyVoted(voter.name)
+
+
+# Default number of ballots resolved and inserted per transaction
+IMPORT_CHUNK_SIZE = 2000
+
+# Report reason of a ballot from a voter who already has a vote
+ALREADY_VOTED = "Voter has already voted"
+
+# Supported upload formats
+BALLOT_FORMATS = ('csv', 'jsonl')
+
+
+def parse_ballots(lines, fmt='csv'):
+    """
+    Parse an upload of ballots into ``(line, voter_uid, candidate_id, timestamp, voter_name)``.
+    
+    CSV uploads must have a ``voter_uid,candidate_id,timestamp`` header; JSONL
+    uploads hold one object with those keys per line. ``timestamp`` is
+    optional (ISO 8601), and so is ``voter_name``, the name a voter who
+    isn't registered yet is registered with. Rows that can't be parsed, or
+    whose UID or name don't fit the ``Voter`` columns, are yielded with an
+    error message in place of the timestamp so they show up in the report.
+    
+    Args:
+        lines (iterable): Text lines of the upload
+        fmt (str): One of ``BALLOT_FORMATS``
+    
+    Yields:
+        tuple: ``(line_number, voter_uid, candidate_id, timestamp_or_error,
+        voter_name)``, ``voter_name`` being None when not given
+    """
+    if fmt not in BALLOT_FORMATS:
+        raise ValueError(f"Unsupported ballot format: {fmt}")
+    
+    if fmt == 'csv':
+        records = enumerate(csv.DictReader(lines), start=2)
+    else:
+        records = (
+            (number, line) for number, line in enumerate(lines, start=1)
+            if line.strip()
+        )
+    
+    for number, record in records:
+        try:
+            if fmt == 'jsonl':
+                record = json.loads(record)
+            voter_uid = (record.get('voter_uid') or '').strip()
+            voter_name = (record.get('voter_name') or '').strip() or None
+            candidate_id = int(record.get('candidate_id'))
+            timestamp = record.get('timestamp') or None
+            if timestamp is not None:
+                timestamp = parse_datetime(str(timestamp))
+                if timestamp is None:
+                    raise ValueError("invalid timestamp")
+                if timezone.is_naive(timestamp):
+                    timestamp = timezone.make_aware(timestamp)
+        except (AttributeError, TypeError, ValueError) as e:
+            yield number, None, None, ValueError(f"Malformed row: {e}"), None
+            continue
+        
+        if not voter_uid:
+            yield number, None, candidate_id, ValueError("Missing voter_uid"), None
+            continue
+        try:
+            check_voter_fields(voter_uid, voter_name)
+        except ValidationError as e:
+            yield number, voter_uid, candidate_id, ValueError(e.messages[0]), None
+            continue
+        yield number, voter_uid, candidate_id, timestamp, voter_name
+
+
+def _import_chunk(rows, candidate_ids):
+    """
+    Resolve and insert one chunk of parsed ballots in a single transaction.
+    
+    Returns:
+        tuple: ``(accepted, rejected)`` report entries for the chunk
+    """
+    rejected = []
+    pending = {}
+    names = {}
+    for number, voter_uid, candidate_id, timestamp, voter_name in rows:
+        if isinstance(timestamp, Exception):
+            rejected.append(_reject(number, voter_uid, str(timestamp)))
+        elif candidate_id not in candidate_ids:
+            rejected.append(_reject(number, voter_uid, "Unknown candidate"))
+        elif voter_uid in pending:
+            rejected.append(_reject(number, voter_uid, "Duplicate ballot in upload"))
+        else:
+            pending[voter_uid] = (number, candidate_id, timestamp)
+            names[voter_uid] = voter_name
+    
+    if not pending:
+        return [], rejected
+    
+    accepted = []
+    ballots = []
+    now = timezone.now()
+    with transaction.atomic():
+        # Resolve voter ids and existing votes in one query, registering
+        # unknown voters in bulk
+        voter_ids, voted = _resolve_voters(names)
+        
+        for voter_uid, (number, candidate_id, timestamp) in pending.items():
+            voter_id = voter_ids[voter_uid]
+            if voter_id in voted:
+                rejected.append(_reject(number, voter_uid, ALREADY_VOTED))
+                continue
+            accepted.append({
+                'line': number,
+                'voter_uid': voter_uid,
+                'status': 'accepted',
+                'candidate_id': candidate_id,
+            })
+            ballots.append((voter_id, candidate_id, timestamp or now))
+        
+        vote_ids = dict(_insert_rows(
+            Vote, ['voter_id', 'candidate_id', 'timestamp'], ballots, returning=['voter_id', 'id'],
+        ))
+        
+        # One tally UPDATE per candidate rather than per ballot
+        for candidate_id, count in Counter(entry['candidate_id'] for entry in accepted).items():
+            CandidateTally.adjust(candidate_id, count)
+        VoteRollup.record((candidate_id, timestamp) for _, candidate_id, timestamp in ballots)
+        AuditEntry.stage(
+            ('cast', vote_ids[voter_id], entry['voter_uid'], candidate_id, timestamp)
+            for entry, (voter_id, candidate_id, timestamp) in zip(accepted, ballots)
+        )
+        voter_cache.invalidate_on_commit(*(entry['voter_uid'] for entry in accepted))
+    
+    return accepted, rejected
+
+
+def _resolve_voters(names):
+    """
+    Map voter UIDs to ids, registering any that don't exist yet.
+    
+    Args:
+        names (dict): Name per UID, used (or ``Voter <uid>`` if None) for
+            voters that have to be registered, as in ``cast_vote``
+    
+    Returns:
+        tuple: Mapping of UID to voter id, and the set of ids of the voters
+        who already have a vote
+    """
+    voter_ids = {}
+    voted = set()
+    
+    def lookup(uids):
+        # The join to votes tells which voters already voted in the same query
+        rows = Voter.objects.filter(uid__in=uids).order_by().values_list('uid', 'id', 'votes')
+        for uid, voter_id, vote_id in rows:
+            voter_ids[uid] = voter_id
+            if vote_id is not None:
+                voted.add(voter_id)
+    
+    lookup(names)
+    missing = [uid for uid in names if uid not in voter_ids]
+    if missing:
+        registered_on = timezone.now()
+        voter_ids.update(_insert_rows(
+            Voter,
+            ['uid', 'name', 'registered_on'],
+            [(uid, names[uid] or f"Voter {uid}", registered_on) for uid in missing],
+            returning=['uid', 'id'],
+            conflict='uid',
+        ))
+        # Voters registered concurrently (by a live vote) return no row
+        raced = [uid for uid in missing if uid not in voter_ids]
+        if raced:
+            lookup(raced)
+    return voter_ids, voted
+
+
+def _insert_rows(model, columns, rows, returning, conflict=None):
+    """
+    Insert ``rows`` into ``model``'s table and return columns of the new rows.
+    
+    Rows are written with multi-row ``INSERT ... RETURNING`` statements, as
+    ``bulk_create`` would, but without building a model instance and
+    compiling each value through the ORM for every row, which took most of
+    the import's time. Only the values of ``DateTimeField`` columns need
+    preparing for the database.
+    
+    Args:
+        model (Model): Model whose table the rows go into
+        columns (list): Column names, in the order of each row's values
+        rows (list): Tuples of values
+        returning (list): Columns returned for each inserted row
+        conflict (str): Unique column whose conflicts skip the row
+            (``ON CONFLICT DO NOTHING``) instead of failing the statement
+    
+    Returns:
+        list: One tuple of ``returning`` values per inserted row
+    """
+    connection = connections[router.db_for_write(model)]
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    prepare = [
+        (index, model._meta.get_field(column))
+        for index, column in enumerate(columns)
+        if isinstance(model._meta.get_field(column), DateTimeField)
+    ]
+    if prepare:
+        # Imported ballots share few distinct timestamps: prepare each once
+        prepared = {}
+        rows = [list(row) for row in rows]
+        for row in rows:
+            for index, field in prepare:
+                value = row[index]
+                if value not in prepared:
+                    prepared[value] = field.get_db_prep_value(value, connection)
+                row[index] = prepared[value]
+    
+    placeholders = f"({', '.join(['%s'] * len(columns))})"
+    on_conflict = f" ON CONFLICT ({quote(conflict)}) DO NOTHING" if conflict else ""
+    batch_size = max(connection.ops.bulk_batch_size(columns, rows), 1)
+    inserted = []
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            cursor.execute(
+                f"INSERT INTO {table} ({', '.join(map(quote, columns))}) "
+                f"VALUES {', '.join([placeholders] * len(batch))}{on_conflict} "
+                f"RETURNING {', '.join(map(quote, returning))}",
+                [value for row in batch for value in row],
+            )
+            inserted.extend(cursor.fetchall())
+    return inserted
+
+
+def _reject(number, voter_uid, reason):
+    """Build a report entry for a rejected row."""
+    return {'line': number, 'voter_uid': voter_uid, 'status': 'rejected', 'reason': reason}
+
+
+def import_ballots(rows, chunk_size=IMPORT_CHUNK_SIZE):
+    """
+    Import parsed ballots in chunks.
+    
+    Each chunk is committed in its own transaction, together with the voters
+    it registers. A ballot is rejected if the row is malformed, its
+    candidate doesn't exist, or its voter already has a vote (in the
+    database or earlier in the same chunk). Unknown voters are registered on
+    the fly, as in ``cast_vote``.
+    
+    If the rows can't be read to the end (e.g. the upload isn't valid
+    UTF-8), the rows read before the failure are still imported and the
+    import stops there: chunks already committed stay committed, and the
+    report says where it stopped.
+    
+    Args:
+        rows (iterable): Rows as produced by ``parse_ballots``
+        chunk_size (int): Number of rows resolved and inserted per transaction
+    
+    Returns:
+        dict: ``accepted`` and ``rejected`` counts plus a per-row ``rows``
+        report ordered by line number; when reading failed, ``error`` holds
+        the ``line`` it failed at (counted like row lines) and the ``reason``
+    """
+    candidate_ids = set(Candidate.objects.values_list('id', flat=True))
+    report = []
+    accepted_count = 0
+    error = None
+    last_line = 0
+    rows = iter(rows)
+    
+    while error is None:
+        chunk = []
+        try:
+            chunk.extend(islice(rows, chunk_size))
+        except (ValueError, UnicodeDecodeError, csv.Error) as e:
+            error = {'line': (chunk[-1][0] if chunk else last_line) + 1, 'reason': str(e)}
+        if not chunk:
+            break
+        last_line = chunk[-1][0]
+        
+        for attempt in range(len(chunk) + 1):
+            try:
+                accepted, rejected = _import_chunk(chunk, candidate_ids)
+                break
+            except IntegrityError:
+                # A live vote for one of these voters landed between the
+                # duplicate check and the insert, or a candidate was deleted.
+                # The chunk was rolled back; retry it against the new state.
+                # Each retry follows a new conflicting write, so give up only
+                # once there have been more than the chunk has ballots.
+                if attempt == len(chunk):
+                    raise
+                candidate_ids = set(Candidate.objects.values_list('id', flat=True))
+        accepted_count += len(accepted)
+        if accepted:
+            # The raw inserts send no signals, so wake live viewers here
+            notify_tally_change()
+            # One lock of the audit log's head for the whole chunk
+            AuditEntry.seal()
+        report.extend(accepted)
+        report.extend(rejected)
+    
+    report.sort(key=lambda entry: entry['line'])
+    result = {
+        'accepted': accepted_count,
+        'rejected': len(report) - accepted_count,
+        'rows': report,
+    }
+    if error:
+        result['error'] = error
+    return result
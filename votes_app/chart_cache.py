@@ -0,0 +1,176 @@
+"""
+Rendered chart cache for the Voting System application.
+
+Rendering a chart costs hundreds of milliseconds of CPU, but its output only
+changes when the tallies do. ``ChartCache`` stores rendered bytes keyed by
+``(chart type, variant, tally version)``:
+- concurrent requests for the same missing key share one render (see
+  ``render_farm``)
+- memory is bounded by entry count and total bytes, evicting least recently
+  used entries first
+- entries can optionally be persisted to a directory so a restarted worker
+  starts warm
+
+Configured through ``settings.CHART_CACHE``.
+"""
+
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from django.conf import settings
+
+
+class ChartCache:
+    """
+    Bounded LRU cache of rendered charts with optional file persistence.
+    
+    Attributes:
+        max_entries (int): Maximum number of charts kept in memory
+        max_bytes (int): Maximum total size of charts kept in memory
+        directory (Path): Where charts are persisted, or None for memory only
+        hits (int): Lookups served from memory or disk
+        misses (int): Lookups that required a render
+    """
+    
+    def __init__(self, max_entries=64, max_bytes=32 * 1024 * 1024, directory=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.directory = Path(directory) if directory else None
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        if self.directory:
+            self.directory.mkdir(parents=True, exist_ok=True)
+    
+    @classmethod
+    def from_settings(cls):
+        """Build a cache from ``settings.CHART_CACHE``."""
+        options = getattr(settings, 'CHART_CACHE', {})
+        return cls(
+            max_entries=options.get('MAX_ENTRIES', 64),
+            max_bytes=options.get('MAX_BYTES', 32 * 1024 * 1024),
+            directory=options.get('DIRECTORY'),
+        )
+    
+    def get(self, chart_type, variant, version):
+        """Return cached bytes for the key, or None."""
+        key = (chart_type, variant, version)
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                return data
+        
+        data = self._read_file(key)
+        if data is not None:
+            self._remember(key, data)
+        return data
+    
+    def set(self, chart_type, variant, version, data):
+        """Store rendered bytes, replacing older versions of the same chart."""
+        key = (chart_type, variant, version)
+        self._remember(key, data)
+        self._write_file(key, data)
+    
+    def lookup(self, chart_type, variant, version):
+        """Like ``get``, but the hit or miss is counted in the statistics."""
+        data = self.get(chart_type, variant, version)
+        if data is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return data
+    
+    def latest(self, chart_type, variant):
+        """
+        Return ``(version, bytes)`` for the newest cached version of a chart.
+        
+        Used to serve a stale chart when a fresh one can't be rendered.
+        Returns None if no version of the chart is cached.
+        """
+        with self._lock:
+            versions = [k for k in self._entries if k[:2] == (chart_type, variant)]
+            if versions:
+                key = max(versions, key=lambda k: k[2])
+                return key[2], self._entries[key]
+        
+        if self.directory:
+            for path in self.directory.glob(f"{chart_type}-{variant}-v*.chart"):
+                version = path.stem.rsplit('-v', 1)[-1]
+                data = self._read_file((chart_type, variant, int(version))) if version.isdigit() else None
+                if data is not None:
+                    return int(version), data
+        return None
+    
+    def clear(self):
+        """Drop every cached chart, in memory and on disk."""
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+        if self.directory:
+            for path in self.directory.glob('*.chart'):
+                path.unlink(missing_ok=True)
+    
+    def _remember(self, key, data):
+        """Add an entry to the in-memory LRU and evict as needed."""
+        chart_type, variant, version = key
+        with self._lock:
+            # Older versions of this chart can never be requested again
+            stale = [
+                k for k in self._entries
+                if k[:2] == (chart_type, variant) and k[2] < version
+            ]
+            for k in stale:
+                self._size -= len(self._entries.pop(k))
+            
+            if key in self._entries:
+                self._size -= len(self._entries.pop(key))
+            self._entries[key] = data
+            self._size += len(data)
+            
+            while self._entries and (
+                len(self._entries) > self.max_entries or self._size > self.max_bytes
+            ):
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+    
+    def _path(self, key):
+        chart_type, variant, version = key
+        return self.directory / f"{chart_type}-{variant}-v{version}.chart"
+    
+    def _read_file(self, key):
+        if not self.directory:
+            return None
+        try:
+            return self._path(key).read_bytes()
+        except OSError:
+            return None
+    
+    def _write_file(self, key, data):
+        """Persist an entry atomically and remove older versions."""
+        if not self.directory:
+            return
+        path = self._path(key)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except OSError:
+            Path(tmp).unlink(missing_ok=True)
+            return
+        
+        chart_type, variant, version = key
+        for old in self.directory.glob(f"{chart_type}-{variant}-v*.chart"):
+            old_version = old.stem.rsplit('-v', 1)[-1]
+            if old_version.isdigit() and int(old_version) < version:
+                old.unlink(missing_ok=True)
+
+
+# Process-wide cache used by the chart views
+chart_cache = ChartCache.from_settings()
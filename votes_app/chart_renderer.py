@@ -0,0 +1,201 @@
+"""
+Chart drawing for the Voting System application.
+
+This module runs inside the render farm's worker processes (see
+``render_farm``) and is never imported by web workers, which therefore never
+load matplotlib. It doesn't import Django either: a worker gets plain
+labels/values and returns image bytes.
+
+Each worker process draws one chart at a time, so pyplot's global state
+needs no locking here.
+"""
+
+import io
+
+import matplotlib
+matplotlib.use('Agg')  # Use non-interactive backend
+import matplotlib.pyplot as plt
+
+
+def warm():
+    """
+    Worker initializer: draw a throwaway chart.
+    
+    Loads pyplot, the Agg backend and the font cache before the first real
+    request arrives.
+    """
+    render('bar', {'mode': 'candidates', 'labels': ['warm-up'], 'values': [1]}, 72, 'png')
+
+
+def render(chart_type, data, dpi, fmt):
+    """
+    Draw ``chart_type`` from ``data`` (see ``charts.load_chart_data``).
+    
+    Args:
+        chart_type (str): One of ``charts.CHART_TYPES``
+        data (dict): Plain labels/values
+        dpi (int): Rasterization DPI (see ``charts.CHART_SIZES``)
+        fmt (str): Image format, ``png`` or ``svg``
+    
+    Returns:
+        bytes: The chart as an image in ``fmt``
+    """
+    renderer = {
+        'bar': _draw_bar,
+        'pie': _draw_pie,
+        'horizontal': _draw_horizontal,
+        'party': _draw_party,
+        'line': _draw_line,
+    }[chart_type]
+    
+    fig = renderer(data['labels'], data['values'], data)
+    plt.tight_layout()
+    
+    # Save plot to BytesIO buffer
+    buffer = io.BytesIO()
+    plt.savefig(buffer, format=fmt, dpi=dpi, bbox_inches='tight')
+    
+    # Close plot to free memory
+    plt.close(fig)
+    return buffer.getvalue()
+
+
+def _draw_empty(figsize=(10, 6)):
+    """Draw a placeholder figure when there is nothing to plot."""
+    fig, ax = plt.subplots(figsize=figsize)
+    ax.text(0.5, 0.5, 'No votes yet', ha='center', va='center', fontsize=16)
+    ax.axis('off')
+    return fig
+
+
+def _draw_bar(candidates, votes, data):
+    """Bar chart showing votes per candidate."""
+    fig, ax = plt.subplots(figsize=(10, 6))
+    
+    bars = ax.bar(candidates, votes, color='skyblue', edgecolor='navy', alpha=0.7)
+    
+    ax.set_xlabel('Candidates', fontsize=12, fontweight='bold')
+    ax.set_ylabel('Number of Votes', fontsize=12, fontweight='bold')
+    ax.set_title('Voting Results by Candidate', fontsize=14, fontweight='bold')
+    ax.grid(axis='y', alpha=0.3, linestyle='--')
+    
+    # Rotate x-axis labels for better readability
+    plt.xticks(rotation=45, ha='right')
+    
+    # Add value labels on bars
+    for bar in bars:
+        height = bar.get_height()
+        ax.text(bar.get_x() + bar.get_width() / 2., height,
+                f'{int(height)}', ha='center', va='bottom')
+    return fig
+
+
+def _draw_pie(candidates, votes, data):
+    """Pie chart showing the share of votes per candidate."""
+    if not candidates:
+        return _draw_empty(figsize=(8, 8))
+    
+    fig, ax = plt.subplots(figsize=(10, 8))
+    colors = plt.cm.Set3(range(len(candidates)))
+    
+    wedges, texts, autotexts = ax.pie(
+        votes,
+        labels=candidates,
+        autopct='%1.1f%%',
+        colors=colors,
+        startangle=90,
+        textprops={'fontsize': 10, 'fontweight': 'bold'}
+    )
+    
+    ax.set_title('Vote Distribution by Candidate', fontsize=14, fontweight='bold', pad=20)
+    
+    # Make percentage text more visible
+    for autotext in autotexts:
+        autotext.set_color('white')
+        autotext.set_fontweight('bold')
+    return fig
+
+
+def _draw_horizontal(candidates, votes, data):
+    """Horizontal bar chart, more readable with many candidates."""
+    fig, ax = plt.subplots(figsize=(10, max(6, len(candidates) * 0.5)))
+    
+    bars = ax.barh(candidates, votes, color='lightcoral', edgecolor='darkred', alpha=0.7)
+    
+    ax.set_xlabel('Number of Votes', fontsize=12, fontweight='bold')
+    ax.set_ylabel('Candidates', fontsize=12, fontweight='bold')
+    ax.set_title('Voting Results - Horizontal Bar Chart', fontsize=14, fontweight='bold')
+    ax.grid(axis='x', alpha=0.3, linestyle='--')
+    
+    # Add value labels on bars
+    for bar in bars:
+        width = bar.get_width()
+        ax.text(width, bar.get_y() + bar.get_height() / 2.,
+                f' {int(width)}', ha='left', va='center', fontweight='bold')
+    return fig
+
+
+def _draw_party(parties, votes, data):
+    """Bar chart showing total votes per political party."""
+    if not parties:
+        return _draw_empty()
+    
+    fig, ax = plt.subplots(figsize=(10, 6))
+    
+    # Different colors for each party
+    colors = plt.cm.Pastel1(range(len(parties)))
+    bars = ax.bar(parties, votes, color=colors, edgecolor='black', alpha=0.8)
+    
+    ax.set_xlabel('Political Party', fontsize=12, fontweight='bold')
+    ax.set_ylabel('Total Votes', fontsize=12, fontweight='bold')
+    ax.set_title('Voting Results by Political Party', fontsize=14, fontweight='bold')
+    ax.grid(axis='y', alpha=0.3, linestyle='--')
+    
+    # Rotate x-axis labels for better readability
+    plt.xticks(rotation=45, ha='right')
+    
+    # Add value labels on bars
+    for bar in bars:
+        height = bar.get_height()
+        ax.text(bar.get_x() + bar.get_width() / 2., height,
+                f'{int(height)}', ha='center', va='bottom', fontweight='bold')
+    return fig
+
+
+def _draw_line(labels, values, data):
+    """
+    Line chart of votes cast per minute, hour or day.
+    
+    With fewer than two buckets of data, shows the distribution over
+    candidates instead.
+    """
+    if not labels:
+        return _draw_empty()
+    
+    fig, ax = plt.subplots(figsize=(12, 6))
+    
+    if data.get('mode') == 'dates':
+        ax.plot(labels, values, marker='o', linewidth=2, markersize=8, color='green')
+        ax.fill_between(labels, values, alpha=0.3, color='green')
+        granularity = data.get('granularity', 'day')
+        ax.set_xlabel('Date' if granularity == 'day' else 'Time (UTC)', fontsize=12, fontweight='bold')
+        ax.set_ylabel(f'Votes Cast per {granularity.title()}', fontsize=12, fontweight='bold')
+        ax.set_title('Voting Trends Over Time', fontsize=14, fontweight='bold')
+        ax.grid(True, alpha=0.3, linestyle='--')
+        plt.xticks(rotation=45, ha='right')
+        return fig
+    
+    x_pos = range(len(labels))
+    ax.plot(x_pos, values, marker='o', linewidth=2, markersize=8, color='steelblue')
+    ax.fill_between(x_pos, values, alpha=0.3, color='steelblue')
+    ax.set_xticks(x_pos)
+    ax.set_xticklabels(labels, rotation=45, ha='right')
+    ax.set_xlabel('Candidates', fontsize=12, fontweight='bold')
+    ax.set_ylabel('Number of Votes', fontsize=12, fontweight='bold')
+    ax.set_title('Vote Distribution - Line Chart', fontsize=14, fontweight='bold')
+    ax.grid(True, alpha=0.3, linestyle='--')
+    
+    # Add value labels
+    for i, vote in enumerate(values):
+        ax.text(i, vote, f' {int(vote)}', ha='left', va='bottom', fontweight='bold')
+    return fig
@@ -0,0 +1,197 @@
+"""
+Chart rendering for the Voting System application.
+
+Charts are produced in two steps:
+- ``load_chart_data`` (or ``aload_chart_data``) reads the plain numbers a
+  chart needs from the tallies
+- ``render_chart`` (or ``arender_chart``) has the render farm draw them with
+  matplotlib in a worker process and returns the image bytes
+
+The trend (``line``) chart is read from the vote rollups at a selectable
+granularity (see ``rollups``), so it costs O(buckets) rather than a scan
+over every ballot.
+
+``chart_payload`` (or ``achart_payload``) returns the numbers behind every
+chart in one compact structure, for pages that draw the charts in the
+browser instead.
+
+Keeping the data as plain lists/dicts means the rendered output depends only
+on that data and the requested size, so it can be cached per tally version
+(see ``chart_cache``) and shipped to another process cheaply. This module
+never imports matplotlib (see ``chart_renderer``).
+"""
+
+from .render_farm import render_farm
+from .rollups import DEFAULT_GRANULARITY, vote_timeseries
+from .tallies import candidate_tallies, party_tallies
+
+# Supported chart types, as used in the chart URLs
+CHART_TYPES = ('bar', 'pie', 'horizontal', 'party', 'line')
+
+# Output sizes, expressed as the rasterization DPI
+CHART_SIZES = {
+    'small': 72,
+    'medium': 100,
+    'large': 150,
+}
+DEFAULT_CHART_SIZE = 'medium'
+
+# Image formats and their content types
+CHART_FORMATS = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml',
+}
+
+# How trend chart buckets are labelled, per granularity
+TREND_LABEL_FORMATS = {
+    'minute': '%Y-%m-%d %H:%M',
+    'hour': '%Y-%m-%d %H:%M',
+    'day': '%Y-%m-%d',
+}
+
+
+def load_chart_data(chart_type, granularity=DEFAULT_GRANULARITY):
+    """
+    Load the data needed to draw ``chart_type``.
+    
+    Args:
+        granularity (str): Bucket width of the trend (``line``) chart, one of
+            ``VoteRollup.GRANULARITIES``
+    
+    Returns:
+        dict: Plain labels/values for ``render_chart``
+    """
+    if chart_type == 'line':
+        data = _trend_data(granularity, list(vote_timeseries(granularity)))
+        if len(data['values']) > 1:
+            return data
+        # Fall back to the candidate distribution
+        chart_type = 'pie'
+    return _chart_data(_chart_mode(chart_type), list(_chart_rows(chart_type)))
+
+
+async def aload_chart_data(chart_type, granularity=DEFAULT_GRANULARITY):
+    """Async counterpart of ``load_chart_data``, using the async ORM."""
+    if chart_type == 'line':
+        data = _trend_data(granularity, [row async for row in vote_timeseries(granularity)])
+        if len(data['values']) > 1:
+            return data
+        chart_type = 'pie'
+    return _chart_data(_chart_mode(chart_type), [row async for row in _chart_rows(chart_type)])
+
+
+def chart_payload(granularity=DEFAULT_GRANULARITY):
+    """
+    Load the numbers behind every chart, for drawing them in the browser.
+    
+    Args:
+        granularity (str): Bucket width of the trend, one of
+            ``VoteRollup.GRANULARITIES``
+    
+    Returns:
+        dict: Parallel lists, so the payload stays small:
+            - ``candidates``: ``ids``, ``names``, ``parties`` and ``votes``,
+              most votes first
+            - ``parties``: ``names`` and summed ``votes``, most votes first
+            - ``trend``: ``granularity``, bucket ``labels`` (UTC) and
+              ``votes`` per bucket with votes
+    """
+    return _payload(list(_payload_rows()), list(vote_timeseries(granularity)), granularity)
+
+
+async def achart_payload(granularity=DEFAULT_GRANULARITY):
+    """Async counterpart of ``chart_payload``, using the async ORM."""
+    return _payload(
+        [row async for row in _payload_rows()],
+        [row async for row in vote_timeseries(granularity)],
+        granularity,
+    )
+
+
+def _chart_rows(chart_type):
+    """Return a queryset of ``(label, value)`` rows for ``chart_type``."""
+    if chart_type == 'party':
+        return party_tallies().values_list('party', 'total_votes')
+    
+    candidate_votes = candidate_tallies().order_by('-vote_count', 'name')
+    if chart_type == 'pie':
+        # Only show candidates with votes
+        candidate_votes = candidate_votes.filter(vote_count__gt=0)
+    return candidate_votes.values_list('name', 'vote_count')
+
+
+def _chart_mode(chart_type):
+    """Return what the labels of ``chart_type`` are: parties or candidates."""
+    return 'parties' if chart_type == 'party' else 'candidates'
+
+
+def _chart_data(mode, rows):
+    """Build ``load_chart_data``'s result from ``(label, value)`` rows."""
+    return {
+        'mode': mode,
+        'labels': [str(label) if mode == 'dates' else label for label, _ in rows],
+        'values': [value for _, value in rows],
+    }
+
+
+def _trend_data(granularity, rows):
+    """Build the trend chart's data from ``(bucket, vote_count)`` rows."""
+    label_format = TREND_LABEL_FORMATS[granularity]
+    data = _chart_data('dates', [(bucket.strftime(label_format), count) for bucket, count in rows])
+    data['granularity'] = granularity
+    return data
+
+
+def render_chart(chart_type, data, size=DEFAULT_CHART_SIZE, fmt='png', key=None, on_done=None):
+    """
+    Draw ``chart_type`` from ``data`` (see ``load_chart_data``).
+    
+    Args:
+        key (tuple): Identifies the chart, so concurrent requests for it
+            share one render (defaults to a key unique to this call)
+        on_done (callable): Called with the bytes when the render finishes,
+            even if this caller has stopped waiting
+    
+    Returns:
+        bytes: The chart as an image in ``fmt`` (see ``CHART_FORMATS``)
+    
+    Raises:
+        RenderUnavailable: If the render farm is busy, timed out or crashed
+    """
+    return render_farm.render(
+        key or object(), chart_type, data, CHART_SIZES[size], fmt, on_done,
+    )
+
+
+async def arender_chart(chart_type, data, size=DEFAULT_CHART_SIZE, fmt='png', key=None, on_done=None):
+    """Async counterpart of ``render_chart``."""
+    return await render_farm.arender(
+        key or object(), chart_type, data, CHART_SIZES[size], fmt, on_done,
+    )
+
+
+def _payload_rows():
+    """Return ``(id, name, party, vote_count)`` rows for ``chart_payload``."""
+    return candidate_tallies().order_by('-vote_count', 'name').values_list('id', 'name', 'party', 'vote_count')
+
+
+def _payload(candidate_rows, trend_rows, granularity):
+    """Build ``chart_payload``'s result from candidate and trend rows."""
+    ids, names, parties, votes = (list(column) for column in zip(*candidate_rows)) if candidate_rows else ([], [], [], [])
+    
+    # Party totals are summed here rather than in a second query
+    party_votes = {}
+    for party, count in zip(parties, votes):
+        party_votes[party] = party_votes.get(party, 0) + count
+    party_names = sorted(party_votes, key=party_votes.get, reverse=True)
+    
+    label_format = TREND_LABEL_FORMATS[granularity]
+    return {
+        'candidates': {'ids': ids, 'names': names, 'parties': parties, 'votes': votes},
+        'parties': {'names': party_names, 'votes': [party_votes[party] for party in party_names]},
+        'trend': {
+            'granularity': granularity,
+            'labels': [bucket.strftime(label_format) for bucket, _ in trend_rows],
+            'votes': [count for _, count in trend_rows],
+        },
+    }
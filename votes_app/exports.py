@@ -0,0 +1,170 @@
+"""
+Streaming vote export for the Voting System application.
+
+Votes are read with ``values_list(...).iterator()`` and written out in
+batches as they arrive, so memory stays flat no matter how many votes are
+exported. Supported formats:
+- ``csv``: plain CSV (default)
+- ``csv.gz``: gzip-compressed CSV
+- ``parquet`` / ``arrow``: columnar formats, written one record batch at a
+  time (requires the optional ``pyarrow`` package)
+"""
+
+import csv
+import io
+import zlib
+from itertools import islice
+
+from .models import Vote
+
+# Rows fetched from the database per round trip, and written per batch
+EXPORT_CHUNK_SIZE = 2000
+
+EXPORT_COLUMNS = ['Voter UID', 'Voter Name', 'Candidate', 'Party', 'Timestamp']
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'csv.gz': ('application/gzip', 'csv.gz'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrows'),
+}
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def export_queryset(candidate=None, party=None, start=None, end=None):
+    """
+    Return the votes to export, newest first, as a ``values_list`` queryset.
+    
+    Args:
+        candidate (int): Only include votes for this candidate id
+        party (str): Only include votes for candidates of this party
+        start (datetime): Only include votes cast at or after this time
+        end (datetime): Only include votes cast before this time
+    
+    Returns:
+        QuerySet: ``(voter uid, voter name, candidate, party, timestamp)`` rows
+    """
+    votes = Vote.objects.all()
+    if candidate is not None:
+        votes = votes.filter(candidate_id=candidate)
+    if party:
+        votes = votes.filter(candidate__party=party)
+    if start is not None:
+        votes = votes.filter(timestamp__gte=start)
+    if end is not None:
+        votes = votes.filter(timestamp__lt=end)
+    
+    return (
+        votes
+        .order_by('-timestamp')
+        .values_list(
+            'voter__uid', 'voter__name', 'candidate__name', 'candidate__party', 'timestamp',
+        )
+    )
+
+
+def export_rows(**filters):
+    """
+    Iterate over the export rows (see ``export_queryset``) in chunks.
+    
+    Only ``EXPORT_CHUNK_SIZE`` rows are fetched from the database at a time.
+    """
+    return export_queryset(**filters).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+def stream_export(rows, fmt='csv'):
+    """
+    Serialize ``rows`` (see ``export_rows``) to ``fmt``, yielding bytes.
+    
+    Raises:
+        ImportError: If a columnar format is requested without pyarrow
+    """
+    if fmt == 'csv':
+        return _stream_csv(rows)
+    if fmt == 'csv.gz':
+        return _gzip(_stream_csv(rows))
+    # Fail before the response starts streaming if pyarrow is missing
+    import pyarrow  # noqa: F401
+    return _stream_arrow(rows, fmt)
+
+
+def _batches(rows):
+    """Group ``rows`` into lists of ``EXPORT_CHUNK_SIZE``."""
+    rows = iter(rows)
+    while batch := list(islice(rows, EXPORT_CHUNK_SIZE)):
+        yield batch
+
+
+def _stream_csv(rows):
+    """Yield the CSV export one encoded batch at a time."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for batch in _batches(rows):
+        writer.writerows(
+            (uid, name, candidate, party, timestamp.strftime(TIMESTAMP_FORMAT))
+            for uid, name, candidate, party, timestamp in batch
+        )
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def _gzip(chunks):
+    """Compress a stream of byte chunks into a gzip stream."""
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object that hands written bytes back to a generator."""
+    
+    def __init__(self):
+        self.chunks = []
+    
+    def writable(self):
+        return True
+    
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+    
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def _stream_arrow(rows, fmt):
+    """Yield a Parquet file or Arrow IPC stream one record batch at a time."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    
+    schema = pa.schema([
+        ('voter_uid', pa.string()),
+        ('voter_name', pa.string()),
+        ('candidate', pa.string()),
+        ('party', pa.string()),
+        ('timestamp', pa.timestamp('us', tz='UTC')),
+    ])
+    sink = _ChunkSink()
+    if fmt == 'parquet':
+        writer = pq.ParquetWriter(sink, schema)
+    else:
+        writer = pa.ipc.new_stream(sink, schema)
+    
+    with writer:
+        for batch in _batches(rows):
+            columns = [list(column) for column in zip(*batch)]
+            writer.write_table(pa.Table.from_arrays(columns, schema=schema))
+            data = sink.drain()
+            if data:
+                yield data
+    yield sink.drain()
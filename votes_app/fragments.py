@@ -0,0 +1,156 @@
+"""
+Rendered fragment cache for the Voting System application.
+
+Most page views render the same HTML as the previous one: candidates are
+set up before polling opens, and the results and analytics pages only
+change with the tallies. ``FragmentCache`` keeps rendered HTML in one of
+Django's caches (``settings.CACHES``):
+- the candidate ``<select>`` options of the voting form, so the home page
+  doesn't query the candidates at all
+- the whole results and analytics pages (they hold nothing per visitor),
+  keyed by the tally version, so a hit costs one small query instead of the
+  tally reads, statistics and template rendering
+
+Invalidation is signal-driven. Candidate saves and deletes bump a
+generation that is part of every key (see ``signals``); a vote moves the
+tally version, which keys the tally-derived pages, so they are re-rendered
+on the next view and older versions simply age out. Pages that carry
+per-visitor content (messages, CSRF tokens) are never cached whole.
+
+With the default in-process (locmem) backend, a candidate change is only
+seen at once by the process that made it; other workers catch up within
+``TIMEOUT`` seconds. Point ``BACKEND`` at a file-based cache (set
+``FRAGMENT_CACHE_DIR``) or any shared cache to invalidate every worker
+immediately. ``hits`` and ``misses`` per fragment are exported on
+``/metrics``.
+
+Configured through ``settings.FRAGMENT_CACHE``.
+"""
+
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+# Cache key holding the current generation
+GENERATION_KEY = 'fragment-generation'
+
+
+class FragmentCache:
+    """
+    Cache of rendered HTML fragments in a Django cache backend.
+    
+    Attributes:
+        backend (str): Alias in ``settings.CACHES`` holding the fragments
+        timeout (float): Seconds a fragment is kept
+        hits (Counter): Lookups served from the cache, per fragment
+        misses (Counter): Lookups that had to render, per fragment
+        invalidations (int): Generations bumped by this process
+    """
+    
+    def __init__(self, backend='default', timeout=300):
+        self.backend = backend
+        self.timeout = timeout
+        self.hits = Counter()
+        self.misses = Counter()
+        self.invalidations = 0
+        self._lock = threading.Lock()
+    
+    @classmethod
+    def from_settings(cls):
+        """Build a cache from ``settings.FRAGMENT_CACHE``."""
+        options = getattr(settings, 'FRAGMENT_CACHE', {})
+        return cls(
+            backend=options.get('BACKEND', 'default'),
+            timeout=options.get('TIMEOUT', 300),
+        )
+    
+    def get(self, name, *vary_on):
+        """
+        Return the cached HTML of fragment ``name``.
+        
+        Args:
+            name (str): Fragment name
+            *vary_on: Values the fragment depends on (e.g. the tally version)
+        
+        Returns:
+            SafeString: The fragment, or None on a miss
+        """
+        html = self._cache().get(self._key(name, vary_on))
+        with self._lock:
+            if html is None:
+                self.misses[name] += 1
+                return None
+            self.hits[name] += 1
+        return mark_safe(html)
+    
+    def render(self, name, template_name, context, *vary_on):
+        """
+        Render ``template_name`` with ``context`` and cache it as ``name``.
+        
+        Returns:
+            SafeString: The rendered fragment
+        """
+        html = render_to_string(template_name, context)
+        self._cache().set(self._key(name, vary_on), str(html), self.timeout)
+        return html
+    
+    def invalidate(self):
+        """Drop every fragment by moving to a new generation."""
+        cache = self._cache()
+        try:
+            cache.incr(GENERATION_KEY)
+        except ValueError:
+            # Evicted or never set: any new value leaves old keys unused
+            cache.set(GENERATION_KEY, time.time_ns(), None)
+        with self._lock:
+            self.invalidations += 1
+    
+    def invalidate_on_commit(self):
+        """Invalidate once the current transaction commits."""
+        transaction.on_commit(self.invalidate)
+    
+    def stats(self):
+        """
+        Return the counters per fragment.
+        
+        Returns:
+            dict: ``{name: {'hits', 'misses', 'hit_rate'}}``, with ``hit_rate``
+            between 0 and 1
+        """
+        with self._lock:
+            return {
+                name: {
+                    'hits': self.hits[name],
+                    'misses': self.misses[name],
+                    'hit_rate': round(self.hits[name] / (self.hits[name] + self.misses[name]), 4),
+                }
+                for name in sorted(self.hits.keys() | self.misses.keys())
+            }
+    
+    def _generation(self):
+        """Return the current generation, starting a new one if there is none."""
+        cache = self._cache()
+        generation = cache.get(GENERATION_KEY)
+        if generation is None:
+            # A time-based start never reuses the keys of an evicted generation
+            cache.add(GENERATION_KEY, time.time_ns(), None)
+            generation = cache.get(GENERATION_KEY)
+        return generation
+    
+    def _key(self, name, vary_on):
+        """Return the cache key of ``name`` for ``vary_on`` in this generation."""
+        return ':'.join(['fragment', str(self._generation()), name, *map(str, vary_on)])
+    
+    def _cache(self):
+        """Return the Django cache holding the fragments."""
+        return caches[self.backend]
+
+
+# Process-wide cache used by the page views
+fragment_cache = FragmentCache.from_settings()
@@ -0,0 +1,306 @@
+"""
+Live results push for the Voting System application.
+
+Viewers of the results and analytics pages subscribe to tally updates over
+server-sent events (``/results/live/``) or, optionally, a WebSocket
+(``/ws/results/``, routed in ``voting_project.asgi``) instead of refreshing.
+
+A single ``TallyBroadcaster`` per process does all the database work:
+- it wakes up when a vote commits in this process (``notify_tally_change``)
+  or every ``POLL_INTERVAL`` seconds to pick up votes from other workers
+- it reads the tally table once and fans the changed counts out to every
+  subscriber, so the cost per update is O(candidates), not O(viewers)
+- updates are sent at most ``MAX_UPDATES_PER_SECOND`` times per second;
+  a burst of votes in between is coalesced into one update, and a slow
+  client only ever holds its latest pending update
+
+Subscribers are plain asyncio tasks, so one ASGI server can hold thousands of
+idle viewers without a thread per connection.
+
+Configured through ``settings.LIVE_RESULTS``.
+"""
+
+import asyncio
+import json
+import logging
+from contextlib import asynccontextmanager
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import CandidateTally
+from .snapshots import results_snapshot
+
+logger = logging.getLogger(__name__)
+
+# Path the ASGI application routes to ``websocket_results``
+LIVE_WEBSOCKET_PATH = '/ws/results/'
+
+
+class Subscription:
+    """
+    A viewer's slot for pending tally updates.
+    
+    Holds at most one pending update: if a new one arrives before the last
+    was delivered, the two are merged (latest counts, summed deltas).
+    """
+    
+    def __init__(self):
+        self._pending = None
+        self._ready = asyncio.Event()
+    
+    def offer(self, update):
+        """Queue ``update``, merging it into any undelivered one."""
+        if self._pending is not None:
+            update = _merge_updates(self._pending, update)
+        self._pending = update
+        self._ready.set()
+    
+    async def next(self, timeout=None):
+        """
+        Wait for the next update.
+        
+        Returns:
+            dict: The pending update, or None if ``timeout`` seconds passed
+            without one
+        """
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except TimeoutError:
+            return None
+        self._ready.clear()
+        update, self._pending = self._pending, None
+        return update
+
+
+class TallyBroadcaster:
+    """
+    Per-process fan-out of tally changes to live subscribers.
+    
+    The polling task only runs while at least one viewer is subscribed.
+    
+    Attributes:
+        max_rate (float): Maximum updates pushed per second
+        poll_interval (float): Seconds between checks for votes cast in
+            other processes
+        keepalive (float): Seconds of silence before a keepalive is sent
+    """
+    
+    def __init__(self, max_rate=2, poll_interval=1.0, keepalive=15):
+        self.max_rate = max_rate
+        self.poll_interval = poll_interval
+        self.keepalive = keepalive
+        self._subscribers = set()
+        self._loop = None
+        self._wakeup = None
+        self._task = None
+        self._snapshot = None
+    
+    @classmethod
+    def from_settings(cls):
+        """Build a broadcaster from ``settings.LIVE_RESULTS``."""
+        options = getattr(settings, 'LIVE_RESULTS', {})
+        return cls(
+            max_rate=options.get('MAX_UPDATES_PER_SECOND', 2),
+            poll_interval=options.get('POLL_INTERVAL', 1.0),
+            keepalive=options.get('KEEPALIVE', 15),
+        )
+    
+    def notify(self):
+        """
+        Wake the broadcaster because the tallies changed.
+        
+        Safe to call from any thread; a no-op when nobody is subscribed.
+        """
+        loop, wakeup = self._loop, self._wakeup
+        if loop is None or loop.is_closed():
+            return
+        loop.call_soon_threadsafe(wakeup.set)
+    
+    @asynccontextmanager
+    async def subscribe(self):
+        """
+        Register a subscriber for the duration of the ``async with`` block.
+        
+        The subscription starts with a full snapshot of the current tallies.
+        """
+        self._bind(asyncio.get_running_loop())
+        if self._snapshot is None:
+            self._snapshot = await _load_snapshot()
+        subscription = Subscription()
+        subscription.offer(_snapshot_update(self._snapshot))
+        self._subscribers.add(subscription)
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+        try:
+            yield subscription
+        finally:
+            self._subscribers.discard(subscription)
+    
+    def _bind(self, loop):
+        """Attach to ``loop``, resetting state left over from another loop."""
+        if self._loop is not loop:
+            self._loop = loop
+            self._wakeup = asyncio.Event()
+            self._task = None
+            self._snapshot = None
+    
+    async def _run(self):
+        """Push coalesced updates to subscribers until the last one leaves."""
+        while self._subscribers:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except TimeoutError:
+                pass
+            self._wakeup.clear()
+            
+            try:
+                snapshot = await _load_snapshot()
+            except Exception:
+                logger.exception("Failed to load tallies for live results")
+                continue
+            
+            update = _diff_snapshots(self._snapshot, snapshot)
+            self._snapshot = snapshot
+            if update is not None:
+                for subscription in self._subscribers:
+                    subscription.offer(update)
+                # Anything that commits while we wait is picked up by the
+                # next pass, so bursts collapse into one update per interval
+                await asyncio.sleep(1 / self.max_rate)
+
+
+async def _load_snapshot():
+    """
+    Read every tally in one query.
+    
+    Returns:
+        dict: ``version`` (see ``tallies.tally_version``) and ``counts``
+        mapping candidate id to vote count
+    """
+    counts = {}
+    version = 0
+    rows = CandidateTally.objects.values_list('candidate_id', 'vote_count', 'revision')
+    async for candidate_id, vote_count, revision in rows:
+        counts[candidate_id] = vote_count
+        version += revision
+    return {'version': version, 'counts': counts}
+
+
+def _snapshot_update(snapshot):
+    """Return a full update describing ``snapshot``."""
+    return {
+        'version': snapshot['version'],
+        'total_votes': sum(snapshot['counts'].values()),
+        'candidates': {
+            candidate_id: {'vote_count': count, 'delta': 0}
+            for candidate_id, count in snapshot['counts'].items()
+        },
+        'full': True,
+    }
+
+
+def _diff_snapshots(old, new):
+    """Return an update with the candidates that changed, or None if none did."""
+    if old['version'] == new['version']:
+        return None
+    changed = {}
+    for candidate_id, count in new['counts'].items():
+        previous = old['counts'].get(candidate_id)
+        if previous != count:
+            changed[candidate_id] = {'vote_count': count, 'delta': count - (previous or 0)}
+    for candidate_id in old['counts'].keys() - new['counts'].keys():
+        changed[candidate_id] = {'vote_count': None, 'delta': -old['counts'][candidate_id]}
+    return {
+        'version': new['version'],
+        'total_votes': sum(new['counts'].values()),
+        'candidates': changed,
+        # Clients should reload if candidates were added or removed
+        'full': new['counts'].keys() != old['counts'].keys(),
+    }
+
+
+def _merge_updates(older, newer):
+    """Combine two undelivered updates into one."""
+    candidates = dict(older['candidates'])
+    for candidate_id, change in newer['candidates'].items():
+        previous = candidates.get(candidate_id)
+        if previous is not None and not newer['full']:
+            change = {**change, 'delta': previous['delta'] + change['delta']}
+        candidates[candidate_id] = change
+    return {
+        **newer,
+        'candidates': candidates,
+        'full': older['full'] or newer['full'],
+    }
+
+
+def encode_update(update):
+    """Serialize an update as JSON."""
+    return json.dumps(update, separators=(',', ':'))
+
+
+broadcaster = TallyBroadcaster.from_settings()
+
+
+def notify_tally_change():
+    """
+    Wake the live broadcaster and schedule a results snapshot once the
+    current transaction commits.
+    
+    Called after anything that changes the tallies in this process; changes
+    made elsewhere are still picked up by polling, just less promptly (and
+    snapshotted by the process that made them).
+    """
+    transaction.on_commit(broadcaster.notify)
+    transaction.on_commit(results_snapshot.schedule)
+
+
+async def stream_events(subscription, keepalive):
+    """
+    Yield server-sent events for ``subscription``.
+    
+    Each update is a ``tally`` event whose id is the tally version; a comment
+    line is sent after ``keepalive`` seconds of silence so proxies don't
+    close the idle connection.
+    """
+    # Ask clients to wait a few seconds before reconnecting after a drop
+    yield 'retry: 5000\n\n'
+    while True:
+        update = await subscription.next(timeout=keepalive)
+        if update is None:
+            yield ': keepalive\n\n'
+        else:
+            yield f"id: {update['version']}\nevent: tally\ndata: {encode_update(update)}\n\n"
+
+
+async def websocket_results(scope, receive, send):
+    """
+    Raw ASGI WebSocket handler pushing the same updates as the SSE endpoint.
+    
+    Each update is sent as one JSON text message. Messages from the client
+    are ignored.
+    """
+    message = await receive()
+    if message['type'] != 'websocket.connect':
+        return
+    await send({'type': 'websocket.accept'})
+    
+    async with broadcaster.subscribe() as subscription:
+        disconnected = asyncio.ensure_future(_wait_for_disconnect(receive))
+        try:
+            while True:
+                update = asyncio.ensure_future(subscription.next())
+                await asyncio.wait({update, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+                if disconnected.done():
+                    update.cancel()
+                    break
+                await send({'type': 'websocket.send', 'text': encode_update(update.result())})
+        finally:
+            disconnected.cancel()
+
+
+async def _wait_for_disconnect(receive):
+    """Consume client messages until the WebSocket closes."""
+    while (await receive())['type'] != 'websocket.disconnect':
+        pass
@@ -0,0 +1,75 @@
+"""
+Management command to bulk-import ballots from a polling-station upload.
+
+Usage:
+    python manage.py import_ballots ballots.csv
+    python manage.py import_ballots ballots.jsonl --chunk-size 5000 --report report.jsonl
+    cat ballots.csv | python manage.py import_ballots - --format csv
+
+Input rows carry ``voter_uid``, ``candidate_id`` and an optional ISO 8601
+``timestamp``.
+"""
+
+import json
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from votes_app.ballots import BALLOT_FORMATS, IMPORT_CHUNK_SIZE, import_ballots, parse_ballots
+
+
+class Command(BaseCommand):
+    help = "Bulk-import ballots from a CSV or JSONL file."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import, or '-' for stdin.")
+        parser.add_argument(
+            '--format',
+            choices=BALLOT_FORMATS,
+            help="Input format (defaults to the file extension).",
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=IMPORT_CHUNK_SIZE,
+            help=f"Ballots inserted per transaction (default {IMPORT_CHUNK_SIZE}).",
+        )
+        parser.add_argument(
+            '--report',
+            help="Write the per-row accept/reject report to this file as JSON lines.",
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or path.rsplit('.', 1)[-1].lower()
+        if fmt not in BALLOT_FORMATS:
+            raise CommandError("Cannot infer the format; pass --format csv or --format jsonl.")
+        if options['chunk_size'] < 1:
+            raise CommandError("--chunk-size must be positive.")
+
+        stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        start = time.perf_counter()
+        try:
+            result = import_ballots(parse_ballots(stream, fmt), chunk_size=options['chunk_size'])
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+        elapsed = time.perf_counter() - start
+
+        if options['report']:
+            with open(options['report'], 'w', encoding='utf-8') as report:
+                for entry in result['rows']:
+                    report.write(json.dumps(entry) + '\n')
+
+        if 'error' in result:
+            raise CommandError(
+                f"Stopped at line {result['error']['line']}: {result['error']['reason']}. "
+                f"{result['accepted']} ballot(s) before it were imported and {result['rejected']} rejected."
+            )
+        total = result['accepted'] + result['rejected']
+        rate = total / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {result['accepted']} ballot(s), rejected {result['rejected']} "
+            f"in {elapsed:.2f}s ({rate:,.0f} rows/s)."
+        ))
@@ -0,0 +1,185 @@
+"""
+Management command to load the electoral roll before polling opens.
+
+Usage:
+    python manage.py import_voters roll.csv
+    python manage.py import_voters roll.parquet --fast --report rejected.jsonl
+    cat roll.csv | python manage.py import_voters - --format csv
+
+Rolls carry a ``uid`` and an optional ``name`` per voter (see
+``votes_app.voter_roll.parse_roll``). Voters already registered are skipped,
+so a roll can be imported again after it was amended.
+
+After each committed chunk the number of rows done is written to a
+checkpoint file (``<roll>.progress`` by default). If the import is
+interrupted, running the same command again resumes after those rows; the
+checkpoint is ignored if the roll file has changed since, and removed once
+the import completes. Reading from stdin is not resumable (but rerunning it
+is still safe). Resume an interrupted ``--fast`` import with ``--fast`` too,
+so the indexes it dropped are rebuilt.
+"""
+
+import json
+import os
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from votes_app.voter_roll import ROLL_CHUNK_SIZE, ROLL_FORMATS, bulk_load, import_voters, parse_roll
+
+# Minimum seconds between two progress lines
+PROGRESS_INTERVAL = 5.0
+
+
+class Command(BaseCommand):
+    help = "Register the voters of an electoral roll (CSV or Parquet)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Roll to import, or '-' for a CSV roll on stdin.")
+        parser.add_argument(
+            '--format',
+            choices=ROLL_FORMATS,
+            help="Input format (defaults to the file extension).",
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=ROLL_CHUNK_SIZE,
+            help=f"Rows validated and inserted per transaction (default {ROLL_CHUNK_SIZE}).",
+        )
+        parser.add_argument(
+            '--fast',
+            action='store_true',
+            help="Initial load: drop and rebuild the voter table's secondary indexes, "
+                 "and relax durability while loading.",
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help="Checkpoint file for resuming (default: <path>.progress).",
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help="Ignore any checkpoint and start from the first row.",
+        )
+        parser.add_argument(
+            '--report',
+            help="Write the rejected rows to this file as JSON lines.",
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or path.rsplit('.', 1)[-1].lower()
+        if fmt not in ROLL_FORMATS:
+            raise CommandError("Cannot infer the format; pass --format csv or --format parquet.")
+        if path == '-' and fmt != 'csv':
+            raise CommandError("Only CSV rolls can be read from stdin.")
+        if options['chunk_size'] < 1:
+            raise CommandError("--chunk-size must be positive.")
+
+        checkpoint = None
+        skip = 0
+        if path != '-':
+            try:
+                stat = os.stat(path)
+            except OSError as e:
+                raise CommandError(f"Cannot read {path}: {e.strerror}")
+            checkpoint = Checkpoint(options['checkpoint'] or f"{path}.progress", stat)
+            if not options['restart']:
+                skip = checkpoint.load()
+                if skip:
+                    self.stdout.write(f"Resuming after row {skip:,} (checkpoint {checkpoint.path}).")
+
+        if path == '-':
+            source = sys.stdin
+        elif fmt == 'csv':
+            source = open(path, newline='', encoding='utf-8')
+        else:
+            source = path
+        report = open(options['report'], 'a' if skip else 'w', encoding='utf-8') if options['report'] else None
+
+        start = time.perf_counter()
+        last_line = start
+
+        def progress(totals):
+            nonlocal last_line
+            if checkpoint:
+                checkpoint.save(totals['rows'])
+            now = time.perf_counter()
+            if now - last_line >= PROGRESS_INTERVAL:
+                last_line = now
+                self.stdout.write(
+                    f"{totals['rows']:,} rows, {totals['inserted']:,} registered "
+                    f"({(totals['rows'] - skip) / (now - start):,.0f} rows/s)"
+                )
+
+        def reject(entry):
+            report.write(json.dumps(entry) + '\n')
+
+        try:
+            rows = parse_roll(source, fmt)
+            if options['fast']:
+                self.stdout.write("Dropping the voter table's secondary indexes for the load.")
+                with bulk_load():
+                    totals = import_voters(rows, options['chunk_size'], skip, progress, reject if report else None)
+                    self.stdout.write("Rebuilding indexes.")
+            else:
+                totals = import_voters(rows, options['chunk_size'], skip, progress, reject if report else None)
+        except (ValueError, UnicodeDecodeError, ImportError) as e:
+            raise CommandError(f"Cannot import {path}: {e}")
+        finally:
+            if fmt == 'csv' and path != '-':
+                source.close()
+            if report:
+                report.close()
+        elapsed = time.perf_counter() - start
+
+        if checkpoint:
+            checkpoint.remove()
+        rate = (totals['rows'] - skip) / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Registered {totals['inserted']:,} voter(s) from {totals['rows']:,} row(s): "
+            f"{totals['existing']:,} already registered, {totals['duplicates']:,} duplicate(s), "
+            f"{totals['rejected']:,} rejected, in {elapsed:.2f}s ({rate:,.0f} rows/s)."
+        ))
+
+
+class Checkpoint:
+    """
+    Rows of a roll committed so far, kept next to the roll.
+
+    Attributes:
+        path (str): Checkpoint file
+        roll (dict): Size and modification time of the roll, so a checkpoint
+            for another version of the file is ignored
+    """
+
+    def __init__(self, path, stat):
+        self.path = path
+        self.roll = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+    def load(self):
+        """Return the rows committed by an earlier run of this roll, or 0."""
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return 0
+        if state.get('roll') != self.roll:
+            return 0
+        return state.get('rows', 0)
+
+    def save(self, rows):
+        """Record that ``rows`` rows are committed (atomically replacing the file)."""
+        tmp = f"{self.path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'roll': self.roll, 'rows': rows}, f)
+        os.replace(tmp, self.path)
+
+    def remove(self):
+        """Delete the checkpoint once the roll is fully imported."""
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,56 @@
+"""
+Management command to publish the static results snapshot.
+
+Usage:
+    python manage.py publish_results             # publish once if the tallies changed
+    python manage.py publish_results --force     # publish even if they didn't
+    python manage.py publish_results --watch 2   # keep publishing, checking every 2 s
+
+Web processes publish a snapshot after their own votes. Use ``--watch`` in a
+separate process instead when the web processes shouldn't render charts, or
+when votes also reach the database some other way.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from votes_app.snapshots import ResultsSnapshot
+
+
+class Command(BaseCommand):
+    help = "Publish the results page, tallies and charts as static files."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help="Publish even if this tally version has already been published.",
+        )
+        parser.add_argument(
+            '--watch',
+            type=float,
+            metavar='SECONDS',
+            help="Keep running, publishing whenever the tallies change.",
+        )
+
+    def handle(self, *args, **options):
+        snapshot = ResultsSnapshot.from_settings()
+        if not snapshot.directory:
+            raise CommandError("No snapshot directory configured; set RESULTS_SNAPSHOT_DIR.")
+
+        version = snapshot.publish(force=options['force'])
+        self._report(snapshot, version)
+        while options['watch']:
+            time.sleep(options['watch'])
+            version = snapshot.publish()
+            if version is not None:
+                self._report(snapshot, version)
+
+    def _report(self, snapshot, version):
+        if version is None:
+            self.stdout.write(f"Snapshot in {snapshot.directory} is up to date.")
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"Published tally version {version} to {snapshot.directory}."
+            ))
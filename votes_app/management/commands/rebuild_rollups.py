@@ -0,0 +1,44 @@
+"""
+Management command to rebuild or verify the VoteRollup table.
+
+Usage:
+    python manage.py rebuild_rollups           # recount and fix rollups
+    python manage.py rebuild_rollups --verify  # report mismatches only
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from votes_app.rollups import rebuild_rollups, verify_rollups
+
+
+class Command(BaseCommand):
+    help = "Rebuild (or verify) the per-minute/hour/day vote rollups from the Vote table."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help="Only compare rollups against the Vote table; exit non-zero on mismatch.",
+        )
+
+    def handle(self, *args, **options):
+        if options['verify']:
+            mismatches = verify_rollups()
+        else:
+            mismatches = rebuild_rollups()
+
+        for granularity, bucket, candidate_id, stored, actual in mismatches:
+            self.stdout.write(
+                f"{granularity} {bucket.isoformat()} candidate {candidate_id}: "
+                f"stored={stored} actual={actual}"
+            )
+
+        if options['verify'] and mismatches:
+            raise CommandError(f"{len(mismatches)} rollup mismatch(es) found.")
+
+        if options['verify']:
+            self.stdout.write(self.style.SUCCESS("All rollups match the Vote table."))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"Rollups rebuilt ({len(mismatches)} corrected)."
+            ))
@@ -0,0 +1,43 @@
+"""
+Management command to rebuild or verify the CandidateTally table.
+
+Usage:
+    python manage.py rebuild_tallies           # recount and fix tallies
+    python manage.py rebuild_tallies --verify  # report mismatches only
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from votes_app.tallies import rebuild_tallies, verify_tallies
+
+
+class Command(BaseCommand):
+    help = "Rebuild (or verify) the per-candidate vote tallies from the Vote table."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help="Only compare tallies against the Vote table; exit non-zero on mismatch.",
+        )
+
+    def handle(self, *args, **options):
+        if options['verify']:
+            mismatches = verify_tallies()
+        else:
+            mismatches = rebuild_tallies()
+
+        for candidate_id, stored, actual in mismatches:
+            self.stdout.write(
+                f"Candidate {candidate_id}: stored={stored} actual={actual}"
+            )
+
+        if options['verify'] and mismatches:
+            raise CommandError(f"{len(mismatches)} tally mismatch(es) found.")
+
+        if options['verify']:
+            self.stdout.write(self.style.SUCCESS("All tallies match the Vote table."))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"Tallies rebuilt ({len(mismatches)} corrected)."
+            ))
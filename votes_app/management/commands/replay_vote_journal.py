@@ -0,0 +1,45 @@
+"""
+Management command to commit everything left in the write-behind vote journal.
+
+Usage:
+    python manage.py replay_vote_journal                  # settings.VOTE_JOURNAL['PATH']
+    python manage.py replay_vote_journal --path votes.journal
+
+Run it after a crash when the web process won't be restarted in journal
+mode; the web process otherwise replays the journal itself on start-up.
+"""
+
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from votes_app.journal import VoteJournal
+
+
+class Command(BaseCommand):
+    help = "Commit the ballots left in the write-behind vote journal to the database."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path',
+            help="Journal file (defaults to settings.VOTE_JOURNAL['PATH']).",
+        )
+
+    def handle(self, *args, **options):
+        journal = VoteJournal.from_settings()
+        journal.path = options['path'] or journal.path
+        if not journal.path:
+            raise CommandError("No journal configured; pass --path or set VOTE_JOURNAL_PATH.")
+        if not os.path.exists(journal.path):
+            raise CommandError(f"Journal {journal.path} does not exist.")
+
+        journal.open(start_committer=False)
+        try:
+            while journal.drain():
+                pass
+        finally:
+            journal.close()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Journal replayed: {journal.committed} committed, {journal.rejected} rejected."
+        ))
@@ -0,0 +1,107 @@
+"""
+Management command to verify the vote audit log.
+
+Usage:
+    python manage.py verify_votes
+    python manage.py verify_votes --workers 8 --chunk-size 131072
+    python manage.py verify_votes --start 1000000 --stop 2000000
+
+Vote writes still staged for the log are sealed into it first. Every entry
+of the log is then checked against the vote it records and the
+Merkle tree is rebuilt from the entries and compared with the stored nodes
+and root (see ``votes_app.audit.verify_log``). Chunks of the log are
+verified in parallel worker processes, one per CPU by default. With
+``--start``/``--stop`` only that range of entries is verified; the root and
+votes missing from the log are only checked for the whole log.
+
+Exits with an error if any problem is found.
+"""
+
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from votes_app.audit import VERIFY_CHUNK_SIZE, AuditError, audit_sealer, verify_log
+
+# Minimum seconds between two progress lines
+PROGRESS_INTERVAL = 5.0
+
+# Problems printed per kind
+SHOWN_PROBLEMS = 20
+
+
+class Command(BaseCommand):
+    help = "Verify the vote audit log against the votes and its Merkle root."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Worker processes (default: one per CPU); 1 verifies in this process.",
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=VERIFY_CHUNK_SIZE,
+            help=f"Entries verified per task, a power of two (default {VERIFY_CHUNK_SIZE}).",
+        )
+        parser.add_argument('--start', type=int, default=0, help="First entry to verify.")
+        parser.add_argument('--stop', type=int, help="Entry to stop before (default: the end of the log).")
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1:
+            raise CommandError("--workers must be positive.")
+
+        sealed = audit_sealer.seal()
+        if sealed:
+            self.stdout.write(f"Sealed {sealed:,} staged writes into the log.")
+
+        start = time.perf_counter()
+        last_line = start
+
+        def progress(done):
+            nonlocal last_line
+            now = time.perf_counter()
+            if now - last_line >= PROGRESS_INTERVAL:
+                last_line = now
+                self.stdout.write(f"{done:,} entries verified ({done / (now - start):,.0f}/s)")
+
+        try:
+            report = verify_log(
+                workers=options['workers'],
+                chunk_size=options['chunk_size'],
+                start=options['start'],
+                stop=options['stop'],
+                progress=progress,
+            )
+        except AuditError as e:
+            raise CommandError(str(e))
+        elapsed = time.perf_counter() - start
+
+        checked = report['stop'] - report['start']
+        self.stdout.write(
+            f"Verified entries {report['start']:,} to {report['stop']:,} of {report['size']:,} "
+            f"in {elapsed:.2f}s ({checked / elapsed if elapsed else 0:,.0f} entries/s)."
+        )
+        if report['superseded']:
+            self.stdout.write(f"{report['superseded']:,} entries superseded by a later write of their vote.")
+
+        problems = report['problems']
+        for problem in problems['entries'][:SHOWN_PROBLEMS]:
+            self.stderr.write(f"Entry {problem['seq']} (vote {problem['vote_id']}): {problem['reason']}")
+        for problem in problems['nodes'][:SHOWN_PROBLEMS]:
+            self.stderr.write(f"Node {problem['level']}/{problem['index']}: {problem['reason']}")
+        if report['unaudited']:
+            shown = ', '.join(map(str, problems['unaudited'][:SHOWN_PROBLEMS]))
+            self.stderr.write(f"{report['unaudited']:,} vote(s) missing from the log: {shown}")
+        if report['root_matches'] is False:
+            self.stderr.write("The rebuilt tree does not match the stored root.")
+
+        if problems['entries'] or problems['nodes'] or report['unaudited'] or report['root_matches'] is False:
+            raise CommandError("The audit log does not match the votes.")
+        if report['root_matches']:
+            self.stdout.write(self.style.SUCCESS(f"Audit log intact: {report['size']:,} entries, root {report['root']}."))
+        else:
+            self.stdout.write(self.style.SUCCESS("No problems in the verified range."))
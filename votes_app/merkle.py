@@ -0,0 +1,217 @@
+"""
+Merkle tree over the vote audit log.
+
+Every vote write (cast, amendment, retraction) is appended to the audit log
+as a leaf (see ``models.AuditEntry``). The leaves form a Merkle tree as
+defined by RFC 6962 (Certificate Transparency) with SHA-256, so roots and
+proofs can be checked with any implementation of it:
+- leaf hash: ``SHA-256(0x00 || record)``, node hash: ``SHA-256(0x01 || left || right)``
+- a tree of ``n`` leaves is the perfect tree of the largest power of two
+  below ``n`` leaves on the left, and the tree of the rest on the right
+
+Only perfect subtrees are stored (``models.AuditNode``). Their position is
+``(level, index)``: the subtree of ``2 ** level`` leaves starting at leaf
+``index * 2 ** level``. The roots of the perfect subtrees a tree splits
+into (its *peaks*, one per set bit of its size) are enough to append to it
+and to compute its root, so ``MerkleAccumulator`` keeps just those.
+Inclusion proofs need O(log n) stored nodes (``proof_nodes``).
+
+This module has no Django dependencies, so migrations can use it.
+"""
+
+import hashlib
+import json
+from datetime import timezone
+
+# Size of a digest in bytes
+DIGEST_SIZE = hashlib.sha256().digest_size
+
+# Root of the empty tree
+EMPTY_ROOT = hashlib.sha256(b'').digest()
+
+
+def leaf_hash(data):
+    """Return the hash of a leaf holding ``data`` (bytes)."""
+    return hashlib.sha256(b'\x00' + data).digest()
+
+
+def node_hash(left, right):
+    """Return the hash of the node with children ``left`` and ``right``."""
+    return hashlib.sha256(b'\x01' + left + right).digest()
+
+
+def ballot_record(action, vote_id, voter_uid, candidate_id, timestamp):
+    """
+    Encode a vote write as the bytes of its leaf.
+    
+    Args:
+        action (str): ``cast``, ``amend`` or ``retract``
+        vote_id (int): Primary key of the vote
+        voter_uid (str): UID of the voter
+        candidate_id (int): Candidate voted for
+        timestamp (datetime): When the vote was cast (timezone-aware)
+    
+    Returns:
+        bytes: Compact JSON array of the fields, the timestamp in UTC ISO 8601
+    """
+    when = timestamp.astimezone(timezone.utc).isoformat(timespec='microseconds')
+    return json.dumps(
+        [action, int(vote_id), voter_uid, int(candidate_id), when],
+        separators=(',', ':'),
+        ensure_ascii=False,
+    ).encode()
+
+
+def fold(digests):
+    """
+    Return the root of a tree from its peaks, given left to right.
+    
+    Peaks are hashed together from the right, as RFC 6962 splits trees.
+    """
+    if not digests:
+        return EMPTY_ROOT
+    root = digests[-1]
+    for digest in reversed(digests[:-1]):
+        root = node_hash(digest, root)
+    return root
+
+
+def peak_positions(start, stop):
+    """
+    Return the positions of the perfect subtrees covering leaves ``[start, stop)``.
+    
+    ``start`` must be aligned to the largest of them, which holds for every
+    range a tree built from leaf 0 is split into.
+    
+    Returns:
+        list: ``(level, index)`` pairs, left to right
+    """
+    positions = []
+    while start < stop:
+        level = (stop - start).bit_length() - 1
+        positions.append((level, start >> level))
+        start += 1 << level
+    return positions
+
+
+def proof_nodes(index, size):
+    """
+    Return the nodes an inclusion proof of leaf ``index`` in a tree of ``size``
+    leaves is made of.
+    
+    Returns:
+        list: One list of ``(level, index)`` positions per proof element,
+        bottom up; each element is the ``fold`` of its nodes' digests
+    """
+    if not 0 <= index < size:
+        raise ValueError(f"Leaf {index} is not in a tree of {size} leaves")
+    path = []
+    start, stop = 0, size
+    while stop - start > 1:
+        split = 1 << ((stop - start - 1).bit_length() - 1)
+        if index < start + split:
+            path.append(peak_positions(start + split, stop))
+            stop = start + split
+        else:
+            path.append(peak_positions(start, start + split))
+            start += split
+    return path[::-1]
+
+
+def root_from_proof(leaf, index, size, path):
+    """
+    Recompute the root of a tree of ``size`` leaves from an inclusion proof.
+    
+    Implements the verification of RFC 9162, section 2.1.3.2.
+    
+    Args:
+        leaf (bytes): Hash of the leaf
+        index (int): Position of the leaf
+        size (int): Number of leaves in the tree
+        path (list): Proof digests, bottom up
+    
+    Returns:
+        bytes: The root the proof leads to; the leaf is included if it
+        equals the published root
+    
+    Raises:
+        ValueError: If the proof has the wrong length for ``index`` and ``size``
+    """
+    if not 0 <= index < size:
+        raise ValueError(f"Leaf {index} is not in a tree of {size} leaves")
+    fn, sn = index, size - 1
+    root = leaf
+    for digest in path:
+        if sn == 0:
+            raise ValueError("Inclusion proof is too long")
+        if fn & 1 or fn == sn:
+            root = node_hash(digest, root)
+            while not fn & 1 and fn:
+                fn >>= 1
+                sn >>= 1
+        else:
+            root = node_hash(root, digest)
+        fn >>= 1
+        sn >>= 1
+    if sn != 0:
+        raise ValueError("Inclusion proof is too short")
+    return root
+
+
+class MerkleAccumulator:
+    """
+    Append-only Merkle tree that keeps only its peaks.
+    
+    Attributes:
+        size (int): Number of leaves appended so far
+        peaks (list): Roots of the perfect subtrees the tree splits into,
+            left (largest) to right
+    """
+    
+    def __init__(self, size=0, peaks=()):
+        self.size = size
+        self.peaks = list(peaks)
+        if len(self.peaks) != bin(size).count('1'):
+            raise ValueError(f"A tree of {size} leaves has {bin(size).count('1')} peaks, not {len(self.peaks)}")
+    
+    @classmethod
+    def from_bytes(cls, size, data):
+        """Restore an accumulator from its size and ``to_bytes`` output."""
+        data = bytes(data)
+        return cls(size, [data[i:i + DIGEST_SIZE] for i in range(0, len(data), DIGEST_SIZE)])
+    
+    def to_bytes(self):
+        """Return the peaks as one byte string."""
+        return b''.join(self.peaks)
+    
+    def push(self, digest, level=0):
+        """
+        Append a perfect subtree of ``2 ** level`` leaves with root ``digest``.
+        
+        Args:
+            digest (bytes): Leaf hash (``level`` 0) or subtree root
+            level (int): Height of the subtree; the tree's size must be a
+                multiple of its leaf count
+        
+        Returns:
+            list: ``(level, index, digest)`` of every node completed above it
+        """
+        if self.size % (1 << level):
+            raise ValueError(f"Cannot append a level {level} subtree to a tree of {self.size} leaves")
+        size = self.size
+        width = 1 << level
+        index = size >> level
+        nodes = []
+        # Merge with every peak of the same height, like a binary carry
+        while (size >> level) & 1:
+            digest = node_hash(self.peaks.pop(), digest)
+            level += 1
+            index >>= 1
+            nodes.append((level, index, digest))
+        self.peaks.append(digest)
+        self.size = size + width
+        return nodes
+    
+    def root(self):
+        """Return the root of the tree."""
+        return fold(self.peaks)
@@ -0,0 +1,278 @@
+"""
+Per-request instrumentation for the Voting System application.
+
+``RequestMetricsMiddleware`` (see ``middleware``) measures a sample of
+requests with a ``RequestSample``:
+- wall time from the first middleware to the response (for streamed
+  responses, to the end of the stream)
+- database queries and the time spent in them, counted by an execute wrapper
+  installed on every connection (see ``signals``); the sample being
+  measured is found through a context variable, so queries run by async
+  views in ``sync_to_async`` threads are counted too
+- template and chart rendering, timed with ``timed('render')``
+- response size in bytes
+
+``RequestMetrics`` aggregates the samples per view (URL name) and renders
+them in the Prometheus text format for the ``/metrics`` endpoint. A sampled
+response also carries a ``Server-Timing`` header, so the breakdown shows up
+in the browser's network panel.
+
+With ``SAMPLE_RATE`` below 1 only that share of requests is measured (the
+rest pay for one random number and a context variable lookup per query);
+counts in ``/metrics`` are of sampled requests. Metrics are kept per
+process, like the other in-memory caches.
+
+Configured through ``settings.REQUEST_METRICS``.
+"""
+
+import bisect
+import random
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+# Upper bounds (seconds) of the request duration histogram buckets
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# The sample of the request being handled in this context, if any
+_current_sample = ContextVar('request_sample', default=None)
+
+
+class RequestSample:
+    """
+    Measurements of a single request.
+    
+    Attributes:
+        started (float): ``perf_counter`` value when the request came in
+        queries (int): Database queries executed
+        db_seconds (float): Time spent executing them
+        phases (Counter): Seconds spent per timed phase, e.g. ``render``
+        bytes (int): Response body size
+    """
+    
+    __slots__ = ('started', 'queries', 'db_seconds', 'phases', 'bytes')
+    
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.phases = Counter()
+        self.bytes = 0
+    
+    def elapsed(self):
+        """Seconds since the request came in."""
+        return time.perf_counter() - self.started
+    
+    def server_timing(self):
+        """Return the ``Server-Timing`` header value for this request so far."""
+        metrics = [f'db;dur={self.db_seconds * 1000:.2f};desc="queries: {self.queries}"']
+        metrics.extend(f'{phase};dur={seconds * 1000:.2f}' for phase, seconds in self.phases.items())
+        metrics.append(f'total;dur={self.elapsed() * 1000:.2f}')
+        return ', '.join(metrics)
+
+
+class _ViewStats:
+    """Aggregated samples of one view."""
+    
+    __slots__ = ('buckets', 'duration', 'requests', 'statuses', 'queries', 'db_seconds', 'phases', 'bytes')
+    
+    def __init__(self, bucket_count):
+        # One count per bucket plus the +Inf bucket, not cumulative
+        self.buckets = [0] * (bucket_count + 1)
+        self.duration = 0.0
+        self.requests = 0
+        self.statuses = Counter()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.phases = Counter()
+        self.bytes = 0
+
+
+class RequestMetrics:
+    """
+    Sampled per-view request metrics.
+    
+    Attributes:
+        sample_rate (float): Share of requests measured (0..1)
+        server_timing (bool): Whether sampled responses get a
+            ``Server-Timing`` header
+        buckets (tuple): Upper bounds of the duration histogram, in seconds
+        token (str): Bearer token required by ``/metrics`` (only open under
+            ``DEBUG`` if empty)
+    """
+    
+    def __init__(self, sample_rate=1.0, server_timing=True, buckets=DEFAULT_BUCKETS, token=''):
+        self.sample_rate = sample_rate
+        self.server_timing = server_timing
+        self.buckets = tuple(buckets)
+        self.token = token
+        self._views = {}
+        self._lock = threading.Lock()
+    
+    @classmethod
+    def from_settings(cls):
+        """Build the metrics from ``settings.REQUEST_METRICS``."""
+        options = getattr(settings, 'REQUEST_METRICS', {})
+        return cls(
+            sample_rate=options.get('SAMPLE_RATE', 1.0),
+            server_timing=options.get('SERVER_TIMING', True),
+            buckets=options.get('BUCKETS', DEFAULT_BUCKETS),
+            token=options.get('TOKEN', ''),
+        )
+    
+    def start(self):
+        """
+        Decide whether to measure the current request.
+        
+        Returns:
+            RequestSample: A new sample (activate it with ``sampling``), or
+            None if the request isn't sampled
+        """
+        if self.sample_rate <= 0 or (self.sample_rate < 1 and random.random() >= self.sample_rate):
+            return None
+        return RequestSample()
+    
+    def observe(self, view, status, sample):
+        """Add a finished request's ``sample`` to the totals of ``view``."""
+        duration = sample.elapsed()
+        with self._lock:
+            stats = self._views.get(view)
+            if stats is None:
+                stats = self._views[view] = _ViewStats(len(self.buckets))
+            stats.buckets[bisect.bisect_left(self.buckets, duration)] += 1
+            stats.duration += duration
+            stats.requests += 1
+            stats.statuses[status] += 1
+            stats.queries += sample.queries
+            stats.db_seconds += sample.db_seconds
+            stats.phases.update(sample.phases)
+            stats.bytes += sample.bytes
+    
+    def reset(self):
+        """Forget everything observed so far."""
+        with self._lock:
+            self._views.clear()
+    
+    def export(self):
+        """
+        Render the totals in the Prometheus text exposition format.
+        
+        Returns:
+            str: ``voting_request_duration_seconds`` (histogram),
+            ``voting_requests_total`` (by status), ``voting_db_queries_total``,
+            ``voting_db_seconds_total``, ``voting_phase_seconds_total`` (by
+            phase) and ``voting_response_bytes_total``, all labelled by view,
+            plus the ``voting_metrics_sample_rate`` gauge
+        """
+        with self._lock:
+            views = sorted(self._views.items())
+            lines = [
+                '# HELP voting_request_duration_seconds Time taken to respond, per view.',
+                '# TYPE voting_request_duration_seconds histogram',
+            ]
+            for view, stats in views:
+                label = _label(view)
+                cumulative = 0
+                for bound, count in zip(self.buckets + ('+Inf',), stats.buckets):
+                    cumulative += count
+                    lines.append(f'voting_request_duration_seconds_bucket{{view={label},le="{bound}"}} {cumulative}')
+                lines.append(f'voting_request_duration_seconds_sum{{view={label}}} {stats.duration:.6f}')
+                lines.append(f'voting_request_duration_seconds_count{{view={label}}} {stats.requests}')
+            
+            lines += [
+                '# HELP voting_requests_total Requests measured, per view and status code.',
+                '# TYPE voting_requests_total counter',
+            ]
+            for view, stats in views:
+                for status, count in sorted(stats.statuses.items()):
+                    lines.append(f'voting_requests_total{{view={_label(view)},status="{status}"}} {count}')
+            
+            lines += _counter(
+                'voting_db_queries_total', 'Database queries executed, per view.',
+                ((view, stats.queries) for view, stats in views),
+            )
+            lines += _counter(
+                'voting_db_seconds_total', 'Time spent in database queries, per view.',
+                ((view, f'{stats.db_seconds:.6f}') for view, stats in views),
+            )
+            lines += [
+                '# HELP voting_phase_seconds_total Time spent rendering templates and charts, per view.',
+                '# TYPE voting_phase_seconds_total counter',
+            ]
+            for view, stats in views:
+                for phase, seconds in sorted(stats.phases.items()):
+                    lines.append(f'voting_phase_seconds_total{{view={_label(view)},phase="{phase}"}} {seconds:.6f}')
+            lines += _counter(
+                'voting_response_bytes_total', 'Response body bytes sent, per view.',
+                ((view, stats.bytes) for view, stats in views),
+            )
+        
+        lines += [
+            '# HELP voting_metrics_sample_rate Share of requests measured.',
+            '# TYPE voting_metrics_sample_rate gauge',
+            f'voting_metrics_sample_rate {self.sample_rate}',
+        ]
+        return '\n'.join(lines) + '\n'
+
+
+def _label(value):
+    """Quote ``value`` as a Prometheus label value."""
+    escaped = value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return f'"{escaped}"'
+
+
+def _counter(name, help_text, values):
+    """Return the exposition lines of a counter labelled by view."""
+    lines = [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+    lines.extend(f'{name}{{view={_label(view)}}} {value}' for view, value in values)
+    return lines
+
+
+@contextmanager
+def timed(phase):
+    """Add the time spent in the block to ``phase`` of the current sample, if any."""
+    sample = _current_sample.get()
+    if sample is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        sample.phases[phase] += time.perf_counter() - start
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Database execute wrapper counting queries for the current sample.
+    
+    Installed on every connection; outside a sampled request it only costs
+    the context variable lookup.
+    """
+    sample = _current_sample.get()
+    if sample is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        sample.db_seconds += time.perf_counter() - start
+        sample.queries += 1
+
+
+@contextmanager
+def sampling(sample):
+    """Attribute queries and phases inside the block to ``sample``."""
+    token = _current_sample.set(sample)
+    try:
+        yield
+    finally:
+        _current_sample.reset(token)
+
+
+# Process-wide metrics recorded by the middleware and served at /metrics
+request_metrics = RequestMetrics.from_settings()
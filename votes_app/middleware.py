@@ -0,0 +1,88 @@
+"""
+Middleware for the Voting System application.
+
+``RequestMetricsMiddleware`` records per-view latency, database queries,
+render time and response size for a sample of requests (see ``metrics``).
+It should come first in ``settings.MIDDLEWARE`` so the time spent in the
+rest of the middleware is included. It works in both sync and async
+handler chains, so async views stay on the event loop under ASGI.
+"""
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.http import FileResponse
+
+from .metrics import request_metrics, sampling
+
+# Label for requests that didn't resolve to a view (e.g. 404s)
+UNMATCHED_VIEW = '<unmatched>'
+
+
+class RequestMetricsMiddleware:
+    """
+    Measure sampled requests and add a ``Server-Timing`` header to them.
+    
+    Streamed responses are measured until the stream ends: queries run and
+    bytes sent while streaming count towards the request. Async streams (the
+    live results) never end and are recorded when they start. File responses
+    (the results snapshot) are recorded when they start too, with their
+    ``Content-Length``: wrapping the file would stop the server from sending
+    it with ``wsgi.file_wrapper`` (sendfile).
+    """
+    
+    sync_capable = True
+    async_capable = True
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+    
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        sample = request_metrics.start()
+        if sample is None:
+            return self.get_response(request)
+        with sampling(sample):
+            response = self.get_response(request)
+        return self._finish(request, response, sample)
+    
+    async def __acall__(self, request):
+        sample = request_metrics.start()
+        if sample is None:
+            return await self.get_response(request)
+        with sampling(sample):
+            response = await self.get_response(request)
+        return self._finish(request, response, sample)
+    
+    def _finish(self, request, response, sample):
+        """Record ``sample`` now, or once a sync stream has been sent."""
+        match = request.resolver_match
+        view = match.view_name if match else UNMATCHED_VIEW
+        if request_metrics.server_timing:
+            response['Server-Timing'] = sample.server_timing()
+        
+        if isinstance(response, FileResponse):
+            sample.bytes = int(response.get('Content-Length', 0))
+        elif response.streaming and not response.is_async:
+            response.streaming_content = _measured_stream(response.streaming_content, view, response.status_code, sample)
+            return response
+        if not response.streaming:
+            sample.bytes = len(response.content)
+        request_metrics.observe(view, response.status_code, sample)
+        return response
+
+
+def _measured_stream(chunks, view, status, sample):
+    """Yield ``chunks`` while attributing their queries and size to ``sample``."""
+    chunks = iter(chunks)
+    try:
+        while True:
+            with sampling(sample):
+                chunk = next(chunks, None)
+            if chunk is None:
+                break
+            sample.bytes += len(chunk)
+            yield chunk
+    finally:
+        request_metrics.observe(view, status, sample)
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.7 on 2026-10-16 23:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def populate_tallies(apps, schema_editor):
+    Candidate = apps.get_model('votes_app', 'Candidate')
+    CandidateTally = apps.get_model('votes_app', 'CandidateTally')
+    counts = Candidate.objects.annotate(vote_count=Count('votes')).values_list('id', 'vote_count')
+    CandidateTally.objects.bulk_create(
+        CandidateTally(candidate_id=candidate_id, vote_count=vote_count)
+        for candidate_id, vote_count in counts
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('votes_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CandidateTally',
+            fields=[
+                ('candidate', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='tally', serialize=False, to='votes_app.candidate')),
+                ('vote_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'candidate tallies',
+            },
+        ),
+        migrations.RunPython(populate_tallies, migrations.RunPython.noop),
+    ]
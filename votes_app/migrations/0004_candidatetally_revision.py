@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-16 23:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('votes_app', '0003_vote_timestamp_default'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='candidatetally',
+            name='revision',
+            field=models.PositiveBigIntegerField(default=1),
+        ),
+    ]
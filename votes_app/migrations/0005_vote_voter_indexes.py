@@ -0,0 +1,36 @@
+# Generated by Django 5.2.7 on 2026-10-17 00:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('votes_app', '0004_candidatetally_revision'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='vote',
+            name='candidate',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='votes', to='votes_app.candidate'),
+        ),
+        migrations.AlterField(
+            model_name='vote',
+            name='voter',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='votes', to='votes_app.voter'),
+        ),
+        migrations.AddIndex(
+            model_name='vote',
+            index=models.Index(fields=['timestamp'], name='vote_timestamp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vote',
+            index=models.Index(fields=['candidate', 'timestamp'], name='vote_candidate_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='voter',
+            index=models.Index(fields=['registered_on'], name='voter_registered_on_idx'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.7 on 2026-10-17 00:17
+
+import datetime
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import Trunc
+
+
+def populate_rollups(apps, schema_editor):
+    Vote = apps.get_model('votes_app', 'Vote')
+    VoteRollup = apps.get_model('votes_app', 'VoteRollup')
+    for granularity in ('minute', 'hour', 'day'):
+        counts = (
+            Vote.objects.order_by()
+            .annotate(bucket=Trunc('timestamp', granularity, tzinfo=datetime.timezone.utc))
+            .values_list('bucket', 'candidate_id')
+            .annotate(vote_count=Count('id'))
+        )
+        VoteRollup.objects.bulk_create(
+            VoteRollup(granularity=granularity, bucket=bucket, candidate_id=candidate_id, vote_count=vote_count)
+            for bucket, candidate_id, vote_count in counts
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('votes_app', '0005_vote_voter_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VoteRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('minute', 'minute'), ('hour', 'hour'), ('day', 'day')], max_length=6)),
+                ('bucket', models.DateTimeField()),
+                ('vote_count', models.PositiveIntegerField(default=0)),
+                ('candidate', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='votes_app.candidate')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('granularity', 'bucket', 'candidate'), name='vote_rollup_bucket_uniq')],
+            },
+        ),
+        migrations.RunPython(populate_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,80 @@
+# Generated by Django 5.2.7 on 2026-10-17 01:01
+
+from django.db import migrations, models
+
+from votes_app import merkle
+
+# Votes hashed per batch of inserted entries
+BATCH_SIZE = 10000
+
+
+def populate_audit_log(apps, schema_editor):
+    """Start the audit log with a ``cast`` entry per existing vote, by id."""
+    Vote = apps.get_model('votes_app', 'Vote')
+    AuditEntry = apps.get_model('votes_app', 'AuditEntry')
+    AuditNode = apps.get_model('votes_app', 'AuditNode')
+    AuditHead = apps.get_model('votes_app', 'AuditHead')
+    tree = merkle.MerkleAccumulator()
+    entries = []
+    nodes = []
+    votes = (
+        Vote.objects.order_by('id')
+        .values_list('id', 'voter__uid', 'candidate_id', 'timestamp')
+        .iterator(chunk_size=BATCH_SIZE)
+    )
+    for vote_id, voter_uid, candidate_id, timestamp in votes:
+        digest = merkle.leaf_hash(merkle.ballot_record('cast', vote_id, voter_uid, candidate_id, timestamp))
+        entries.append(AuditEntry(seq=tree.size, vote_id=vote_id, action='cast', digest=digest))
+        nodes.extend(AuditNode(level=level, index=index, digest=node) for level, index, node in tree.push(digest))
+        if len(entries) == BATCH_SIZE:
+            AuditEntry.objects.bulk_create(entries)
+            AuditNode.objects.bulk_create(nodes)
+            entries, nodes = [], []
+    AuditEntry.objects.bulk_create(entries)
+    AuditNode.objects.bulk_create(nodes)
+    AuditHead.objects.create(pk=1, size=tree.size, root=tree.root(), peaks=tree.to_bytes())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('votes_app', '0006_voterollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuditEntry',
+            fields=[
+                ('seq', models.PositiveBigIntegerField(primary_key=True, serialize=False)),
+                ('vote_id', models.PositiveBigIntegerField(db_index=True)),
+                ('action', models.CharField(choices=[('cast', 'cast'), ('amend', 'amend'), ('retract', 'retract')], max_length=7)),
+                ('digest', models.BinaryField(max_length=32)),
+            ],
+            options={
+                'verbose_name_plural': 'audit entries',
+            },
+        ),
+        migrations.CreateModel(
+            name='AuditHead',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('size', models.PositiveBigIntegerField(default=0)),
+                ('root', models.BinaryField(default=b"\xe3\xb0\xc4B\x98\xfc\x1c\x14\x9a\xfb\xf4\xc8\x99o\xb9$'\xaeA\xe4d\x9b\x93L\xa4\x95\x99\x1bxR\xb8U", max_length=32)),
+                ('peaks', models.BinaryField(default=b'')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='AuditNode',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('level', models.PositiveSmallIntegerField()),
+                ('index', models.PositiveBigIntegerField()),
+                ('digest', models.BinaryField(max_length=32)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('level', 'index'), name='audit_node_position_uniq')],
+            },
+        ),
+        migrations.RunPython(populate_audit_log, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.7 on 2026-10-17 01:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('votes_app', '0007_auditlog'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingAuditEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('vote_id', models.PositiveBigIntegerField()),
+                ('action', models.CharField(choices=[('cast', 'cast'), ('amend', 'amend'), ('retract', 'retract')], max_length=7)),
+                ('digest', models.BinaryField(max_length=32)),
+            ],
+            options={
+                'verbose_name_plural': 'pending audit entries',
+            },
+        ),
+    ]
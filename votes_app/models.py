@@ -1,14 +1,53 @@
 """
 Models for the Voting System application.
 
-This module defines three main models:
+This module defines the following models:
 - Candidate: Represents a political candidate with name and party
 - Voter: Represents a registered voter with unique ID and registration date
 - Vote: Represents a vote cast by a voter for a specific candidate
+- CandidateTally: Materialized vote count per candidate, kept in step with Vote
+- VoteRollup: Votes per candidate per minute/hour/day, kept in step with Vote
+- AuditEntry, AuditNode, AuditHead: Append-only Merkle tree log of vote writes
+
+Candidate, Voter and Vote use ``UnorderedAggregateQuerySet`` so their default
+ordering never leaks into aggregate, existence or single-row lookups.
 """
 
-from django.db import models
+import datetime
+
+from django.db import connections, models, router, transaction
+from django.db.models import F
 from django.core.exceptions import ValidationError
+from django.utils import timezone
+
+from . import merkle
+
+
+class UnorderedAggregateQuerySet(models.QuerySet):
+    """
+    QuerySet that keeps ``Meta.ordering`` out of queries where order is moot.
+    
+    Default ordering is only meant for listings. On aggregate and existence
+    paths it just adds a sort (or, on some backends, extra GROUP BY columns),
+    so ``count``, ``exists`` and ``aggregate`` always run unordered and
+    ``unordered()`` is available for subqueries and single-row lookups.
+    Explicit ``order_by()`` calls are left alone.
+    """
+    
+    def unordered(self):
+        """Drop the model's default ordering unless an explicit one was given."""
+        if self.query.order_by or not self.query.default_ordering:
+            return self
+        return self.order_by()
+    
+    def count(self):
+        return super(UnorderedAggregateQuerySet, self.unordered()).count()
+    
+    def exists(self):
+        return super(UnorderedAggregateQuerySet, self.unordered()).exists()
+    
+    def aggregate(self, *args, **kwargs):
+        return super(UnorderedAggregateQuerySet, self.unordered()).aggregate(*args, **kwargs)
 
 
 class Candidate(models.Model):
@@ -24,6 +63,8 @@ class Candidate(models.Model):
     party = models.CharField(max_length=100, help_text="Political party affiliation")
     created_at = models.DateTimeField(auto_now_add=True)
     
+    objects = UnorderedAggregateQuerySet.as_manager()
+    
     class Meta:
         # Order candidates by name for consistency
         ordering = ['name']
@@ -46,9 +87,15 @@ class Voter(models.Model):
     name = models.CharField(max_length=200, help_text="Full name of the voter")
     registered_on = models.DateTimeField(auto_now_add=True)
     
+    objects = UnorderedAggregateQuerySet.as_manager()
+    
     class Meta:
         # Order voters by registration date
         ordering = ['-registered_on']
+        indexes = [
+            # Backs the default ordering and the admin date filter
+            models.Index(fields=['registered_on'], name='voter_registered_on_idx'),
+        ]
     
     def __str__(self):
         """String representation of the voter."""
@@ -67,15 +114,27 @@ class Vote(models.Model):
     Constraints:
         - One voter can only vote once (enforced at database level)
     """
-    voter = models.ForeignKey(Voter, on_delete=models.CASCADE, related_name='votes')
-    candidate = models.ForeignKey(Candidate, on_delete=models.CASCADE, related_name='votes')
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # The implicit FK indexes are dropped: the unique constraint on voter and
+    # the (candidate, timestamp) index below already cover those lookups
+    voter = models.ForeignKey(Voter, on_delete=models.CASCADE, related_name='votes', db_index=False)
+    candidate = models.ForeignKey(Candidate, on_delete=models.CASCADE, related_name='votes', db_index=False)
+    # default (rather than auto_now_add) so bulk imports can keep the time
+    # a ballot was cast at an offline polling station
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)
+    
+    objects = UnorderedAggregateQuerySet.as_manager()
     
     class Meta:
         # Enforce one vote per voter at database level
         unique_together = [['voter']]
         # Order votes by timestamp
         ordering = ['-timestamp']
+        indexes = [
+            # Time-ordered scans: default ordering, export, trend charts
+            models.Index(fields=['timestamp'], name='vote_timestamp_idx'),
+            # Per-candidate lookups, filtered exports and tally recounts
+            models.Index(fields=['candidate', 'timestamp'], name='vote_candidate_ts_idx'),
+        ]
     
     def __str__(self):
         """String representation of the vote."""
@@ -90,6 +149,443 @@ class Vote(models.Model):
             raise ValidationError("This voter has already cast a vote.")
     
     def save(self, *args, **kwargs):
-        """Override save to run clean validation."""
+        """
+        Override save to run clean validation, keep CandidateTally and
+        VoteRollup in step and stage the write for the audit log.
+        
+        The vote row, the tally counter(s), the rollup buckets and the
+        staged audit entry are written in one transaction, so readers never
+        observe a vote without its count (or vice versa).
+        """
         self.full_clean()
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            adding = self._state.adding
+            previous_candidate_id = None
+            if adding:
+                # clean() has already loaded the voter
+                voter_uid = self.voter.uid
+            else:
+                # The voter's UID comes with the previous candidate, rather
+                # than in a query of its own
+                previous_candidate_id, previous_voter_id, voter_uid = (
+                    Vote.objects.values_list('candidate_id', 'voter_id', 'voter__uid').get(pk=self.pk)
+                )
+                if previous_voter_id != self.voter_id:
+                    voter_uid = self.voter.uid
+            super().save(*args, **kwargs)
+            if previous_candidate_id != self.candidate_id:
+                if previous_candidate_id is not None:
+                    CandidateTally.adjust(previous_candidate_id, -1)
+                    VoteRollup.retract(previous_candidate_id, self.timestamp)
+                CandidateTally.adjust(self.candidate_id, 1)
+                VoteRollup.record([(self.candidate_id, self.timestamp)])
+            AuditEntry.stage([
+                ('cast' if adding else 'amend', self.pk, voter_uid, self.candidate_id, self.timestamp),
+            ])
+
+
+class CandidateTally(models.Model):
+    """
+    Materialized vote count for a candidate.
+    
+    Read paths (results, analytics, charts) use this table instead of
+    aggregating over Vote, turning each page view into an O(candidates)
+    lookup. Rows are adjusted in the same transaction as the Vote write
+    and can be rebuilt with ``manage.py rebuild_tallies``.
+    
+    Attributes:
+        candidate (Candidate): The candidate this tally belongs to
+        vote_count (int): Number of votes cast for the candidate
+        revision (int): Incremented on every change to this tally; the sum
+            over all tallies is the global tally version (see
+            ``tallies.tally_version``)
+        updated_at (datetime): When the tally last changed
+    """
+    candidate = models.OneToOneField(
+        Candidate,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='tally',
+    )
+    vote_count = models.PositiveIntegerField(default=0)
+    revision = models.PositiveBigIntegerField(default=1)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name_plural = 'candidate tallies'
+    
+    def __str__(self):
+        """String representation of the tally."""
+        return f"{self.candidate_id}: {self.vote_count} votes"
+    
+    @staticmethod
+    def changes(delta=0):
+        """
+        Return ``update()`` kwargs that add ``delta`` votes and bump the revision.
+        
+        Every write to a tally goes through these kwargs so the tally version
+        moves forward whenever anything a chart depends on changes.
+        """
+        return {
+            'vote_count': F('vote_count') + delta,
+            'revision': F('revision') + 1,
+            'updated_at': timezone.now(),
+        }
+    
+    @classmethod
+    def adjust(cls, candidate_id, delta):
+        """
+        Atomically add ``delta`` to a candidate's vote count.
+        
+        Creates the tally row on first use so candidates added before the
+        tally table existed (or without going through signals) still count.
+        """
+        tally = cls.objects.filter(candidate_id=candidate_id)
+        if not tally.update(**cls.changes(delta)):
+            cls.objects.get_or_create(candidate_id=candidate_id)
+            tally.update(**cls.changes(delta))
+
+
+class VoteRollup(models.Model):
+    """
+    Materialized number of votes per candidate per time bucket.
+    
+    Every vote is counted in three buckets, one per granularity, each
+    starting at the vote's timestamp truncated to the minute, hour or day
+    (in UTC). Trend charts and the timeseries API read this table, so their
+    cost is O(buckets) instead of a scan over every ballot. Rows are upserted
+    in the same transaction as the Vote write and can be rebuilt with
+    ``manage.py rebuild_rollups``.
+    
+    Attributes:
+        granularity (str): One of ``GRANULARITIES``
+        bucket (datetime): Start of the bucket
+        candidate (Candidate): The candidate the votes were cast for
+        vote_count (int): Number of votes cast in the bucket
+    """
+    # Bucket widths, finest first
+    GRANULARITIES = {
+        'minute': datetime.timedelta(minutes=1),
+        'hour': datetime.timedelta(hours=1),
+        'day': datetime.timedelta(days=1),
+    }
+    
+    granularity = models.CharField(
+        max_length=6,
+        choices=[(name, name) for name in GRANULARITIES],
+    )
+    bucket = models.DateTimeField()
+    # Keeps its own index (the unique constraint below doesn't lead with
+    # it) for cascades from deleted candidates
+    candidate = models.ForeignKey(Candidate, on_delete=models.CASCADE, related_name='rollups')
+    vote_count = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        constraints = [
+            # The upsert target; also serves range scans over one granularity
+            models.UniqueConstraint(
+                fields=['granularity', 'bucket', 'candidate'],
+                name='vote_rollup_bucket_uniq',
+            ),
+        ]
+    
+    def __str__(self):
+        """String representation of the rollup."""
+        return f"{self.granularity} {self.bucket:%Y-%m-%d %H:%M}: {self.candidate_id}: {self.vote_count} votes"
+    
+    @classmethod
+    def bucket_start(cls, timestamp, granularity):
+        """Truncate ``timestamp`` to the start of its ``granularity`` bucket in UTC."""
+        bucket = timestamp.astimezone(datetime.timezone.utc).replace(second=0, microsecond=0)
+        if granularity in ('hour', 'day'):
+            bucket = bucket.replace(minute=0)
+        if granularity == 'day':
+            bucket = bucket.replace(hour=0)
+        return bucket
+    
+    @classmethod
+    def record(cls, ballots):
+        """
+        Count ``(candidate_id, timestamp)`` ballots in their buckets.
+        
+        Ballots are first summed per bucket, then written with multi-row
+        ``INSERT ... ON CONFLICT DO UPDATE`` statements that add to existing
+        rows, so a single vote costs one statement and a chunk of imported
+        ballots one statement per batch of distinct buckets.
+        """
+        counts = {}
+        buckets = {}
+        for candidate_id, timestamp in ballots:
+            # Imported ballots share few distinct timestamps: truncate each once
+            if timestamp not in buckets:
+                buckets[timestamp] = [
+                    (granularity, cls.bucket_start(timestamp, granularity))
+                    for granularity in cls.GRANULARITIES
+                ]
+            for granularity, bucket in buckets[timestamp]:
+                key = (granularity, bucket, candidate_id)
+                counts[key] = counts.get(key, 0) + 1
+        if not counts:
+            return
+        
+        connection = connections[router.db_for_write(cls)]
+        quote = connection.ops.quote_name
+        bucket_field = cls._meta.get_field('bucket')
+        columns = ['granularity', 'bucket', 'candidate_id', 'vote_count']
+        rows = [
+            (granularity, bucket_field.get_db_prep_value(bucket, connection), candidate_id, count)
+            for (granularity, bucket, candidate_id), count in counts.items()
+        ]
+        table = quote(cls._meta.db_table)
+        batch_size = max(connection.ops.bulk_batch_size(columns, rows), 1)
+        with connection.cursor() as cursor:
+            for start in range(0, len(rows), batch_size):
+                batch = rows[start:start + batch_size]
+                cursor.execute(
+                    f"INSERT INTO {table} ({', '.join(map(quote, columns))}) "
+                    f"VALUES {', '.join(['(%s, %s, %s, %s)'] * len(batch))} "
+                    f"ON CONFLICT ({', '.join(map(quote, columns[:3]))}) "
+                    f"DO UPDATE SET {quote('vote_count')} = "
+                    f"{table}.{quote('vote_count')} + excluded.{quote('vote_count')}",
+                    [value for row in batch for value in row],
+                )
+    
+    @classmethod
+    def retract(cls, candidate_id, timestamp):
+        """
+        Remove one vote from its buckets.
+        
+        A plain UPDATE is used so that a cascade from a candidate being
+        deleted never recreates its rows.
+        """
+        for granularity in cls.GRANULARITIES:
+            cls.objects.filter(
+                granularity=granularity,
+                bucket=cls.bucket_start(timestamp, granularity),
+                candidate_id=candidate_id,
+                vote_count__gt=0,
+            ).update(vote_count=F('vote_count') - 1)
+
+
+class AuditEntry(models.Model):
+    """
+    One vote write in the append-only audit log.
+    
+    Every cast, amendment and retraction of a vote is staged as a
+    ``PendingAuditEntry`` in the same transaction as the write itself, and
+    sealed into the log in batches (``seal``). Entries are the leaves of a
+    Merkle tree (see ``merkle``) whose interior nodes are ``AuditNode`` rows
+    and whose root is kept on ``AuditHead``, so the log can be checked
+    against the current votes (``manage.py verify_votes``) and any ballot
+    can be proven to be included in a published root.
+    
+    Attributes:
+        seq (int): Position in the log, from 0 without gaps
+        vote_id (int): The vote written (not a foreign key: retractions
+            outlive their vote)
+        action (str): One of ``ACTIONS``
+        digest (bytes): Leaf hash of the ``merkle.ballot_record`` of the write
+    """
+    ACTIONS = ['cast', 'amend', 'retract']
+    
+    # Default number of staged writes sealed per transaction
+    SEAL_BATCH_SIZE = 5000
+    
+    seq = models.PositiveBigIntegerField(primary_key=True)
+    vote_id = models.PositiveBigIntegerField(db_index=True)
+    action = models.CharField(max_length=7, choices=[(action, action) for action in ACTIONS])
+    digest = models.BinaryField(max_length=merkle.DIGEST_SIZE)
+    
+    class Meta:
+        verbose_name_plural = 'audit entries'
+    
+    def __str__(self):
+        """String representation of the entry."""
+        return f"#{self.seq}: {self.action} vote {self.vote_id}"
+    
+    @classmethod
+    def stage(cls, writes):
+        """
+        Stage vote writes for the log, in the caller's transaction.
+        
+        The leaves are hashed here and inserted into ``PendingAuditEntry``
+        with one statement per batch of rows. Nothing is locked, so
+        concurrent writers don't queue behind each other; positions are
+        assigned when the writes are sealed.
+        
+        Args:
+            writes (iterable): ``(action, vote_id, voter_uid, candidate_id,
+                timestamp)`` tuples, in the order they happened
+        """
+        rows = [
+            (write[1], write[0], merkle.leaf_hash(merkle.ballot_record(*write)))
+            for write in writes
+        ]
+        if rows:
+            connection = connections[router.db_for_write(cls)]
+            with connection.cursor() as cursor:
+                _insert_rows(connection, cursor, PendingAuditEntry, ['vote_id', 'action', 'digest'], rows)
+    
+    @classmethod
+    def seal(cls, batch_size=SEAL_BATCH_SIZE):
+        """
+        Move the staged writes into the log and update the tree.
+        
+        Each batch is sealed in its own transaction, in the order the
+        writes were staged. The head is locked for that transaction, which
+        serialises sealing so positions stay gapless, but only once per
+        batch rather than once per vote. New leaves are hashed onto the
+        stored peaks, so a batch costs O(log n) hashes per entry and six
+        statements however large the log is. Like ``VoteRollup.record``, the
+        statements are written directly: compiling them through the ORM cost
+        more than running them.
+        
+        Args:
+            batch_size (int): Most writes sealed per transaction
+        
+        Returns:
+            int: Number of entries appended to the log
+        """
+        connection = connections[router.db_for_write(cls)]
+        quote = connection.ops.quote_name
+        head_table = quote(AuditHead._meta.db_table)
+        pending_table = quote(PendingAuditEntry._meta.db_table)
+        lock = ' FOR UPDATE' if connection.features.has_select_for_update else ''
+        select_head = f"SELECT {quote('size')}, {quote('peaks')} FROM {head_table} WHERE {quote('id')} = %s{lock}"
+        sealed = 0
+        while True:
+            with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+                cursor.execute(select_head, [AuditHead.SINGLETON])
+                row = cursor.fetchone()
+                if row is None:
+                    AuditHead.objects.using(connection.alias).get_or_create(pk=AuditHead.SINGLETON)
+                    cursor.execute(select_head, [AuditHead.SINGLETON])
+                    row = cursor.fetchone()
+                tree = merkle.MerkleAccumulator.from_bytes(*row)
+                
+                cursor.execute(
+                    f"SELECT {quote('id')}, {quote('vote_id')}, {quote('action')}, {quote('digest')} "
+                    f"FROM {pending_table} ORDER BY {quote('id')} LIMIT %s",
+                    [batch_size],
+                )
+                staged = cursor.fetchall()
+                if not staged:
+                    return sealed
+                
+                entries = []
+                nodes = []
+                for _, vote_id, action, digest in staged:
+                    digest = bytes(digest)
+                    entries.append((tree.size, vote_id, action, digest))
+                    nodes.extend(tree.push(digest))
+                _insert_rows(connection, cursor, cls, ['seq', 'vote_id', 'action', 'digest'], entries)
+                _insert_rows(connection, cursor, AuditNode, ['level', 'index', 'digest'], nodes)
+                
+                # By id rather than by range: on databases with concurrent
+                # writers, a lower id can still be uncommitted
+                ids = [pending_id for pending_id, *_ in staged]
+                id_batch_size = max(connection.ops.bulk_batch_size(['id'], ids), 1)
+                for start in range(0, len(ids), id_batch_size):
+                    batch = ids[start:start + id_batch_size]
+                    cursor.execute(
+                        f"DELETE FROM {pending_table} WHERE {quote('id')} IN ({', '.join(['%s'] * len(batch))})",
+                        batch,
+                    )
+                
+                updated_at = AuditHead._meta.get_field('updated_at').get_db_prep_value(timezone.now(), connection)
+                cursor.execute(
+                    f"UPDATE {head_table} SET {quote('size')} = %s, {quote('peaks')} = %s, "
+                    f"{quote('root')} = %s, {quote('updated_at')} = %s WHERE {quote('id')} = %s",
+                    [tree.size, tree.to_bytes(), tree.root(), updated_at, AuditHead.SINGLETON],
+                )
+            sealed += len(staged)
+            if len(staged) < batch_size:
+                return sealed
+
+
+class PendingAuditEntry(models.Model):
+    """
+    A vote write staged for the audit log but not sealed into it yet.
+    
+    See ``AuditEntry.stage`` and ``AuditEntry.seal``.
+    
+    Attributes:
+        vote_id (int): The vote written
+        action (str): One of ``AuditEntry.ACTIONS``
+        digest (bytes): Leaf hash of the ``merkle.ballot_record`` of the write
+    """
+    # Not indexed: the table only holds writes waiting for the next seal,
+    # and every vote write inserts into it
+    vote_id = models.PositiveBigIntegerField()
+    action = models.CharField(max_length=7, choices=[(action, action) for action in AuditEntry.ACTIONS])
+    digest = models.BinaryField(max_length=merkle.DIGEST_SIZE)
+    
+    class Meta:
+        verbose_name_plural = 'pending audit entries'
+    
+    def __str__(self):
+        """String representation of the staged write."""
+        return f"pending: {self.action} vote {self.vote_id}"
+
+
+class AuditNode(models.Model):
+    """
+    Root of a perfect subtree of the audit log's Merkle tree.
+    
+    Attributes:
+        level (int): Height of the subtree, from 1 (two leaves); leaves are
+            ``AuditEntry`` rows
+        index (int): Position among the subtrees of its level; the subtree
+            covers entries ``index * 2 ** level`` to ``(index + 1) * 2 ** level - 1``
+        digest (bytes): Hash of the subtree
+    """
+    level = models.PositiveSmallIntegerField()
+    index = models.PositiveBigIntegerField()
+    digest = models.BinaryField(max_length=merkle.DIGEST_SIZE)
+    
+    class Meta:
+        constraints = [
+            # Lookups by position for proofs and verification
+            models.UniqueConstraint(fields=['level', 'index'], name='audit_node_position_uniq'),
+        ]
+    
+    def __str__(self):
+        """String representation of the node."""
+        return f"level {self.level} #{self.index}"
+
+
+class AuditHead(models.Model):
+    """
+    Current state of the audit log: a single row.
+    
+    Attributes:
+        size (int): Number of entries in the log
+        root (bytes): Merkle tree root of the log (``merkle.EMPTY_ROOT`` when empty)
+        peaks (bytes): Concatenated peaks of the tree (see ``merkle.MerkleAccumulator``)
+        updated_at (datetime): When the last entry was appended
+    """
+    # Primary key of the only row
+    SINGLETON = 1
+    
+    size = models.PositiveBigIntegerField(default=0)
+    root = models.BinaryField(max_length=merkle.DIGEST_SIZE, default=merkle.EMPTY_ROOT)
+    peaks = models.BinaryField(default=b'')
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        """String representation of the head."""
+        return f"{self.size} entries, root {bytes(self.root).hex()}"
+
+
+def _insert_rows(connection, cursor, model, columns, rows):
+    """Insert ``rows`` (tuples of ``columns`` values) with multi-row INSERTs."""
+    quote = connection.ops.quote_name
+    batch_size = max(connection.ops.bulk_batch_size(columns, rows), 1)
+    placeholders = f"({', '.join(['%s'] * len(columns))})"
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
+        cursor.execute(
+            f"INSERT INTO {quote(model._meta.db_table)} ({', '.join(map(quote, columns))}) "
+            f"VALUES {', '.join([placeholders] * len(batch))}",
+            [value for row in batch for value in row],
+        )
@@ -0,0 +1,242 @@
+"""
+Out-of-process chart rendering for the Voting System application.
+
+matplotlib holds the GIL for the whole rasterization and keeps global pyplot
+state, so rendering inside a web worker stalls every other request it serves
+(vote casting included). ``RenderFarm`` hands rendering to a pool of worker
+processes instead:
+- workers are started with ``multiprocessing``'s spawn method when a
+  server process handles its first request (``start_with_first_request``,
+  called by the WSGI and ASGI entry points) and pre-warmed
+  (``chart_renderer.warm``) so they have matplotlib loaded before the first
+  chart is requested; the web process itself never imports it
+- a pool inherited through ``fork`` (e.g. from a ``gunicorn --preload``
+  master) belongs to the parent and is dropped, so each process starts
+  its own
+- requests carry only plain labels/values over the pool's call queue
+- concurrent requests for the same chart share one render
+- at most ``WORKERS + MAX_QUEUE`` renders are in flight; beyond that,
+  ``RendererBusy`` is raised immediately rather than queueing without bound
+- callers wait at most ``TIMEOUT`` seconds (``RenderTimeout``)
+
+Callers are expected to fall back to the last cached image when rendering is
+unavailable (see ``ChartCache.latest``).
+
+Configured through ``settings.CHART_RENDERER``.
+"""
+
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.core.signals import request_started
+
+
+class RenderUnavailable(Exception):
+    """Raised when a chart can't be rendered right now."""
+
+
+class RendererBusy(RenderUnavailable):
+    """Raised when the render queue is full."""
+
+
+class RenderTimeout(RenderUnavailable):
+    """Raised when a render takes longer than the configured timeout."""
+
+
+class RenderFarm:
+    """
+    Pool of pre-warmed chart rendering processes.
+    
+    Attributes:
+        workers (int): Number of worker processes
+        max_queue (int): Renders allowed to wait for a free worker
+        timeout (float): Seconds a caller waits for a render
+        rejected (int): Renders refused because the queue was full
+        timeouts (int): Renders a caller gave up waiting for
+    """
+    
+    def __init__(self, workers=2, max_queue=8, timeout=10.0):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.rejected = 0
+        self.timeouts = 0
+        self._pool = None
+        self._lock = threading.Lock()
+        self._inflight = {}
+    
+    @classmethod
+    def from_settings(cls):
+        """Build a farm from ``settings.CHART_RENDERER``."""
+        options = getattr(settings, 'CHART_RENDERER', {})
+        return cls(
+            workers=options.get('WORKERS', 2),
+            max_queue=options.get('MAX_QUEUE', 8),
+            timeout=options.get('TIMEOUT', 10.0),
+        )
+    
+    def submit(self, key, chart_type, data, dpi, fmt, on_done=None):
+        """
+        Queue a render, or join the one already running for ``key``.
+        
+        Args:
+            key (tuple): Identifies the chart; renders with equal keys are
+                shared
+            chart_type, data, dpi, fmt: Passed to ``chart_renderer.render``
+            on_done (callable): Called with the image bytes once the render
+                succeeds (only for the render this call starts)
+        
+        Returns:
+            concurrent.futures.Future: Resolves to the image bytes
+        
+        Raises:
+            RendererBusy: If ``workers + max_queue`` renders are in flight
+        """
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                return future
+            if len(self._inflight) >= self.workers + self.max_queue:
+                self.rejected += 1
+                raise RendererBusy("Chart renderer queue is full.")
+            
+            future = self._executor().submit(_render_in_worker, chart_type, data, dpi, fmt)
+            self._inflight[key] = future
+        
+        def finished(future):
+            with self._lock:
+                self._inflight.pop(key, None)
+            if future.cancelled():
+                return
+            if isinstance(future.exception(), BrokenProcessPool):
+                # Drop the broken pool so the next render starts a fresh one
+                self.shutdown()
+            elif future.exception() is None and on_done is not None:
+                on_done(future.result())
+        
+        future.add_done_callback(finished)
+        return future
+    
+    def render(self, key, chart_type, data, dpi, fmt, on_done=None):
+        """
+        Render and wait for the image bytes.
+        
+        Raises:
+            RenderUnavailable: If the queue is full, the render times out or
+                the worker crashed
+        """
+        future = self.submit(key, chart_type, data, dpi, fmt, on_done)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            self.timeouts += 1
+            raise RenderTimeout(f"Chart render took longer than {self.timeout}s.")
+        except BrokenProcessPool as e:
+            raise RenderUnavailable(f"Chart renderer crashed: {e}")
+    
+    async def arender(self, key, chart_type, data, dpi, fmt, on_done=None):
+        """Async counterpart of ``render``; never blocks the event loop."""
+        future = self.submit(key, chart_type, data, dpi, fmt, on_done)
+        try:
+            # Shielded, so a caller giving up doesn't cancel a render that
+            # other requests are waiting on (or that will fill the cache)
+            return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), self.timeout)
+        except TimeoutError:
+            self.timeouts += 1
+            raise RenderTimeout(f"Chart render took longer than {self.timeout}s.")
+        except BrokenProcessPool as e:
+            raise RenderUnavailable(f"Chart renderer crashed: {e}")
+    
+    def start(self):
+        """
+        Start and warm every worker process now rather than on the first render.
+        
+        Returns without waiting for the workers to be ready.
+        """
+        with self._lock:
+            self._executor()
+    
+    def _forget_pool(self):
+        """
+        Drop the state inherited from the parent process after a fork.
+        
+        The pool's worker processes, queues and management thread belong to
+        the parent, and the lock may have been held by one of its threads.
+        """
+        self._pool = None
+        self._inflight = {}
+        self._lock = threading.Lock()
+    
+    def shutdown(self):
+        """Stop the worker processes; they are restarted on the next render."""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+    
+    def _executor(self):
+        """Return the process pool, starting it if needed (lock held)."""
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                # Spawned workers don't inherit the web process's threads,
+                # database connections or imported modules
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_warm_worker,
+            )
+            # The pool only spawns a worker when a task finds none idle, so
+            # one no-op per worker starts (and warms) all of them up front
+            for _ in range(self.workers):
+                self._pool.submit(_ready_in_worker)
+        return self._pool
+
+
+# Worker entry points. They live here rather than in chart_renderer so the
+# web process can reference them without importing matplotlib.
+
+def _warm_worker():
+    """Process initializer, run in each worker as it starts."""
+    from .chart_renderer import warm
+    warm()
+
+
+def _ready_in_worker():
+    """No-op task that makes the pool spawn a worker."""
+
+
+def _render_in_worker(chart_type, data, dpi, fmt):
+    """Draw one chart in a worker process (see ``chart_renderer.render``)."""
+    from .chart_renderer import render
+    return render(chart_type, data, dpi, fmt)
+
+
+# Process-wide farm used by the chart views
+render_farm = RenderFarm.from_settings()
+
+os.register_at_fork(after_in_child=render_farm._forget_pool)
+
+
+def start_with_first_request():
+    """
+    Start the render workers when this process handles its first request.
+    
+    Called by the WSGI and ASGI entry points. Starting the pool as they are
+    imported would start it in the process that imports the application,
+    which for a pre-forking server with preloading is the master.
+    """
+    request_started.connect(_start_on_request, dispatch_uid=_START_ON_REQUEST)
+
+
+# dispatch_uid of the ``request_started`` receiver
+_START_ON_REQUEST = 'votes_app.render_farm.start'
+
+
+def _start_on_request(**kwargs):
+    """``request_started`` receiver: start the pool once, then disconnect."""
+    request_started.disconnect(dispatch_uid=_START_ON_REQUEST)
+    render_farm.start()
@@ -0,0 +1,173 @@
+"""
+Vote rollup helpers for the Voting System application.
+
+Votes per candidate per minute, hour and day live in the VoteRollup table,
+which is maintained on every Vote write. This module provides the timeseries
+read helpers used by the trend chart and the ``/analytics/timeseries/`` endpoint,
+plus rebuild/verify routines used by ``manage.py rebuild_rollups``.
+"""
+
+import datetime
+import re
+
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import Trunc
+
+from .models import CandidateTally, Vote, VoteRollup
+
+# Default bucket width for trend charts and the timeseries API
+DEFAULT_GRANULARITY = 'day'
+
+# Most buckets a single timeseries request may span
+MAX_BUCKETS = 10000
+
+# Window units accepted by ``parse_window``, e.g. ``90m``, ``24h`` or ``7d``
+WINDOW_UNITS = {
+    'm': 'minutes',
+    'h': 'hours',
+    'd': 'days',
+}
+
+
+def parse_window(value):
+    """
+    Parse a window such as ``24h`` into a timedelta.
+    
+    Raises:
+        ValueError: If ``value`` isn't a positive number followed by one of
+            ``WINDOW_UNITS``
+    """
+    match = re.fullmatch(r'(\d+)([mhd])', value.strip())
+    if not match or not int(match[1]):
+        raise ValueError(f"Invalid window {value!r}; use e.g. 90m, 24h or 7d.")
+    return datetime.timedelta(**{WINDOW_UNITS[match[2]]: int(match[1])})
+
+
+def vote_timeseries(granularity=DEFAULT_GRANULARITY, since=None, until=None, candidate=None):
+    """
+    Return ``(bucket, vote_count)`` rows in bucket order.
+    
+    Only buckets with votes are returned (see ``fill_buckets``). The rows are
+    summed over candidates from the rollup table with a range scan of the
+    unique index, so the cost is O(buckets x candidates) however many ballots
+    fall in them.
+    
+    Args:
+        granularity (str): One of ``VoteRollup.GRANULARITIES``
+        since (datetime): Only buckets starting at or after this time
+        until (datetime): Only buckets starting before this time
+        candidate (int): Only votes for this candidate
+    """
+    rollups = VoteRollup.objects.filter(granularity=granularity)
+    if since is not None:
+        rollups = rollups.filter(bucket__gte=VoteRollup.bucket_start(since, granularity))
+    if until is not None:
+        rollups = rollups.filter(bucket__lt=until)
+    if candidate is not None:
+        rollups = rollups.filter(candidate_id=candidate)
+    return (
+        rollups
+        .values('bucket')
+        .annotate(total=Sum('vote_count'))
+        .filter(total__gt=0)
+        .order_by('bucket')
+        .values_list('bucket', 'total')
+    )
+
+
+def fill_buckets(rows, granularity, since, until):
+    """
+    Return ``rows`` with a zero row for every empty bucket from ``since`` to ``until``.
+    
+    Args:
+        rows (iterable): ``(bucket, vote_count)`` rows in bucket order, as
+            returned by ``vote_timeseries``
+    
+    Returns:
+        list: ``(bucket, vote_count)`` tuples, one per bucket
+    """
+    step = VoteRollup.GRANULARITIES[granularity]
+    counts = dict(rows)
+    bucket = VoteRollup.bucket_start(since, granularity)
+    filled = []
+    while bucket < until:
+        filled.append((bucket, counts.get(bucket, 0)))
+        bucket += step
+    return filled
+
+
+def bucket_count(granularity, since, until):
+    """Return how many ``granularity`` buckets span ``since`` to ``until``."""
+    span = until - VoteRollup.bucket_start(since, granularity)
+    return -(-span // VoteRollup.GRANULARITIES[granularity])
+
+
+def count_rollups():
+    """
+    Count votes per bucket directly from the Vote table.
+    
+    Returns:
+        dict: Mapping of ``(granularity, bucket, candidate_id)`` to vote count
+    """
+    counts = {}
+    for granularity in VoteRollup.GRANULARITIES:
+        counted = (
+            Vote.objects
+            .order_by()
+            .annotate(bucket=Trunc('timestamp', granularity, tzinfo=datetime.timezone.utc))
+            .values_list('bucket', 'candidate_id')
+            .annotate(vote_count=Count('id'))
+        )
+        for bucket, candidate_id, vote_count in counted:
+            counts[granularity, bucket, candidate_id] = vote_count
+    return counts
+
+
+def verify_rollups():
+    """
+    Compare the rollup table against a fresh count of the Vote table.
+    
+    Buckets stored with a count of zero match buckets with no votes.
+    
+    Returns:
+        list: ``(granularity, bucket, candidate_id, stored, actual)`` tuples
+        for every mismatch
+    """
+    stored = {
+        (granularity, bucket, candidate_id): vote_count
+        for granularity, bucket, candidate_id, vote_count in VoteRollup.objects.values_list(
+            'granularity', 'bucket', 'candidate_id', 'vote_count',
+        )
+    }
+    actual = count_rollups()
+    return [
+        (*key, stored.get(key), actual.get(key, 0))
+        for key in sorted(stored.keys() | actual.keys())
+        if stored.get(key, 0) != actual.get(key, 0)
+    ]
+
+
+def rebuild_rollups():
+    """
+    Recompute every VoteRollup row from the Vote table.
+    
+    The rebuild runs in a single transaction so readers see either the old or
+    the new rollups, never a partial mix. Empty buckets are dropped, and the
+    tallies of candidates whose rollups changed get a new revision so cached
+    trend charts are re-rendered.
+    
+    Returns:
+        list: The mismatches that were corrected (see ``verify_rollups``)
+    """
+    with transaction.atomic():
+        mismatches = verify_rollups()
+        VoteRollup.objects.all().delete()
+        VoteRollup.objects.bulk_create(
+            VoteRollup(granularity=granularity, bucket=bucket, candidate_id=candidate_id, vote_count=vote_count)
+            for (granularity, bucket, candidate_id), vote_count in count_rollups().items()
+        )
+        CandidateTally.objects.filter(
+            candidate_id__in={candidate_id for _, _, candidate_id, _, _ in mismatches},
+        ).update(**CandidateTally.changes())
+    return mismatches
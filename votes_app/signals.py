@@ -0,0 +1,160 @@
+"""
+Signal handlers for the Voting System application.
+
+Keeps CandidateTally and VoteRollup in step with writes that bypass
+``Vote.save``, such as admin deletions, queryset deletes and cascades from
+Voter/Candidate, records those deletions in the audit log, and keeps the
+tally version moving forward when candidates change. Every vote write also
+wakes the live results broadcaster and schedules sealing of the audit log
+once it commits, and voter edits and vote writes invalidate the voter cache.
+Candidate edits invalidate the cached page fragments. New database
+connections get the request metrics query counter.
+"""
+
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .audit import audit_sealer
+from .fragments import fragment_cache
+from .live import notify_tally_change
+from .metrics import record_query
+from .models import AuditEntry, Candidate, CandidateTally, Vote, Voter, VoteRollup
+from .voter_cache import voter_cache
+
+
+@receiver(post_save, sender=Candidate)
+def sync_candidate_tally(sender, instance, created, raw=False, **kwargs):
+    """
+    Create an empty tally row for every new candidate.
+    
+    Edits to an existing candidate (e.g. a rename) bump its tally revision so
+    cached charts showing the old name are invalidated.
+    """
+    if raw:
+        return
+    if created:
+        CandidateTally.objects.get_or_create(candidate=instance)
+    else:
+        CandidateTally.objects.filter(candidate=instance).update(**CandidateTally.changes())
+
+
+@receiver(post_save, sender=Candidate)
+@receiver(post_delete, sender=Candidate)
+def invalidate_candidate_fragments(sender, raw=False, **kwargs):
+    """
+    Drop the cached fragments once a candidate change commits.
+    
+    Pages keyed by the tally version would pick up the change anyway (it
+    bumps a revision); the candidate options of the voting form would not.
+    """
+    if not raw:
+        fragment_cache.invalidate_on_commit()
+
+
+@receiver(pre_delete, sender=Candidate)
+def retire_candidate_tally(sender, instance, **kwargs):
+    """
+    Carry a deleted candidate's revision over to another tally.
+    
+    The tally version is the sum of all revisions, so without this the
+    version would go backwards when a candidate (and its tally) is deleted.
+    It can only restart if the last remaining candidate is deleted, in which
+    case the chart cache is cleared as well.
+    """
+    retired = sum(
+        CandidateTally.objects.filter(candidate=instance).values_list('revision', flat=True)
+    )
+    heir = (
+        CandidateTally.objects.exclude(candidate=instance)
+        .order_by('pk')
+        .values_list('pk', flat=True)
+        .first()
+    )
+    if heir is None:
+        from .chart_cache import chart_cache
+        chart_cache.clear()
+        return
+    CandidateTally.objects.filter(pk=heir).update(
+        revision=F('revision') + retired + 1,
+    )
+
+
+@receiver(post_delete, sender=Vote)
+def decrement_candidate_tally(sender, instance, **kwargs):
+    """
+    Remove a deleted vote from its candidate's tally and rollup buckets.
+    
+    A plain UPDATE is used (rather than ``CandidateTally.adjust``) so that a
+    cascade from a candidate being deleted never recreates its tally row.
+    """
+    CandidateTally.objects.filter(
+        candidate_id=instance.candidate_id,
+        vote_count__gt=0,
+    ).update(**CandidateTally.changes(-1))
+    VoteRollup.retract(instance.candidate_id, instance.timestamp)
+
+
+@receiver(post_delete, sender=Vote)
+def retract_vote(sender, instance, **kwargs):
+    """
+    Stage the deletion of a vote for the audit log and drop its voter from
+    the voter cache once it commits.
+    
+    Both need the voter's UID, read once here. Deleted votes go before their
+    voter in a cascade, so it can still be read.
+    """
+    voter_uid = Voter.objects.filter(pk=instance.voter_id).values_list('uid', flat=True).first()
+    AuditEntry.stage([
+        ('retract', instance.pk, voter_uid or '', instance.candidate_id, instance.timestamp),
+    ])
+    if voter_uid is not None:
+        voter_cache.invalidate_on_commit(voter_uid)
+
+
+@receiver(post_save, sender=Vote)
+@receiver(post_delete, sender=Vote)
+def announce_vote_change(sender, raw=False, **kwargs):
+    """Push the new tallies to live viewers once the vote write commits."""
+    if not raw:
+        notify_tally_change()
+
+
+@receiver(post_save, sender=Vote)
+@receiver(post_delete, sender=Vote)
+def seal_audit_log(sender, raw=False, **kwargs):
+    """Seal the staged audit entry into the log shortly after the write commits."""
+    if not raw:
+        transaction.on_commit(audit_sealer.schedule)
+
+
+@receiver(post_save, sender=Vote)
+def invalidate_cached_voter(sender, instance, raw, created, **kwargs):
+    """
+    Drop the voter of a new vote from the voter cache.
+    
+    ``Vote.save`` has already loaded the voter (its validation does), so
+    this costs no query. ``cast_vote`` resolves the voter in SQL (so
+    ``voter_id`` is still an expression here) and invalidates by UID
+    itself; edits that don't create a vote leave ``has_voted`` unchanged.
+    Deleted votes are handled by ``retract_vote``.
+    """
+    if not raw and created and isinstance(instance.voter_id, int):
+        voter_cache.invalidate_on_commit(instance.voter.uid)
+
+
+@receiver(post_save, sender=Voter)
+@receiver(post_delete, sender=Voter)
+def invalidate_voter(sender, instance, created=False, raw=False, **kwargs):
+    """Drop an edited or deleted voter from the voter cache."""
+    if not raw and not created:
+        voter_cache.invalidate_on_commit(instance.uid)
+
+
+@receiver(connection_created)
+def count_request_queries(sender, connection, **kwargs):
+    """Count the connection's queries towards the sampled request, if any."""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
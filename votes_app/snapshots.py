@@ -0,0 +1,232 @@
+"""
+Static results snapshot for the Voting System application.
+
+Between votes, every viewer of the public results page gets the same HTML.
+With ``settings.RESULTS_SNAPSHOT['ENABLED']``, ``ResultsSnapshot`` publishes
+the results to a directory (``MEDIA_ROOT/results`` by default) whenever the
+tallies change:
+- ``index.html``: the results page, rendered from the same template
+- ``tallies.json``: the tally version, total and per-candidate counts
+- ``chart-<type>.png``: every chart at the default size
+Each file is written to a temporary file and renamed into place, so readers
+never see a partial file, and the page is written last.
+
+Publishing is debounced: the first tally change (see
+``live.notify_tally_change``) starts a timer and everything that commits
+before it fires goes into one snapshot. Processes publishing to the same
+directory take turns through a lock file and skip versions that are
+already published.
+
+The ``results`` view serves ``index.html`` without touching the database,
+and a reverse proxy can serve the directory directly. The snapshot can lag
+behind by ``DEBOUNCE`` seconds plus the render time; the page's live stream
+brings it up to date as soon as it is opened.
+
+Configured through ``settings.RESULTS_SNAPSHOT``.
+"""
+
+import fcntl
+import json
+import logging
+import os
+import tempfile
+import threading
+from functools import partial
+from pathlib import Path
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .chart_cache import chart_cache
+from .charts import CHART_TYPES, DEFAULT_CHART_SIZE, load_chart_data, render_chart
+from .render_farm import RenderUnavailable
+from .rollups import DEFAULT_GRANULARITY
+from .tallies import candidate_percentages, tally_version, total_votes_cast
+
+logger = logging.getLogger(__name__)
+
+# File names inside the snapshot directory
+PAGE_FILE = 'index.html'
+TALLIES_FILE = 'tallies.json'
+LOCK_FILE = '.lock'
+
+
+class ResultsSnapshot:
+    """
+    Debounced publisher of the results page, tallies and charts as files.
+    
+    Attributes:
+        enabled (bool): Whether snapshots are published and served
+        directory (Path): Where the snapshot is written
+        debounce (float): Seconds to wait after a tally change before
+            publishing, so bursts of votes cost one snapshot
+        publishes (int): Snapshots written by this process
+    """
+    
+    def __init__(self, enabled=False, directory=None, debounce=1.0):
+        self.enabled = enabled
+        self.directory = Path(directory) if directory else None
+        self.debounce = debounce
+        self.publishes = 0
+        self._timer = None
+        self._lock = threading.Lock()
+    
+    @classmethod
+    def from_settings(cls):
+        """Build a publisher from ``settings.RESULTS_SNAPSHOT``."""
+        options = getattr(settings, 'RESULTS_SNAPSHOT', {})
+        return cls(
+            enabled=options.get('ENABLED', False),
+            directory=options.get('DIRECTORY'),
+            debounce=options.get('DEBOUNCE', 1.0),
+        )
+    
+    def page(self):
+        """
+        Return the path of the published results page.
+        
+        Returns:
+            Path: ``index.html``, or None when snapshots are disabled or none
+            has been published yet (one is then scheduled)
+        """
+        if not self.enabled:
+            return None
+        path = self.directory / PAGE_FILE
+        if not path.exists():
+            self.schedule()
+            return None
+        return path
+    
+    def schedule(self):
+        """
+        Publish a snapshot in ``debounce`` seconds unless one is pending.
+        
+        Safe to call from any thread; a no-op when snapshots are disabled.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            if self._timer is not None:
+                return
+            self._timer = threading.Timer(self.debounce, self._publish_scheduled)
+            self._timer.daemon = True
+            self._timer.start()
+    
+    def publish(self, force=False):
+        """
+        Write a snapshot of the current results.
+        
+        Args:
+            force (bool): Publish even if this tally version already is
+        
+        Returns:
+            int: The tally version published, or None if it already was
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with open(self.directory / LOCK_FILE, 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            version = tally_version()
+            if not force and version == self.published_version():
+                return None
+            
+            tallies = self._load_tallies(version)
+            tallies['charts'] = self._write_charts(version)
+            self._write(TALLIES_FILE, json.dumps(tallies, cls=DjangoJSONEncoder).encode())
+            self._write(PAGE_FILE, render_to_string('votes_app/results.html', {
+                'total_votes': tallies['total_votes'],
+                'candidate_votes': tallies['candidates'],
+            }).encode())
+        
+        self.publishes += 1
+        return version
+    
+    def published_version(self):
+        """Return the tally version of the published snapshot, or None."""
+        try:
+            with open(self.directory / TALLIES_FILE) as tallies:
+                return json.load(tallies)['version']
+        except (OSError, ValueError, KeyError):
+            return None
+    
+    def _load_tallies(self, version):
+        """Read the tallies as the results page shows them."""
+        total_votes = total_votes_cast()
+        candidates = candidate_percentages(total_votes).order_by('-vote_count', 'name')
+        return {
+            'version': version,
+            'published_at': timezone.now(),
+            'total_votes': total_votes,
+            'candidates': [
+                {
+                    'id': candidate.id,
+                    'name': candidate.name,
+                    'party': candidate.party,
+                    'vote_count': candidate.vote_count,
+                    'percentage': candidate.percentage,
+                }
+                for candidate in candidates
+            ],
+        }
+    
+    def _write_charts(self, version):
+        """
+        Write every chart, reusing the chart cache where it has them.
+        
+        Returns:
+            dict: File name per chart type; a chart the render farm can't
+            draw right now keeps its previous file
+        """
+        charts = {}
+        for chart_type in CHART_TYPES:
+            # Same cache keys as the chart views
+            variant = f"{DEFAULT_CHART_SIZE}-png" + (f"-{DEFAULT_GRANULARITY}" if chart_type == 'line' else "")
+            name = f"chart-{chart_type}.png"
+            image = chart_cache.lookup(chart_type, variant, version)
+            if image is None:
+                try:
+                    image = render_chart(
+                        chart_type,
+                        load_chart_data(chart_type),
+                        key=(chart_type, variant, version),
+                        on_done=partial(chart_cache.set, chart_type, variant, version),
+                    )
+                except RenderUnavailable:
+                    logger.warning("Could not render the %s chart for the results snapshot", chart_type)
+                    if (self.directory / name).exists():
+                        charts[chart_type] = name
+                    continue
+            self._write(name, image)
+            charts[chart_type] = name
+        return charts
+    
+    def _write(self, name, data):
+        """Atomically replace ``name`` in the snapshot directory with ``data``."""
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            # mkstemp creates the file private; the proxy must be able to read it
+            os.chmod(tmp, 0o644)
+            os.replace(tmp, self.directory / name)
+        except OSError:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+    
+    def _publish_scheduled(self):
+        """Timer callback: publish, logging rather than raising failures."""
+        with self._lock:
+            # Changes committed from now on need another snapshot
+            self._timer = None
+        try:
+            self.publish()
+        except Exception:
+            logger.exception("Failed to publish the results snapshot")
+        finally:
+            connection.close()
+
+
+# Process-wide publisher, scheduled by ``live.notify_tally_change``
+results_snapshot = ResultsSnapshot.from_settings()
@@ -0,0 +1,174 @@
+"""
+Vectorized vote statistics for the Voting System application.
+
+The tallies are read with a single ``values_list`` query straight into NumPy
+arrays, and every statistic is computed with array operations rather than
+per-candidate Python loops, so a summary over thousands of candidates takes
+microseconds once the rows are loaded.
+
+``summarize`` returns plain JSON-ready values; it backs the analytics page
+and its JSON endpoint (``/analytics/stats/``).
+
+This module imports numpy at the top, so import it lazily from views on the
+voting path (see ``views``).
+"""
+
+import numpy as np
+from django.db.models import F, Window
+from django.db.models.functions import DenseRank
+
+from .tallies import candidate_tallies
+
+# Percentiles of votes per candidate included in the summary
+PERCENTILES = (10, 25, 50, 75, 90)
+
+
+def _tally_rows():
+    """
+    Return ``(id, name, party, party_index, vote_count)`` rows, most votes first.
+    
+    ``party_index`` numbers the distinct parties 1..k (a dense rank computed
+    by the database), so votes can be summed per party with ``bincount``
+    instead of grouping party names in Python.
+    """
+    return (
+        candidate_tallies()
+        .annotate(party_index=Window(DenseRank(), order_by=F('party').asc()))
+        .order_by('-vote_count', 'name')
+        .values_list('id', 'name', 'party', 'party_index', 'vote_count')
+    )
+
+
+def load_tallies():
+    """
+    Load every candidate's tally in one query.
+    
+    Returns:
+        dict: ``ids``, ``names`` and ``parties`` lists plus ``party_index``
+        and ``votes`` int64 arrays, all in the same order (most votes first)
+    """
+    return _tallies_from_rows(list(_tally_rows()))
+
+
+async def aload_tallies():
+    """Async counterpart of ``load_tallies``."""
+    return _tallies_from_rows([row async for row in _tally_rows()])
+
+
+def _tallies_from_rows(rows):
+    """Transpose query rows into parallel columns."""
+    ids, names, parties, party_index, votes = zip(*rows) if rows else ((),) * 5
+    return {
+        'ids': list(ids),
+        'names': list(names),
+        'parties': list(parties),
+        'party_index': np.fromiter(party_index, dtype=np.int64, count=len(party_index)) - 1,
+        'votes': np.fromiter(votes, dtype=np.int64, count=len(votes)),
+    }
+
+
+def summarize(tallies):
+    """
+    Compute the statistics shown on the analytics dashboard.
+    
+    Args:
+        tallies (dict): As returned by ``load_tallies``
+    
+    Returns:
+        dict: JSON-ready statistics:
+            - ``total_votes``, ``total_candidates``
+            - ``mean``, ``median``, ``stdev`` (population) and ``min``/``max``
+              votes per candidate
+            - ``percentiles``: votes per candidate at each of ``PERCENTILES``
+            - ``margin_of_victory``: votes and share of the total between
+              the top two candidates (None with fewer than two)
+            - ``effective_number_of_candidates`` and
+              ``effective_number_of_parties``: 1 / sum of squared vote shares
+              (Laakso-Taagepera), None before any votes are cast
+            - ``candidate_ids`` and ``candidate_shares``: parallel lists with
+              each candidate's percentage of the vote, most votes first
+            - ``party_shares``: percentage of the vote per party
+    """
+    votes = tallies['votes']
+    total = int(votes.sum())
+    count = len(votes)
+    
+    summary = {
+        'total_votes': total,
+        'total_candidates': count,
+        'mean': 0.0,
+        'median': 0.0,
+        'stdev': 0.0,
+        'min': 0,
+        'max': 0,
+        'percentiles': {str(p): 0.0 for p in PERCENTILES},
+        'margin_of_victory': None,
+        'effective_number_of_candidates': None,
+        'effective_number_of_parties': None,
+        'candidate_ids': tallies['ids'],
+        'candidate_shares': [0.0] * count,
+        'party_shares': {},
+    }
+    if count == 0:
+        return summary
+    
+    # Order statistics are read off the sorted counts; load_tallies already
+    # returns them sorted, so this is normally just a reversed view
+    descending = np.all(votes[:-1] >= votes[1:])
+    ascending = votes[::-1] if descending else np.sort(votes)
+    quantiles = _sorted_quantiles(ascending, np.array((50,) + PERCENTILES) / 100)
+    
+    summary.update(
+        mean=_rounded(votes.mean()),
+        median=_rounded(quantiles[0]),
+        stdev=_rounded(votes.std()),
+        min=int(ascending[0]),
+        max=int(ascending[-1]),
+        percentiles=dict(zip((str(p) for p in PERCENTILES), np.round(quantiles[1:], 2).tolist())),
+    )
+    
+    if count > 1:
+        margin = int(ascending[-1] - ascending[-2])
+        summary['margin_of_victory'] = {
+            'votes': margin,
+            'share': _rounded(100 * margin / total) if total else 0.0,
+        }
+    
+    # Votes per party, summed by the database-assigned party index
+    party_index = tallies['party_index']
+    party_votes = np.bincount(party_index, weights=votes)
+    # Look each party's name up from its first candidate
+    _, first = np.unique(party_index, return_index=True)
+    party_names = [tallies['parties'][i] for i in first.tolist()]
+    
+    if total:
+        candidate_shares = votes / total
+        party_shares = party_votes / total
+        summary.update(
+            effective_number_of_candidates=_rounded(1 / np.dot(candidate_shares, candidate_shares)),
+            effective_number_of_parties=_rounded(1 / np.dot(party_shares, party_shares)),
+            candidate_shares=np.round(100 * candidate_shares, 2).tolist(),
+            party_shares=dict(zip(party_names, np.round(100 * party_shares, 2).tolist())),
+        )
+    else:
+        summary['party_shares'] = dict.fromkeys(party_names, 0.0)
+    return summary
+
+
+def _sorted_quantiles(ascending, q):
+    """
+    Linearly interpolated quantiles ``q`` (0..1) of an ascending array.
+    
+    Matches ``np.quantile``'s default method without re-partitioning the
+    data for every call.
+    """
+    position = q * (len(ascending) - 1)
+    lower = np.floor(position).astype(np.int64)
+    upper = np.minimum(lower + 1, len(ascending) - 1)
+    fraction = position - lower
+    return ascending[lower] * (1 - fraction) + ascending[upper] * fraction
+
+
+def _rounded(value):
+    """Round a NumPy scalar to 2 decimals as a plain float."""
+    return round(float(value), 2)
@@ -0,0 +1,145 @@
+"""
+Tally helpers for the Voting System application.
+
+The per-candidate vote counts live in the CandidateTally table, which is
+maintained on every Vote write. This module provides the read helpers used by
+the views, plus rebuild/verify routines used by ``manage.py rebuild_tallies``.
+"""
+
+from django.db import transaction
+from django.db.models import Count, F, FloatField, Sum, Value
+from django.db.models.functions import Coalesce, Round
+
+from .models import Candidate, CandidateTally, Vote
+
+
+def candidate_tallies():
+    """
+    Return candidates annotated with ``vote_count`` from the tally table.
+    
+    This is a single LEFT JOIN over candidates and never touches Vote, so the
+    cost is O(candidates) regardless of how many ballots have been cast.
+    """
+    return Candidate.objects.annotate(
+        vote_count=Coalesce('tally__vote_count', Value(0)),
+    )
+
+
+def candidate_percentages(total_votes):
+    """
+    Return ``candidate_tallies()`` also annotated with ``percentage``.
+    
+    The share of ``total_votes`` (rounded to 2 decimals) is computed by the
+    database in the same query, instead of per candidate in Python.
+    """
+    if not total_votes:
+        percentage = Value(0.0, output_field=FloatField())
+    else:
+        percentage = Round(F('vote_count') * 100.0 / total_votes, 2, output_field=FloatField())
+    return candidate_tallies().annotate(percentage=percentage)
+
+
+def total_votes_cast():
+    """Return the total number of votes cast, summed from the tally table."""
+    return CandidateTally.objects.aggregate(
+        total=Coalesce(Sum('vote_count'), Value(0)),
+    )['total']
+
+
+async def atotal_votes_cast():
+    """Async counterpart of ``total_votes_cast``."""
+    return (await CandidateTally.objects.aaggregate(
+        total=Coalesce(Sum('vote_count'), Value(0)),
+    ))['total']
+
+
+def tally_version():
+    """
+    Return the current tally version.
+    
+    The version is the sum of every tally's revision. Each vote, deletion,
+    rebuild correction or candidate edit bumps a revision, so the version
+    increases monotonically and can key caches of anything derived from the
+    tallies (charts, exports, snapshots).
+    """
+    return CandidateTally.objects.aggregate(
+        version=Coalesce(Sum('revision'), Value(0)),
+    )['version']
+
+
+async def atally_version():
+    """Async counterpart of ``tally_version``."""
+    return (await CandidateTally.objects.aaggregate(
+        version=Coalesce(Sum('revision'), Value(0)),
+    ))['version']
+
+
+def party_tallies():
+    """
+    Return ``{'party', 'total_votes'}`` rows summed from the tally table.
+    
+    Rows are ordered by total votes, highest first.
+    """
+    return (
+        Candidate.objects
+        .values('party')
+        .annotate(total_votes=Coalesce(Sum('tally__vote_count'), Value(0)))
+        .order_by('-total_votes')
+    )
+
+
+def count_votes():
+    """
+    Count votes per candidate directly from the Vote table.
+    
+    Returns:
+        dict: Mapping of candidate id to vote count (candidates without votes
+        are included with a count of zero)
+    """
+    counts = dict.fromkeys(Candidate.objects.values_list('id', flat=True), 0)
+    counted = (
+        Vote.objects
+        .order_by()
+        .values_list('candidate_id')
+        .annotate(vote_count=Count('id'))
+    )
+    counts.update(counted)
+    return counts
+
+
+def verify_tallies():
+    """
+    Compare the tally table against a fresh count of the Vote table.
+    
+    Returns:
+        list: ``(candidate_id, stored, actual)`` tuples for every mismatch
+    """
+    stored = dict(CandidateTally.objects.values_list('candidate_id', 'vote_count'))
+    actual = count_votes()
+    return [
+        (candidate_id, stored.get(candidate_id), vote_count)
+        for candidate_id, vote_count in sorted(actual.items())
+        if stored.get(candidate_id) != vote_count
+    ]
+
+
+def rebuild_tallies():
+    """
+    Recompute every CandidateTally row from the Vote table.
+    
+    The rebuild runs in a single transaction so readers see either the old or
+    the new tallies, never a partial mix.
+    
+    Returns:
+        list: The mismatches that were corrected (see ``verify_tallies``)
+    """
+    with transaction.atomic():
+        mismatches = verify_tallies()
+        for candidate_id, stored, actual in mismatches:
+            if stored is None:
+                CandidateTally.objects.create(candidate_id=candidate_id, vote_count=actual)
+            else:
+                CandidateTally.objects.filter(candidate_id=candidate_id).update(
+                    **{**CandidateTally.changes(), 'vote_count': actual}
+                )
+    return mismatches
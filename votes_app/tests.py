@@ -1,3 +1,1658 @@
-from django.test import TestCase
+"""
+Tests for the Voting System application.
+"""
 
-# Create your tests here.
+import csv
+import datetime
+import gzip
+import io
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import Future
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.messages import get_messages
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.core.signals import request_started
+from django.db import DataError, IntegrityError, connection, connections
+from django.http import FileResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.utils import timezone
+
+from benchmarks import compare
+
+from . import ballots, live, merkle, snapshots, urls
+from . import render_farm as render_farm_module
+from .admin import EstimatedCountPaginator
+from .audit import audit_sealer, verify_log
+from .ballots import AlreadyVoted, cast_vote, import_ballots, parse_ballots
+from .chart_cache import ChartCache
+from .charts import CHART_TYPES
+from .exports import export_queryset
+from .fragments import fragment_cache
+from .journal import VoteJournal
+from .metrics import RequestMetrics, RequestSample, request_metrics
+from .middleware import UNMATCHED_VIEW, RequestMetricsMiddleware
+from .models import AuditEntry, AuditNode, Candidate, CandidateTally, Vote, Voter, VoteRollup
+from .render_farm import RenderFarm, RendererBusy, RenderTimeout, render_farm
+from .rollups import count_rollups, fill_buckets, rebuild_rollups, verify_rollups, vote_timeseries
+from .stats import PERCENTILES, load_tallies, summarize
+from .tallies import candidate_tallies, tally_version, verify_tallies
+from .voter_cache import VoterCache, voter_cache
+from .voter_roll import import_voters, parse_roll
+
+
+@skipUnless(connection.vendor == 'sqlite', "Query plans are checked against SQLite")
+class QueryPlanTests(TestCase):
+    """
+    Check with EXPLAIN that the hot query shapes are served by indexes.
+    """
+
+    def assertPlanUses(self, queryset, *fragments):
+        plan = queryset.explain()
+        for fragment in fragments:
+            self.assertIn(fragment, plan)
+        return plan
+
+    def test_results_never_reads_the_vote_table(self):
+        plan = candidate_tallies().order_by('-vote_count', 'name').explain()
+        self.assertNotIn('votes_app_vote ', plan)
+        self.assertIn('SEARCH votes_app_candidatetally', plan)
+
+    def test_trends_never_read_the_vote_table(self):
+        plan = self.assertPlanUses(
+            vote_timeseries('hour', since=timezone.now()),
+            'SEARCH votes_app_voterollup USING INDEX',
+            '(granularity=? AND bucket>?)',
+        )
+        self.assertNotIn('votes_app_vote ', plan)
+
+    def test_export_reads_in_timestamp_index_order(self):
+        plan = self.assertPlanUses(
+            export_queryset(),
+            'SCAN votes_app_vote USING INDEX vote_timestamp_idx',
+        )
+        self.assertNotIn('TEMP B-TREE FOR ORDER BY', plan)
+
+    def test_candidate_export_uses_composite_index(self):
+        self.assertPlanUses(
+            export_queryset(candidate=1),
+            'SEARCH votes_app_vote USING INDEX vote_candidate_ts_idx (candidate_id=?)',
+        )
+
+    def test_voter_default_ordering_uses_index(self):
+        self.assertPlanUses(
+            Voter.objects.all(),
+            'SCAN votes_app_voter USING INDEX voter_registered_on_idx',
+        )
+
+
+class QueryShapeAuditMixin:
+    """
+    Assertions that flag SQL paying for ordering or grouping it doesn't need.
+    
+    A query is rejected if it has:
+    - an ORDER BY on an aggregate or existence check (COUNT, EXISTS-style
+      ``SELECT 1``, or an aggregate without GROUP BY)
+    - an ORDER BY inside a subquery
+    - an ORDER BY on a lookup by primary or unique key
+    - a model's default-ordering column in its GROUP BY clause
+    """
+
+    # Columns behind Meta.ordering, which must never leak into GROUP BY
+    DEFAULT_ORDERING_COLUMNS = [
+        f'"{model._meta.db_table}"."{model._meta.get_field(name.lstrip("-")).column}"'
+        for model in (Candidate, Voter, Vote)
+        for name in model._meta.ordering
+    ]
+    AGGREGATE_SELECT = re.compile(r'^SELECT (COUNT|SUM|MAX|MIN|AVG|COALESCE\(SUM)\(|^SELECT 1 AS "a"')
+    SUBQUERY_ORDER_BY = re.compile(r'\(SELECT (?:(?!\(SELECT).)*? ORDER BY [^)]*\)')
+    KEY_LOOKUP = re.compile(r'WHERE "[a-z_]+"\."(id|uid)" = \S+( LIMIT \d+)?$')
+    GROUP_BY = re.compile(r' GROUP BY (.*?)(?: HAVING | ORDER BY | LIMIT |$)')
+
+    def query_shape_problems(self, sql):
+        """Return the reasons ``sql`` fails the audit (empty if it passes)."""
+        problems = []
+        has_order_by = ' ORDER BY ' in sql
+        has_group_by = ' GROUP BY ' in sql
+        if has_order_by and self.AGGREGATE_SELECT.match(sql) and not has_group_by:
+            problems.append("ORDER BY on an aggregate/existence query")
+        if self.SUBQUERY_ORDER_BY.search(sql):
+            problems.append("ORDER BY inside a subquery")
+        if has_order_by and self.KEY_LOOKUP.search(sql.split(' ORDER BY ')[0]):
+            problems.append("ORDER BY on a primary/unique key lookup")
+        group_by = self.GROUP_BY.search(sql)
+        if group_by:
+            for column in self.DEFAULT_ORDERING_COLUMNS:
+                # Columns wrapped in a function (e.g. a date truncation) are
+                # real grouping keys, bare ones are leaked ordering
+                if re.search(rf'(^|, ){re.escape(column)}', group_by.group(1)):
+                    problems.append(f"default ordering column {column} in GROUP BY")
+        return problems
+
+    def assertQueryShapes(self, queries, label=''):
+        failures = [
+            f"{problem}: {query['sql']}"
+            for query in queries
+            for problem in self.query_shape_problems(query['sql'])
+        ]
+        if failures:
+            self.fail(f"{label} issued unnecessary ORDER BY/GROUP BY:\n" + "\n".join(failures))
+
+
+@override_settings(BALLOT_IMPORT_TOKEN='test-token')
+class ViewQueryShapeTests(QueryShapeAuditMixin, TestCase):
+    """
+    Capture the SQL issued by every view and audit its shape.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = Candidate.objects.create(name='Alice', party='Blue')
+        cls.bob = Candidate.objects.create(name='Bob', party='Green')
+        for i in range(6):
+            cast_vote(f'V{i}', cls.alice.id if i % 3 else cls.bob.id)
+
+    def setUp(self):
+        patcher = mock.patch.object(request_metrics, 'token', 'test-token')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def view_requests(self):
+        """One representative request per URL name in votes_app.urls."""
+        ballot_csv = f'voter_uid,candidate_id\nB1,{self.alice.id}\nV1,{self.bob.id}\n'
+        return {
+            'home': [('get', reverse('votes_app:home') + '?uid=V1', {})],
+            'vote': [
+                ('post', reverse('votes_app:vote'), {'voter_uid': 'NEW', 'candidate_id': self.bob.id}),
+                ('post', reverse('votes_app:vote'), {'voter_uid': 'V2', 'candidate_id': self.bob.id}),
+            ],
+            'upload_ballots': [(
+                'post', reverse('votes_app:upload_ballots'),
+                {'data': ballot_csv, 'content_type': 'text/csv', 'HTTP_AUTHORIZATION': 'Bearer test-token'},
+            )],
+            'results': [('get', reverse('votes_app:results'), {})],
+            'analytics': [('get', reverse('votes_app:analytics'), {})],
+            'analytics_stats': [('get', reverse('votes_app:analytics_stats'), {})],
+            'analytics_timeseries': [
+                ('get', reverse('votes_app:analytics_timeseries'), {}),
+                ('get', reverse('votes_app:analytics_timeseries') + f'?granularity=hour&window=24h&candidate={self.alice.id}', {}),
+            ],
+            'export_results': [
+                ('get', reverse('votes_app:export_results'), {}),
+                ('get', reverse('votes_app:export_results') + f'?candidate={self.alice.id}', {}),
+            ],
+            'metrics': [('get', reverse('votes_app:metrics'), {'headers': {'Authorization': 'Bearer test-token'}})],
+            'audit_digest': [
+                ('get', reverse('votes_app:audit_digest'), {}),
+                ('get', reverse('votes_app:audit_digest') + '?seq=3', {}),
+            ],
+            'chart_data': [
+                ('get', reverse('votes_app:chart_data'), {}),
+                ('get', reverse('votes_app:chart_data') + '?granularity=hour', {}),
+            ],
+            **{
+                name: [('get', reverse(f'votes_app:{name}') + '?format=png', {})]
+                for name in (
+                    'generate_chart', 'generate_pie_chart', 'generate_horizontal_chart',
+                    'generate_party_chart', 'generate_line_chart',
+                )
+            },
+        }
+
+    # Endless event streams, which the sync test client can't consume; the
+    # live broadcaster only reads the tally table with a plain values_list
+    UNBOUNDED_VIEWS = {'live_results'}
+    
+    def test_every_view_is_covered(self):
+        names = {pattern.name for pattern in urls.urlpatterns}
+        self.assertEqual(names - self.UNBOUNDED_VIEWS, set(self.view_requests()))
+
+    def test_views_issue_no_unnecessary_ordering_or_grouping(self):
+        for name, view_requests in self.view_requests().items():
+            for method, url, extra in view_requests:
+                with self.subTest(view=name, url=url):
+                    with CaptureQueriesContext(connection) as ctx:
+                        if method == 'post' and 'data' in extra:
+                            extra = dict(extra)
+                            response = self.client.post(url, extra.pop('data'), **extra)
+                        elif 'headers' in extra:
+                            response = getattr(self.client, method)(url, headers=extra['headers'])
+                        else:
+                            response = getattr(self.client, method)(url, extra)
+                        if hasattr(response, 'streaming_content'):
+                            b''.join(response.streaming_content)
+                    self.assertLess(response.status_code, 400)
+                    self.assertQueryShapes(ctx.captured_queries, label=name)
+
+    def test_audit_flags_leaked_ordering(self):
+        with CaptureQueriesContext(connection) as ctx:
+            Voter.objects.filter(uid='V1').first()
+            list(Vote.objects.filter(voter_id__in=Voter.objects.values('id')[:5]))
+        self.assertEqual(len(self.query_shape_problems(ctx.captured_queries[0]['sql'])), 1)
+        self.assertEqual(len(self.query_shape_problems(ctx.captured_queries[1]['sql'])), 1)
+
+
+class AdminQueryCountTests(TestCase):
+    """
+    Admin pages issue a fixed number of queries, however many rows there are.
+    
+    Every count includes the session and user lookups of the logged-in admin.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = Candidate.objects.create(name='Alice', party='Blue')
+        cls.bob = Candidate.objects.create(name='Bob', party='Green')
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        cls.cast(10)
+
+    @classmethod
+    def cast(cls, count):
+        start = Voter.objects.count()
+        for i in range(start, start + count):
+            cast_vote(f'V{i}', cls.alice.id if i % 3 else cls.bob.id)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def assertPageQueries(self, num, url):
+        with self.assertNumQueries(num):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_changelists(self):
+        pages = [
+            # Candidate filter choices, estimate, count, rows with voter and candidate
+            (6, reverse('admin:votes_app_vote_changelist')),
+            # Filtered: an exact count instead of estimate and count
+            (5, reverse('admin:votes_app_vote_changelist') + f'?candidate__id__exact={self.alice.id}'),
+            (5, reverse('admin:votes_app_vote_changelist') + '?timestamp__gte=2000-01-01+00:00:00%2B00:00'),
+            (5, reverse('admin:votes_app_voter_changelist')),
+            (4, reverse('admin:votes_app_voter_changelist') + '?registered_on__gte=2000-01-01+00:00:00%2B00:00'),
+            (6, reverse('admin:votes_app_candidate_changelist')),
+        ]
+        for num, url in pages:
+            with self.subTest(url=url):
+                self.assertPageQueries(num, url)
+        self.cast(20)
+        for num, url in pages:
+            with self.subTest(url=url, votes=30):
+                self.assertPageQueries(num, url)
+
+    def test_vote_forms_never_list_every_voter(self):
+        vote = Vote.objects.first()
+        response = self.assertPageQueries(3, reverse('admin:votes_app_vote_add'))
+        self.assertNotContains(response, 'V1</option>')
+        # The vote, and the voter and candidate shown next to the widgets
+        self.assertPageQueries(5, reverse('admin:votes_app_vote_change', args=[vote.pk]))
+        self.assertPageQueries(3, reverse('admin:votes_app_vote_delete', args=[vote.pk]))
+        self.assertPageQueries(4, reverse('admin:votes_app_voter_change', args=[vote.voter_id]))
+        self.assertPageQueries(
+            4, reverse('admin:autocomplete') + '?app_label=votes_app&model_name=vote&field_name=candidate&term=Ali',
+        )
+
+    def test_large_tables_are_not_counted(self):
+        url = reverse('admin:votes_app_vote_changelist')
+        with mock.patch.object(EstimatedCountPaginator, 'ESTIMATE_THRESHOLD', 5):
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([q for q in ctx.captured_queries if 'COUNT(' in q['sql']])
+        self.assertEqual(response.context['cl'].result_count, Vote.objects.count())
+
+
+class FragmentCacheTests(TestCase):
+    """
+    Cached fragments are served without queries and follow candidate and
+    tally changes.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = Candidate.objects.create(name='Alice', party='Blue')
+        cast_vote('V1', cls.alice.id)
+
+    def setUp(self):
+        # Versions repeat between tests, as each one rolls back
+        fragment_cache.invalidate()
+
+    def test_home_candidate_options(self):
+        with self.assertNumQueries(1):
+            self.client.get(reverse('votes_app:home'))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('votes_app:home'))
+        self.assertContains(response, 'Alice (Blue)')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Candidate.objects.create(name='Bob', party='Green')
+        self.assertContains(self.client.get(reverse('votes_app:home')), 'Bob (Green)')
+
+    def test_results_follow_the_tally_version(self):
+        self.client.get(reverse('votes_app:results'))
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('votes_app:results'))
+        self.assertContains(response, '<h2 id="total-votes">1</h2>', html=True)
+
+        cast_vote('V2', self.alice.id)
+        self.assertContains(self.client.get(reverse('votes_app:results')), '<h2 id="total-votes">2</h2>', html=True)
+        self.assertGreaterEqual(fragment_cache.stats()['results']['hits'], 1)
+
+
+class VoterRollImportTests(TestCase):
+    """
+    Roll imports skip registered voters and can resume part-way.
+    """
+
+    ROLL = 'uid,name\nR1,Ann\nR2,\nR1,Ann again\n,Nobody\nV1,Already\nR3,Cy\n'
+
+    def test_import(self):
+        Voter.objects.create(uid='V1', name='Registered')
+        rejected = []
+        # One INSERT per chunk, each in its own transaction (a savepoint here)
+        with self.assertNumQueries(6):
+            totals = import_voters(parse_roll(io.StringIO(self.ROLL)), chunk_size=3, report=rejected.append)
+        self.assertEqual(totals, {'rows': 6, 'inserted': 3, 'existing': 1, 'duplicates': 1, 'rejected': 1})
+        self.assertEqual(rejected, [{'row': 5, 'uid': None, 'reason': 'Missing uid'}])
+        self.assertEqual(Voter.objects.get(uid='R2').name, 'Voter R2')
+        self.assertEqual(Voter.objects.get(uid='V1').name, 'Registered')
+
+        totals = import_voters(parse_roll(io.StringIO(self.ROLL)), chunk_size=3, skip=3)
+        self.assertEqual(totals['rows'], 6)
+        self.assertEqual(totals['existing'], 2)
+        self.assertEqual(Voter.objects.count(), 4)
+
+
+class AuditLogTests(TestCase):
+    """
+    Every vote write lands in the Merkle tree log, and tampering shows up.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = Candidate.objects.create(name='Alice', party='Blue')
+        cls.bob = Candidate.objects.create(name='Bob', party='Green')
+        for i in range(11):
+            cast_vote(f'V{i}', cls.alice.id if i % 3 else cls.bob.id)
+        amended = Vote.objects.get(voter__uid='V0')
+        amended.candidate = cls.alice
+        amended.save()
+        Vote.objects.filter(voter__uid='V1').delete()
+        AuditEntry.seal()
+
+    def test_writes_are_staged_until_sealed(self):
+        cast_vote('S1', self.bob.id)
+        digest = self.client.get(reverse('votes_app:audit_digest')).json()
+        self.assertEqual((digest['size'], digest['pending']), (13, 1))
+        self.assertEqual(verify_log()['unaudited'], 0)
+
+        self.assertEqual(AuditEntry.seal(batch_size=1), 1)
+        digest = self.client.get(reverse('votes_app:audit_digest')).json()
+        self.assertEqual((digest['size'], digest['pending']), (14, 0))
+        self.assertEqual(AuditEntry.objects.get(seq=13).vote_id, Vote.objects.get(voter__uid='S1').pk)
+        self.assertTrue(verify_log(chunk_size=4)['root_matches'])
+
+    def test_proofs_lead_to_the_published_root(self):
+        digest = self.client.get(reverse('votes_app:audit_digest')).json()
+        self.assertEqual(digest['size'], 13)
+        for seq in range(13):
+            proof = self.client.get(reverse('votes_app:audit_digest'), {'seq': seq}).json()['proof']
+            root = merkle.root_from_proof(
+                bytes.fromhex(proof['leaf']), seq, proof['size'], [bytes.fromhex(node) for node in proof['path']],
+            )
+            self.assertEqual(root.hex(), digest['root'])
+
+        # Inclusion in an earlier, smaller tree
+        proof = self.client.get(reverse('votes_app:audit_digest'), {'seq': 2, 'size': 5}).json()['proof']
+        path = [bytes.fromhex(node) for node in proof['path']]
+        self.assertEqual(merkle.root_from_proof(bytes.fromhex(proof['leaf']), 2, 5, path).hex(), proof['root'])
+        self.assertEqual(self.client.get(reverse('votes_app:audit_digest'), {'seq': 13}).status_code, 404)
+
+    def test_verify_log(self):
+        report = verify_log(chunk_size=4)
+        self.assertTrue(report['root_matches'])
+        # The first entries of the amended and the deleted vote
+        self.assertEqual(report['superseded'], 2)
+        self.assertEqual(report['problems'], {'entries': [], 'nodes': [], 'unaudited': []})
+
+        Vote.objects.filter(voter__uid='V2').update(candidate=self.bob)
+        AuditNode.objects.filter(level=2, index=1).update(digest=bytes(32))
+        Vote.objects.bulk_create([Vote(voter=Voter.objects.create(uid='X', name='X'), candidate=self.bob)])
+        report = verify_log(chunk_size=4)
+        self.assertEqual([(p['seq'], p['reason']) for p in report['problems']['entries']], [(2, 'vote differs from entry')])
+        self.assertEqual(report['problems']['nodes'], [{'level': 2, 'index': 1, 'reason': 'node differs'}])
+        self.assertEqual(report['unaudited'], 1)
+
+
+class VoteJournalTests(TestCase):
+    """
+    Journaled ballots are deduplicated, drained in batches and recovered.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = Candidate.objects.create(name='Alice', party='Blue')
+        cls.bob = Candidate.objects.create(name='Bob', party='Green')
+        cast_vote('V0', cls.alice.id, 'Vera')
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'votes.journal')
+
+    def open_journal(self, batch_size=500):
+        journal = VoteJournal(self.path, batch_size=batch_size)
+        journal.open(start_committer=False)
+        self.addCleanup(journal.close)
+        return journal
+
+    def read_checkpoint(self):
+        with open(f'{self.path}.checkpoint') as checkpoint:
+            return int(checkpoint.read())
+
+    def test_submit_and_drain(self):
+        journal = self.open_journal(batch_size=2)
+        journal.submit('J1', self.alice.id, 'Jo')
+        journal.submit('J2', str(self.bob.id))
+        journal.submit('J3', self.bob.id)
+        with self.assertRaisesMessage(AlreadyVoted, 'Voter Jo has'):
+            journal.submit('J1', self.bob.id)
+        with self.assertRaisesMessage(AlreadyVoted, 'Voter Vera has'):
+            journal.submit('V0', self.bob.id)
+        with self.assertRaises(Candidate.DoesNotExist):
+            journal.submit('J4', 0)
+        self.assertEqual(journal.appended, 3)
+        self.assertLessEqual(journal.syncs, journal.appended)
+
+        # One batch per drain, and the checkpoint moves past it
+        self.assertEqual(journal.drain(), 2)
+        self.assertEqual(Vote.objects.filter(voter__uid__in=['J1', 'J2', 'J3']).count(), 2)
+        self.assertEqual(self.read_checkpoint(), sum(len(line) for line in open(self.path, 'rb').readlines()[:2]))
+        self.assertEqual(journal.drain(), 1)
+        self.assertEqual(journal.drain(), 0)
+        self.assertEqual(journal.committed, 3)
+        self.assertEqual(Voter.objects.get(uid='J1').name, 'Jo')
+        self.assertEqual(Voter.objects.get(uid='J2').name, 'Voter J2')
+
+    def test_recovery_replays_after_the_checkpoint_and_drops_a_torn_line(self):
+        ballots = [
+            json.dumps({'voter_uid': uid, 'candidate_id': self.alice.id, 'timestamp': timezone.now().isoformat()})
+            for uid in ('R1', 'R2')
+        ]
+        with open(self.path, 'w') as journal_file:
+            journal_file.write(ballots[0] + '\n' + ballots[1] + '\n{"voter_uid": "R3", "cand')
+        with open(f'{self.path}.checkpoint', 'w') as checkpoint:
+            # R1 was committed before the crash
+            checkpoint.write(str(len(ballots[0]) + 1))
+        Voter.objects.create(uid='R1', name='R1')
+        cast_vote('R1', self.alice.id)
+
+        with self.assertLogs('votes_app.journal', 'WARNING'):
+            journal = self.open_journal()
+        self.assertEqual(os.path.getsize(self.path), len(ballots[0]) + len(ballots[1]) + 2)
+        with self.assertRaises(AlreadyVoted):
+            journal.submit('R2', self.bob.id)
+        journal.submit('R3', self.bob.id)
+        journal.close()
+
+        call_command('replay_vote_journal', path=self.path, stdout=io.StringIO())
+        self.assertEqual(
+            dict(Vote.objects.filter(voter__uid__startswith='R').values_list('voter__uid', 'candidate_id')),
+            {'R1': self.alice.id, 'R2': self.alice.id, 'R3': self.bob.id},
+        )
+        self.assertEqual(self.read_checkpoint(), os.path.getsize(self.path))
+
+    def test_rejected_ballot_lets_the_voter_vote_again(self):
+        carol = Candidate.objects.create(name='Carol', party='Red')
+        journal = self.open_journal()
+        journal.submit('J1', carol.id)
+        carol.delete()
+
+        with self.assertLogs('votes_app.journal', 'WARNING'):
+            self.assertEqual(journal.drain(), 1)
+        self.assertEqual(journal.rejected, 1)
+        with open(f'{self.path}.rejected') as rejects:
+            self.assertEqual(json.loads(rejects.read())['reason'], 'Unknown candidate')
+
+        journal.submit('J1', self.bob.id)
+        journal.drain()
+        self.assertEqual(Vote.objects.get(voter__uid='J1').candidate_id, self.bob.id)
+
+    def test_overlong_voter_fields_are_refused_before_journaling(self):
+        journal = self.open_journal()
+        with self.assertRaises(ValidationError):
+            journal.submit('J' * 51, self.alice.id)
+        with self.assertRaises(ValidationError):
+            journal.submit('J1', self.alice.id, 'Jo' * 101)
+        self.assertEqual(journal.appended, 0)
+        journal.submit('J1', self.alice.id, 'Jo')
+
+    def test_ballot_failing_with_a_data_error_is_set_aside(self):
+        def refuse_bad(rows, chunk_size):
+            # As PostgreSQL refuses a value that doesn't fit its column
+            rows = list(rows)
+            if any(row[1] == 'BAD' for row in rows):
+                raise DataError("value too long for type character varying(50)")
+            return import_ballots(rows, chunk_size)
+
+        journal = self.open_journal()
+        for uid in ('J1', 'BAD', 'J2'):
+            journal.submit(uid, self.alice.id)
+        with mock.patch('votes_app.journal.import_ballots', side_effect=refuse_bad):
+            with self.assertLogs('votes_app.journal', 'WARNING'):
+                self.assertEqual(journal.drain(), 3)
+        self.assertEqual(journal.committed, 2)
+        self.assertEqual(journal.rejected, 1)
+        self.assertQuerySetEqual(
+            Vote.objects.filter(voter__uid__startswith='J').values_list('voter__uid', flat=True),
+            ['J1', 'J2'], ordered=False,
+        )
+        with open(f'{self.path}.rejected') as rejects:
+            rejected = json.loads(rejects.read())
+        self.assertEqual(rejected['voter_uid'], 'BAD')
+        self.assertTrue(rejected['reason'].startswith('Invalid data: value too long'))
+        self.assertEqual(journal.drain(), 0)
+
+    def test_vote_view_journals_the_voter_name(self):
+        journal = self.open_journal()
+        with mock.patch('votes_app.views.voting.vote_journal', journal):
+            self.client.post(reverse('votes_app:vote'), {
+                'voter_uid': 'J1', 'candidate_id': self.alice.id, 'voter_name': 'Jo',
+            })
+            response = self.client.post(reverse('votes_app:vote'), {
+                'voter_uid': 'J1', 'candidate_id': self.bob.id,
+            })
+        # Turned away under the journaled name before the ballot is drained
+        self.assertEqual(
+            [str(message) for message in get_messages(response.wsgi_request)],
+            ['Your vote has been cast successfully!', 'Voter Jo has already cast their vote!'],
+        )
+        with open(self.path) as journal_file:
+            self.assertEqual(json.loads(journal_file.readline())['voter_name'], 'Jo')
+
+        journal.drain()
+        self.assertEqual(Voter.objects.get(uid='J1').name, 'Jo')
+
+
+class CandidateTallyTests(TestCase):
+    """
+    The tally table follows every kind of vote write and can be rebuilt.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = Candidate.objects.create(name='Alice', party='Blue')
+        cls.bob = Candidate.objects.create(name='Bob', party='Green')
+
+    def counts(self):
+        return dict(CandidateTally.objects.values_list('candidate_id', 'vote_count'))
+
+    def test_vote_writes_keep_tallies_in_step(self):
+        self.assertEqual(self.counts(), {self.alice.id: 0, self.bob.id: 0})
+        for i in range(3):
+            cast_vote(f'V{i}', self.alice.id)
+        amended = Vote.objects.get(voter__uid='V0')
+        amended.candidate = self.bob
+        amended.save()
+        self.assertEqual(self.counts(), {self.alice.id: 2, self.bob.id: 1})
+
+        Vote.objects.filter(voter__uid='V1').delete()
+        # Cascades from the voter go through the same signal
+        Voter.objects.filter(uid='V2').delete()
+        self.assertEqual(self.counts(), {self.alice.id: 0, self.bob.id: 1})
+        self.assertEqual(verify_tallies(), [])
+
+    def test_candidate_changes_move_the_version_forward(self):
+        cast_vote('V0', self.bob.id)
+        version = tally_version()
+        self.alice.name = 'Alice B.'
+        self.alice.save()
+        self.assertGreater(tally_version(), version)
+
+        version = tally_version()
+        self.bob.delete()
+        self.assertGreater(tally_version(), version)
+        self.assertEqual(self.counts(), {self.alice.id: 0})
+
+    def test_rebuild_tallies(self):
+        cast_vote('V0', self.alice.id)
+        CandidateTally.objects.filter(candidate=self.alice).update(vote_count=5)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_tallies', verify=True, stdout=io.StringIO())
+
+        call_command('rebuild_tallies', stdout=io.StringIO())
+        self.assertEqual(self.counts(), {self.alice.id: 1, self.bob.id: 0})
+        self.assertEqual(verify_tallies(), [])
+
+
+@override_settings(BALLOT_IMPORT_TOKEN='test-token')
+class BallotTests(TestCase):
+    """
+    Single and bulk ballots: one vote per voter, for an existing candidate,
+    registering voters on the fly.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = Candidate.objects.create(name='Alice', party='Blue')
+        cls.bob = Candidate.objects.create(name='Bob', party='Green')
+        Voter.objects.create(uid='V0', name='Vera')
+
+    def upload(self, body, query='', token='test-token'):
+        return self.client.post(
+            reverse('votes_app:upload_ballots') + query, body,
+            content_type='text/csv', HTTP_AUTHORIZATION=f'Bearer {token}',
+        )
+
+    def test_cast_vote(self):
+        cast_vote('V0', self.alice.id)
+        with self.assertRaisesMessage(AlreadyVoted, 'Voter Vera has'):
+            cast_vote('V0', self.bob.id)
+        with self.assertRaises(Candidate.DoesNotExist):
+            cast_vote('N1', 0)
+        self.assertFalse(Voter.objects.filter(uid='N1').exists())
+
+        cast_vote('N1', self.bob.id, 'Nia')
+        cast_vote('N2', self.bob.id)
+        self.assertEqual(
+            dict(Vote.objects.values_list('voter__name', 'candidate_id')),
+            {'Vera': self.alice.id, 'Nia': self.bob.id, 'Voter N2': self.bob.id},
+        )
+        self.assertEqual(verify_tallies(), [])
+
+    def test_registered_voter_stays_within_the_statement_budget(self):
+        with CaptureQueriesContext(connection) as queries:
+            cast_vote('V0', self.alice.id)
+        statements = [query for query in queries if not query['sql'].startswith(('SAVEPOINT', 'RELEASE'))]
+        self.assertEqual(len(statements), sum(ballots.CAST_VOTE_BUDGET.values()))
+
+    def test_import_ballots(self):
+        cast_vote('V0', self.alice.id)
+        upload = io.StringIO(
+            'voter_uid,candidate_id,timestamp,voter_name\n'
+            f'V0,{self.bob.id},,\n'
+            f'N1,{self.alice.id},2025-01-01T10:00:00Z,Nia\n'
+            f'N1,{self.bob.id},,\n'
+            'N2,0,,\n'
+            'N3,x,,\n'
+            f',{self.bob.id},,\n'
+            f'N4,{self.bob.id},,\n'
+        )
+        result = import_ballots(parse_ballots(upload))
+        self.assertEqual((result['accepted'], result['rejected']), (2, 5))
+        self.assertEqual(
+            [(row['line'], row['status'], row.get('reason', '')[:17]) for row in result['rows']],
+            [
+                (2, 'rejected', 'Voter has already'),
+                (3, 'accepted', ''),
+                (4, 'rejected', 'Duplicate ballot '),
+                (5, 'rejected', 'Unknown candidate'),
+                (6, 'rejected', 'Malformed row: in'),
+                (7, 'rejected', 'Missing voter_uid'),
+                (8, 'accepted', ''),
+            ],
+        )
+        self.assertEqual(Voter.objects.get(uid='N1').name, 'Nia')
+        self.assertEqual(Vote.objects.get(voter__uid='N1').timestamp.hour, 10)
+        self.assertEqual(Voter.objects.get(uid='N4').name, 'Voter N4')
+        self.assertFalse(Voter.objects.filter(uid__in=['N2', 'N3']).exists())
+        self.assertEqual(verify_tallies(), [])
+        self.assertEqual(verify_log()['unaudited'], 0)
+
+    def test_import_retries_a_chunk_until_conflicts_settle(self):
+        rows = [(2, 'N1', self.alice.id, None, None), (3, 'N2', self.bob.id, None, None)]
+        real_import_chunk = ballots._import_chunk
+        conflicts = [IntegrityError(), IntegrityError()]
+
+        def conflicting_import_chunk(*args):
+            if conflicts:
+                raise conflicts.pop()
+            return real_import_chunk(*args)
+
+        with mock.patch.object(ballots, '_import_chunk', conflicting_import_chunk):
+            self.assertEqual(import_ballots(rows)['accepted'], 2)
+            conflicts[:] = [IntegrityError()] * 3
+            with self.assertRaises(IntegrityError):
+                import_ballots([(4, 'N3', self.bob.id, None, None)])
+
+    def test_upload_reports_where_an_unreadable_body_stopped(self):
+        rows = ''.join(f'U{i},{self.alice.id}\n' for i in range(5))
+        response = self.upload(f'voter_uid,candidate_id\n{rows}'.encode() + b'\xff\n')
+        self.assertEqual(response.status_code, 400)
+        result = response.json()
+        self.assertEqual(result['accepted'], 5)
+        self.assertEqual(result['error']['line'], 7)
+        self.assertEqual(Vote.objects.filter(voter__uid__startswith='U').count(), 5)
+
+        self.assertEqual(self.upload('', token='wrong').status_code, 403)
+        self.assertEqual(self.upload('', query='?format=xml').status_code, 400)
+
+
+class VoterCacheTests(TestCase):
+    """
+    Voter lookups are cached with a TTL and LRU eviction, and dropped once a
+    vote for the voter commits.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = Candidate.objects.create(name='Alice', party='Blue')
+        for i in range(3):
+            Voter.objects.create(uid=f'V{i}', name=f'Vera {i}')
+
+    def setUp(self):
+        self.addCleanup(voter_cache.clear)
+        # Commits would start the audit sealer's timer thread
+        patcher = mock.patch.object(audit_sealer, 'schedule')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_ttl_and_lru_eviction(self):
+        cache = VoterCache(max_entries=2, ttl=60)
+        with mock.patch('votes_app.voter_cache.time.monotonic', return_value=1000):
+            self.assertEqual(cache.get('V0').name, 'Vera 0')
+            with self.assertNumQueries(0):
+                self.assertEqual(cache.get('V0').name, 'Vera 0')
+            self.assertIsNone(cache.get('NOBODY'))
+            cache.get('V1')
+            cache.get('V0')
+            # V1 is now the least recently used
+            cache.get('V2')
+            self.assertIsNone(cache.peek('V1'))
+            self.assertIsNotNone(cache.peek('V0'))
+        with mock.patch('votes_app.voter_cache.time.monotonic', return_value=1060):
+            self.assertIsNone(cache.peek('V0'))
+        # peek counts its misses too (V1 evicted, V0 expired)
+        self.assertEqual(cache.stats()['hits'], 3)
+        self.assertEqual(cache.stats()['misses'], 6)
+        self.assertEqual(cache.stats()['hit_rate'], 0.3333)
+
+    def test_cast_vote_lookups_count_towards_the_hit_rate(self):
+        cache = VoterCache()
+        with mock.patch('votes_app.ballots.voter_cache', cache):
+            cast_vote('V0', self.alice.id)
+        self.assertEqual(cache.stats()['misses'], 1)
+        self.assertEqual(cache.stats()['hit_rate'], 0.0)
+
+    def test_shared_backend(self):
+        cache = VoterCache(backend='default')
+        self.addCleanup(cache.invalidate, 'V0')
+        cache.get('V0')
+        other_process = VoterCache(backend='default')
+        with self.assertNumQueries(0):
+            self.assertEqual(other_process.get('V0').name, 'Vera 0')
+        self.assertEqual(other_process.stats()['shared_hits'], 1)
+
+    def test_votes_invalidate_on_commit(self):
+        self.assertFalse(voter_cache.get('V0').has_voted)
+        with self.captureOnCommitCallbacks(execute=True):
+            cast_vote('V0', self.alice.id)
+            # Not before the vote commits
+            self.assertIsNotNone(voter_cache.peek('V0'))
+        self.assertIsNone(voter_cache.peek('V0'))
+        self.assertTrue(voter_cache.get('V0').has_voted)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Vote.objects.filter(voter__uid='V0').delete()
+        self.assertFalse(voter_cache.get('V0').has_voted)
+
+        voter_cache.get('V1')
+        with self.captureOnCommitCallbacks(execute=True):
+            Vote.objects.create(voter=Voter.objects.get(uid='V1'), candidate=self.alice)
+        self.assertIsNone(voter_cache.peek('V1'))
+
+    def test_stale_has_voted_is_confirmed_before_rejecting(self):
+        cast_vote('V0', self.alice.id)
+        self.assertTrue(voter_cache.get('V0').has_voted)
+        # Deleted by another process: this one's cache isn't told
+        with mock.patch.object(voter_cache, 'invalidate_on_commit'):
+            Vote.objects.filter(voter__uid='V0').delete()
+        self.assertTrue(voter_cache.peek('V0').has_voted)
+
+        cast_vote('V0', self.alice.id)
+        self.assertEqual(Vote.objects.filter(voter__uid='V0').count(), 1)
+        with self.assertRaisesMessage(AlreadyVoted, 'Voter Vera 0 has'):
+            cast_vote('V0', self.alice.id)
+
+
+class LiveResultsTests(TestCase):
+    """
+    Live updates carry only the candidates that changed, and undelivered
+    updates are merged.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = Candidate.objects.create(name='Alice', party='Blue')
+        cls.bob = Candidate.objects.create(name='Bob', party='Green')
+
+    def test_diff_snapshots(self):
+        old = {'version': 3, 'counts': {1: 5, 2: 7}}
+        self.assertIsNone(live._diff_snapshots(old, {'version': 3, 'counts': {1: 5, 2: 7}}))
+        self.assertEqual(live._diff_snapshots(old, {'version': 4, 'counts': {1: 6, 2: 7}}), {
+            'version': 4,
+            'total_votes': 13,
+            'candidates': {1: {'vote_count': 6, 'delta': 1}},
+            'full': False,
+        })
+        update = live._diff_snapshots(old, {'version': 5, 'counts': {1: 5, 3: 1}})
+        self.assertEqual(update['candidates'], {
+            2: {'vote_count': None, 'delta': -7},
+            3: {'vote_count': 1, 'delta': 1},
+        })
+        self.assertTrue(update['full'])
+
+    def test_merge_updates(self):
+        first = {'version': 4, 'total_votes': 13, 'candidates': {1: {'vote_count': 6, 'delta': 1}}, 'full': False}
+        second = {
+            'version': 6,
+            'total_votes': 15,
+            'candidates': {1: {'vote_count': 7, 'delta': 1}, 2: {'vote_count': 8, 'delta': 1}},
+            'full': False,
+        }
+        self.assertEqual(live._merge_updates(first, second), {
+            'version': 6,
+            'total_votes': 15,
+            'candidates': {1: {'vote_count': 7, 'delta': 2}, 2: {'vote_count': 8, 'delta': 1}},
+            'full': False,
+        })
+        # A full update replaces the deltas instead of adding to them
+        snapshot = live._snapshot_update({'version': 7, 'counts': {1: 7, 2: 8}})
+        merged = live._merge_updates(first, snapshot)
+        self.assertEqual(merged['candidates'][1], {'vote_count': 7, 'delta': 0})
+        self.assertTrue(merged['full'])
+
+    async def test_subscription_holds_one_pending_update(self):
+        subscription = live.Subscription()
+        self.assertIsNone(await subscription.next(timeout=0))
+        subscription.offer({'version': 1, 'total_votes': 1, 'candidates': {1: {'vote_count': 1, 'delta': 1}}, 'full': False})
+        subscription.offer({'version': 2, 'total_votes': 2, 'candidates': {1: {'vote_count': 2, 'delta': 1}}, 'full': False})
+        update = await subscription.next(timeout=1)
+        self.assertEqual(update['version'], 2)
+        self.assertEqual(update['candidates'], {1: {'vote_count': 2, 'delta': 2}})
+        self.assertIsNone(await subscription.next(timeout=0))
+
+    async def test_load_snapshot(self):
+        await CandidateTally.objects.filter(candidate=self.alice).aupdate(vote_count=3, revision=3)
+        await CandidateTally.objects.filter(candidate=self.bob).aupdate(vote_count=1, revision=2)
+        snapshot = await live._load_snapshot()
+        self.assertEqual(snapshot, {'version': 5, 'counts': {self.alice.id: 3, self.bob.id: 1}})
+        self.assertEqual(live._snapshot_update(snapshot)['total_votes'], 4)
+
+    def test_votes_notify_on_commit(self):
+        with mock.patch.object(live.broadcaster, 'notify') as notify, mock.patch.object(audit_sealer, 'schedule'):
+            with self.captureOnCommitCallbacks(execute=True):
+                cast_vote('V1', self.alice.id)
+                notify.assert_not_called()
+        notify.assert_called_once_with()
+
+
+@mock.patch('votes_app.snapshots.render_chart', return_value=b'PNG')
+class ResultsSnapshotTests(TestCase):
+    """
+    The results snapshot is published once per tally version and served in
+    place of the rendered page.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = Candidate.objects.create(name='Alice', party='Blue')
+        cls.bob = Candidate.objects.create(name='Bob', party='Green')
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.snapshot = snapshots.ResultsSnapshot(enabled=True, directory=directory.name)
+
+    def test_publish(self, render_chart):
+        cast_vote('V1', self.alice.id)
+        version = self.snapshot.publish()
+        self.assertEqual(version, tally_version())
+        self.assertEqual(self.snapshot.published_version(), version)
+
+        with open(self.snapshot.directory / snapshots.TALLIES_FILE) as f:
+            tallies = json.load(f)
+        self.assertEqual(tallies['total_votes'], 1)
+        self.assertEqual([c['name'] for c in tallies['candidates']], ['Alice', 'Bob'])
+        self.assertEqual(sorted(tallies['charts']), sorted(CHART_TYPES))
+        self.assertEqual((self.snapshot.directory / 'chart-pie.png').read_bytes(), b'PNG')
+        self.assertIn('Alice', (self.snapshot.directory / snapshots.PAGE_FILE).read_text())
+        self.assertEqual(
+            [p.name for p in self.snapshot.directory.iterdir() if p.suffix == '.tmp'], [],
+        )
+
+    def test_skips_published_version(self, render_chart):
+        self.assertIsNotNone(self.snapshot.publish())
+        with self.assertNumQueries(1):
+            self.assertIsNone(self.snapshot.publish())
+        self.assertIsNotNone(self.snapshot.publish(force=True))
+        cast_vote('V1', self.bob.id)
+        self.assertIsNotNone(self.snapshot.publish())
+        self.assertEqual(self.snapshot.publishes, 3)
+
+    def test_results_serves_snapshot(self, render_chart):
+        with mock.patch('votes_app.views.results.results_snapshot', self.snapshot):
+            with mock.patch.object(self.snapshot, 'schedule') as schedule:
+                response = self.client.get(reverse('votes_app:results'))
+            # Nothing published yet: rendered, and a snapshot scheduled
+            schedule.assert_called_once_with()
+            self.assertNotIsInstance(response, FileResponse)
+
+            self.snapshot.publish()
+            with self.assertNumQueries(0):
+                response = self.client.get(reverse('votes_app:results'))
+        self.assertIsInstance(response, FileResponse)
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        self.assertIn(b'Alice', b''.join(response.streaming_content))
+
+
+class RequestMetricsTests(TestCase):
+    """
+    Sampled requests are measured per view and served at /metrics.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = Candidate.objects.create(name='Alice', party='Blue')
+        cast_vote('V1', cls.alice.id)
+
+    def setUp(self):
+        request_metrics.reset()
+        self.addCleanup(request_metrics.reset)
+        fragment_cache.invalidate()
+
+    def metric(self, name, **labels):
+        """Return the value of a sample from /metrics, or None."""
+        selector = ','.join(f'{key}="{value}"' for key, value in labels.items())
+        for line in request_metrics.export().splitlines():
+            if line.startswith(f'{name}{{{selector}}} '):
+                return line.rsplit(' ', 1)[1]
+        return None
+
+    def test_views_are_measured(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('votes_app:home'))
+        self.assertIn(f'desc="queries: {len(queries)}"', response['Server-Timing'])
+        self.assertIn('render;dur=', response['Server-Timing'])
+        self.assertEqual(self.metric('voting_requests_total', view='votes_app:home', status=200), '1')
+        self.assertEqual(self.metric('voting_db_queries_total', view='votes_app:home'), str(len(queries)))
+        self.assertEqual(self.metric('voting_response_bytes_total', view='votes_app:home'), str(len(response.content)))
+
+        self.client.get('/no-such-page/')
+        self.assertEqual(self.metric('voting_requests_total', view=UNMATCHED_VIEW, status=404), '1')
+
+    def test_streamed_responses_are_measured_to_the_end(self):
+        response = self.client.get(reverse('votes_app:export_results'))
+        self.assertIsNone(self.metric('voting_requests_total', view='votes_app:export_results', status=200))
+        content = b''.join(response.streaming_content)
+        self.assertEqual(self.metric('voting_response_bytes_total', view='votes_app:export_results'), str(len(content)))
+        self.assertNotEqual(self.metric('voting_db_queries_total', view='votes_app:export_results'), '0')
+
+    def test_unsampled_requests_are_not_measured(self):
+        with mock.patch.object(request_metrics, 'sample_rate', 0):
+            response = self.client.get(reverse('votes_app:home'))
+        self.assertNotIn('Server-Timing', response)
+        self.assertIsNone(self.metric('voting_requests_total', view='votes_app:home', status=200))
+
+    def test_duration_histogram(self):
+        metrics = RequestMetrics(buckets=(0.1, 1.0))
+        for seconds in (0.05, 0.5, 5):
+            sample = RequestSample()
+            sample.started -= seconds
+            metrics.observe('votes_app:home', 200, sample)
+        exported = metrics.export()
+        self.assertIn('voting_request_duration_seconds_bucket{view="votes_app:home",le="0.1"} 1\n', exported)
+        self.assertIn('voting_request_duration_seconds_bucket{view="votes_app:home",le="1.0"} 2\n', exported)
+        self.assertIn('voting_request_duration_seconds_bucket{view="votes_app:home",le="+Inf"} 3\n', exported)
+        self.assertIn('voting_request_duration_seconds_count{view="votes_app:home"} 3\n', exported)
+
+    def test_metrics_token(self):
+        url = reverse('votes_app:metrics')
+        # Without a token, only a DEBUG server serves the metrics
+        self.assertEqual(self.client.get(url).status_code, 403)
+        with override_settings(DEBUG=True):
+            self.assertEqual(self.client.get(url).status_code, 200)
+        with mock.patch.object(request_metrics, 'token', 'secret'):
+            self.assertEqual(self.client.get(url).status_code, 403)
+            self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+            response = self.client.get(url, HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        self.assertIn(b'voting_metrics_sample_rate 1', response.content)
+
+    def test_file_responses_are_not_wrapped(self):
+        # Called directly: the test client wraps every stream itself
+        request = RequestFactory().get(reverse('votes_app:results'))
+        request.resolver_match = resolve(request.path)
+        with tempfile.NamedTemporaryFile(suffix='.html') as page:
+            page.write(b'<p>Alice</p>')
+            page.flush()
+            middleware = RequestMetricsMiddleware(lambda request: FileResponse(open(page.name, 'rb')))
+            response = middleware(request)
+            # Still a file, so the server can send it with sendfile
+            self.assertIsNotNone(response.file_to_stream)
+            self.assertIn('Server-Timing', response)
+            # Recorded before the body is read, with the file's size
+            self.assertEqual(self.metric('voting_requests_total', view='votes_app:results', status=200), '1')
+            self.assertEqual(self.metric('voting_response_bytes_total', view='votes_app:results'), '12')
+            self.assertEqual(b''.join(response.streaming_content), b'<p>Alice</p>')
+            response.close()
+
+
+@skipUnless(
+    connection.vendor == 'sqlite' and 'init_command' in connection.settings_dict['OPTIONS'],
+    "Checks the SQLite tuning in settings.DATABASES",
+)
+class SQLiteTuningTests(TestCase):
+    """
+    New SQLite connections are switched to WAL with a busy timeout, and
+    transactions take the write lock up front.
+    """
+
+    def test_new_connections_are_tuned(self):
+        # The test database is in memory, where WAL doesn't apply
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_dict = {**connection.settings_dict, 'NAME': os.path.join(directory.name, 'tuning.sqlite3')}
+        tuned = type(connections['default'])(settings_dict, alias='tuning')
+        self.addCleanup(tuned.close)
+
+        with tuned.cursor() as cursor:
+            pragmas = {}
+            for pragma in ('journal_mode', 'busy_timeout', 'synchronous', 'mmap_size'):
+                cursor.execute(f'PRAGMA {pragma}')
+                pragmas[pragma] = cursor.fetchone()[0]
+        self.assertEqual(pragmas['journal_mode'], 'wal')
+        self.assertEqual(pragmas['busy_timeout'], int(os.environ.get('DB_BUSY_TIMEOUT_MS', 20000)))
+        # NORMAL
+        self.assertEqual(pragmas['synchronous'], 1)
+        self.assertEqual(pragmas['mmap_size'], int(os.environ.get('DB_MMAP_SIZE', 256 * 1024 * 1024)))
+        self.assertEqual(tuned.transaction_mode, 'IMMEDIATE')
+
+
+class BenchmarkCompareTests(SimpleTestCase):
+    """
+    Benchmark runs are matched on their parameters and regressions are
+    flagged by metric direction.
+    """
+
+    def write_run(self, directory, *records):
+        path = os.path.join(directory, f'run{len(os.listdir(directory))}.jsonl')
+        with open(path, 'w') as f:
+            f.write("Creating test database...\n")
+            f.writelines(json.dumps(record) + '\n' for record in records)
+        return path
+
+    def test_compare(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        baseline = compare.load(self.write_run(
+            directory.name,
+            {'benchmark': 'views', 'view': 'results', 'p50_ms': 10.0, 'requests_per_second': 100, 'queries': 2},
+            {'benchmark': 'views', 'view': 'home', 'p50_ms': 5.0, 'queries': 1},
+        ))
+        current = compare.load(self.write_run(
+            directory.name,
+            {'benchmark': 'views', 'view': 'results', 'p50_ms': 10.5, 'requests_per_second': 80, 'queries': 3},
+            {'benchmark': 'views', 'view': 'home', 'p50_ms': 2.0, 'queries': 1},
+        ))
+        self.assertEqual(len(baseline), 2)
+
+        rows = {
+            (compare.describe(key), name): (change, regressed)
+            for key, name, old, new, change, regressed in compare.compare(baseline, current, 0.1)
+        }
+        # Within the threshold
+        self.assertEqual(rows['views[view=results]', 'p50_ms'], (0.05, False))
+        self.assertEqual(rows['views[view=results]', 'requests_per_second'], (-0.2, True))
+        # Any extra query is a regression
+        self.assertTrue(rows['views[view=results]', 'queries'][1])
+        self.assertEqual(rows['views[view=home]', 'p50_ms'], (-0.6, False))
+        self.assertEqual(rows['views[view=home]', 'queries'], (0.0, False))
+
+    def test_fail_on_regression(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        baseline = self.write_run(directory.name, {'benchmark': 'vote', 'votes_per_second': 1000, 'errors': 0})
+        current = self.write_run(directory.name, {'benchmark': 'vote', 'votes_per_second': 990, 'errors': 1})
+
+        with mock.patch('sys.argv', ['compare', baseline, current, '--fail']), \
+                mock.patch('sys.stdout', new_callable=io.StringIO) as stdout:
+            with self.assertRaises(SystemExit) as exit:
+                compare.main()
+        self.assertEqual(exit.exception.code, 1)
+        self.assertIn('vote errors: 0 -> 1 (n/a)  REGRESSION', stdout.getvalue())
+        self.assertIn('vote votes_per_second: 1000 -> 990 (-1.0%)\n', stdout.getvalue())
+        self.assertIn('1 regression(s)', stdout.getvalue())
+
+
+class RenderFarmTests(TestCase):
+    """
+    Renders are bounded, time out, fall back to the last cached chart and
+    start in each server process.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = Candidate.objects.create(name='Alice', party='Blue')
+        cast_vote('V1', cls.alice.id)
+
+    def farm(self, **options):
+        """A farm whose renders never finish unless the test resolves them."""
+        farm = RenderFarm(**options)
+        pool = mock.Mock()
+        pool.submit.side_effect = lambda *args: Future()
+        farm._pool = pool
+        return farm
+
+    def test_full_queue_is_refused(self):
+        farm = self.farm(workers=1, max_queue=1)
+        first = farm.submit('a', 'bar', {}, 80, 'png')
+        farm.submit('b', 'bar', {}, 80, 'png')
+        # The same chart joins the render already running
+        self.assertIs(farm.submit('a', 'bar', {}, 80, 'png'), first)
+        with self.assertRaises(RendererBusy):
+            farm.submit('c', 'bar', {}, 80, 'png')
+        self.assertEqual(farm.rejected, 1)
+
+        first.set_result(b'PNG')
+        farm.submit('c', 'bar', {}, 80, 'png')
+
+    def test_render_timeout(self):
+        farm = self.farm(timeout=0.01)
+        on_done = mock.Mock()
+        with self.assertRaises(RenderTimeout):
+            farm.render('a', 'bar', {}, 80, 'png', on_done)
+        self.assertEqual(farm.timeouts, 1)
+
+        # A render that finishes late still fills the cache
+        farm.submit('a', 'bar', {}, 80, 'png').set_result(b'PNG')
+        on_done.assert_called_once_with(b'PNG')
+        self.assertEqual(farm._inflight, {})
+
+    def test_stale_chart_is_served_when_rendering_is_unavailable(self):
+        cache = ChartCache()
+        url = reverse('votes_app:generate_chart') + '?format=png'
+        with mock.patch('votes_app.views.charts.chart_cache', cache), \
+                mock.patch('votes_app.views.charts.arender_chart', side_effect=RendererBusy):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(response['Retry-After'], '1')
+
+            version = tally_version()
+            cache.set('bar', 'medium-png', version, b'OLD')
+            cast_vote('V2', self.alice.id)
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b'OLD')
+        # Tagged with the version it shows, so it is replaced once rendered
+        self.assertEqual(response['ETag'], f'"bar-medium-png-v{version}"')
+
+    def test_workers_start_with_each_processes_first_request(self):
+        self.addCleanup(request_started.disconnect, dispatch_uid=render_farm_module._START_ON_REQUEST)
+        with mock.patch.object(render_farm, 'start') as start:
+            render_farm_module.start_with_first_request()
+            self.client.get(reverse('votes_app:home'))
+            self.client.get(reverse('votes_app:home'))
+        start.assert_called_once_with()
+
+        # A pool inherited through fork belongs to the parent
+        with mock.patch.object(render_farm, '_pool', mock.Mock()):
+            pid = os.fork()
+            if pid == 0:
+                os._exit(0 if render_farm._pool is None else 1)
+            _, status = os.waitpid(pid, 0)
+            self.assertIsNotNone(render_farm._pool)
+        self.assertEqual(os.waitstatus_to_exitcode(status), 0)
+
+
+class ChartCacheTests(TestCase):
+    """
+    Rendered charts are bounded by count and bytes, survive restarts on disk
+    and are replaced when the tally version moves on.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = Candidate.objects.create(name='Alice', party='Blue')
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def test_lru_eviction_by_entries_and_bytes(self):
+        cache = ChartCache(max_entries=2, max_bytes=10)
+        cache.set('bar', 'a', 1, b'111')
+        cache.set('pie', 'a', 1, b'222')
+        cache.get('bar', 'a', 1)
+        cache.set('line', 'a', 1, b'333')
+        # pie was the least recently used
+        self.assertIsNone(cache.get('pie', 'a', 1))
+        self.assertEqual(cache.get('bar', 'a', 1), b'111')
+
+        cache.set('party', 'a', 1, b'4444444')
+        # 3 + 7 bytes fit, but line's 3 more would not
+        self.assertIsNone(cache.get('line', 'a', 1))
+        self.assertEqual(cache.get('bar', 'a', 1), b'111')
+        cache.set('horizontal', 'a', 1, b'x' * 11)
+        self.assertEqual(cache._entries, {})
+        self.assertEqual(cache._size, 0)
+
+    def test_entries_reload_from_disk(self):
+        ChartCache(directory=self.directory).set('bar', 'medium-png', 3, b'PNG')
+        restarted = ChartCache(directory=self.directory)
+        self.assertEqual(restarted.lookup('bar', 'medium-png', 3), b'PNG')
+        self.assertEqual(restarted.hits, 1)
+        self.assertIn(('bar', 'medium-png', 3), restarted._entries)
+        self.assertEqual(ChartCache(directory=self.directory).latest('bar', 'medium-png'), (3, b'PNG'))
+
+        restarted.clear()
+        self.assertIsNone(ChartCache(directory=self.directory).get('bar', 'medium-png', 3))
+
+    def test_new_tally_version_replaces_the_chart(self):
+        cache = ChartCache(directory=self.directory)
+        cache.set('bar', 'small-png', 1, b'V1')
+        cache.set('pie', 'small-png', 1, b'P1')
+        cache.set('bar', 'small-png', 2, b'V2')
+        self.assertIsNone(cache.get('bar', 'small-png', 1))
+        self.assertNotIn('bar-small-png-v1.chart', os.listdir(self.directory))
+        self.assertEqual(cache.get('pie', 'small-png', 1), b'P1')
+
+        # The view renders again once a vote moves the version on
+        async def render(*args, on_done, **kwargs):
+            on_done(b'PNG')
+            return b'PNG'
+
+        url = reverse('votes_app:generate_chart') + '?format=png'
+        with mock.patch('votes_app.views.charts.chart_cache', cache), \
+                mock.patch('votes_app.views.charts.arender_chart', side_effect=render) as arender_chart:
+            self.client.get(url)
+            self.client.get(url)
+            self.assertEqual(arender_chart.call_count, 1)
+
+            cast_vote('V1', self.alice.id)
+            self.assertEqual(self.client.get(url).content, b'PNG')
+            self.assertEqual(arender_chart.call_count, 2)
+
+
+class ChartViewTests(TestCase):
+    """
+    Charts and chart data carry an ETag and are revalidated with a 304.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = Candidate.objects.create(name='Alice', party='Blue')
+        cls.bob = Candidate.objects.create(name='Bob', party='Green')
+        cls.carol = Candidate.objects.create(name='Carol', party='Blue')
+        import_ballots(parse_ballots(io.StringIO(
+            'voter_uid,candidate_id,timestamp\n'
+            f'V1,{cls.alice.id},2025-01-01T09:15:00Z\n'
+            f'V2,{cls.alice.id},2025-01-01T09:45:00Z\n'
+            f'V3,{cls.bob.id},2025-01-01T11:05:00Z\n'
+            f'V4,{cls.carol.id},2025-01-02T08:00:00Z\n'
+        )))
+
+    def setUp(self):
+        patcher = mock.patch('votes_app.views.charts.chart_cache', ChartCache())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def assertRevalidates(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertIn('no-cache', response['Cache-Control'])
+
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+        cast_vote('V5', self.bob.id)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    @mock.patch('votes_app.views.charts.arender_chart', return_value=b'PNG')
+    def test_chart_etag(self, arender_chart):
+        self.assertRevalidates(reverse('votes_app:generate_chart') + '?format=png')
+        # Each size and format is tagged separately
+        svg = self.client.get(reverse('votes_app:generate_chart') + '?format=svg&size=small')
+        self.assertRegex(svg['ETag'], r'^"bar-small-svg-v\d+"$')
+
+    def test_chart_data_etag(self):
+        self.assertRevalidates(reverse('votes_app:chart_data'))
+
+    def test_chart_data_payload(self):
+        response = self.client.get(reverse('votes_app:chart_data'))
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(response.json(), {
+            'candidates': {
+                'ids': [self.alice.id, self.bob.id, self.carol.id],
+                'names': ['Alice', 'Bob', 'Carol'],
+                'parties': ['Blue', 'Green', 'Blue'],
+                'votes': [2, 1, 1],
+            },
+            'parties': {'names': ['Blue', 'Green'], 'votes': [3, 1]},
+            'trend': {
+                'granularity': 'day',
+                'labels': ['2025-01-01', '2025-01-02'],
+                'votes': [3, 1],
+            },
+            'version': tally_version(),
+        })
+        # The series match the tally table
+        tallies = dict(candidate_tallies().values_list('id', 'vote_count'))
+        payload = response.json()['candidates']
+        self.assertEqual(dict(zip(payload['ids'], payload['votes'])), tallies)
+
+        trend = self.client.get(reverse('votes_app:chart_data') + '?granularity=hour').json()['trend']
+        self.assertEqual(trend['labels'], ['2025-01-01 09:00', '2025-01-01 11:00', '2025-01-02 08:00'])
+        self.assertEqual(trend['votes'], [2, 1, 1])
+
+
+class ExportTests(TestCase):
+    """
+    Votes are streamed as CSV or gzip, filtered by candidate, party and time.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = Candidate.objects.create(name='Alice', party='Blue')
+        cls.bob = Candidate.objects.create(name='Bob', party='Green')
+        import_ballots(parse_ballots(io.StringIO(
+            'voter_uid,candidate_id,timestamp,voter_name\n'
+            f'V1,{cls.alice.id},2025-01-01T09:00:00Z,Vera\n'
+            f'V2,{cls.bob.id},2025-01-01T23:59:59Z,Val\n'
+            f'V3,{cls.alice.id},2025-01-02T00:00:00Z,Vic\n'
+        )))
+
+    def export(self, query=''):
+        response = self.client.get(reverse('votes_app:export_results') + query)
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content)
+
+    def rows(self, query=''):
+        _, content = self.export(query)
+        return list(csv.reader(io.StringIO(content.decode())))
+
+    def test_csv(self):
+        response, content = self.export()
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="voting_results.csv"')
+        self.assertEqual(list(csv.reader(io.StringIO(content.decode()))), [
+            ['Voter UID', 'Voter Name', 'Candidate', 'Party', 'Timestamp'],
+            ['V3', 'Vic', 'Alice', 'Blue', '2025-01-02 00:00:00'],
+            ['V2', 'Val', 'Bob', 'Green', '2025-01-01 23:59:59'],
+            ['V1', 'Vera', 'Alice', 'Blue', '2025-01-01 09:00:00'],
+        ])
+
+    def test_csv_gz(self):
+        response, content = self.export('?format=csv.gz')
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertEqual(gzip.decompress(content), self.export()[1])
+
+    def test_csv_is_streamed_in_batches(self):
+        with mock.patch('votes_app.exports.EXPORT_CHUNK_SIZE', 1):
+            response = self.client.get(reverse('votes_app:export_results'))
+            chunks = list(response.streaming_content)
+        # The header goes out with the first row, then one chunk per row
+        self.assertEqual(len(chunks), 3)
+
+    def test_filters(self):
+        def uids(query):
+            return [row[0] for row in self.rows(query)[1:]]
+
+        self.assertEqual(uids(f'?candidate={self.alice.id}'), ['V3', 'V1'])
+        self.assertEqual(uids('?party=Green'), ['V2'])
+        self.assertEqual(uids('?from=2025-01-02'), ['V3'])
+        # A date includes its whole day, a datetime is exclusive
+        self.assertEqual(uids('?to=2025-01-01'), ['V2', 'V1'])
+        self.assertEqual(uids('?to=2025-01-01T23:59:59Z'), ['V1'])
+        self.assertEqual(uids('?from=2025-01-01T09:00:00Z&to=2025-01-01'), ['V2', 'V1'])
+        self.assertEqual(uids(f'?candidate={self.bob.id}&from=2025-01-02'), [])
+
+    def test_bad_requests(self):
+        url = reverse('votes_app:export_results')
+        response = self.client.get(url + '?format=xlsx')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.content, b'Unsupported export format: xlsx')
+        self.assertEqual(self.client.get(url + '?from=yesterday').status_code, 400)
+        self.assertEqual(self.client.get(url + '?candidate=x').status_code, 400)
+
+
+class StatsSummaryTests(TestCase):
+    """
+    The vectorized summary matches the statistics computed one by one.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        # Votes per candidate: 6, 3, 2, 1 and 0; Blue 8, Green 3, Red 1
+        cls.candidates = [
+            Candidate.objects.create(name=name, party=party)
+            for name, party in [
+                ('Alice', 'Blue'), ('Bob', 'Green'), ('Carol', 'Blue'), ('Dan', 'Red'), ('Eve', 'Green'),
+            ]
+        ]
+        lines = ['voter_uid,candidate_id']
+        for candidate, count in zip(cls.candidates, (6, 3, 2, 1, 0)):
+            lines += [f'{candidate.name}-{i},{candidate.id}' for i in range(count)]
+        import_ballots(parse_ballots(io.StringIO('\n'.join(lines))))
+
+    def test_summarize(self):
+        votes = [6, 3, 2, 1, 0]
+        total = sum(votes)
+        party_votes = {'Blue': 8, 'Green': 3, 'Red': 1}
+        # The 99 cut points of the inclusive method, which interpolates
+        # linearly like np.quantile's default
+        cuts = statistics.quantiles(votes, n=100, method='inclusive')
+
+        summary = summarize(load_tallies())
+        self.assertEqual(summary['total_votes'], total)
+        self.assertEqual(summary['total_candidates'], 5)
+        self.assertEqual(summary['mean'], round(statistics.mean(votes), 2))
+        self.assertEqual(summary['median'], statistics.median(votes))
+        self.assertEqual(summary['stdev'], round(statistics.pstdev(votes), 2))
+        self.assertEqual((summary['min'], summary['max']), (0, 6))
+        self.assertEqual(summary['percentiles'], {str(p): round(cuts[p - 1], 2) for p in PERCENTILES})
+        self.assertEqual(summary['percentiles'], {'10': 0.4, '25': 1.0, '50': 2.0, '75': 3.0, '90': 4.8})
+        self.assertEqual(summary['margin_of_victory'], {'votes': 3, 'share': 25.0})
+        self.assertEqual(
+            summary['effective_number_of_candidates'],
+            round(1 / sum((v / total) ** 2 for v in votes), 2),
+        )
+        self.assertEqual(summary['effective_number_of_candidates'], 2.88)
+        self.assertEqual(
+            summary['effective_number_of_parties'],
+            round(1 / sum((v / total) ** 2 for v in party_votes.values()), 2),
+        )
+        self.assertEqual(summary['candidate_ids'], [c.id for c in self.candidates])
+        self.assertEqual(summary['candidate_shares'], [round(100 * v / total, 2) for v in votes])
+        self.assertEqual(summary['party_shares'], {
+            party: round(100 * v / total, 2) for party, v in party_votes.items()
+        })
+        self.assertEqual(summary['party_shares'], {'Blue': 66.67, 'Green': 25.0, 'Red': 8.33})
+
+    def test_summarize_unsorted_tallies(self):
+        tallies = load_tallies()
+        shuffled = [4, 0, 3, 1, 2]
+        tallies = {
+            key: [value[i] for i in shuffled] if isinstance(value, list) else value[shuffled]
+            for key, value in tallies.items()
+        }
+        summary = summarize(tallies)
+        self.assertEqual(summary['percentiles'], summarize(load_tallies())['percentiles'])
+        self.assertEqual(summary['margin_of_victory'], {'votes': 3, 'share': 25.0})
+
+    def test_summarize_without_votes(self):
+        Vote.objects.all().delete()
+        summary = summarize(load_tallies())
+        self.assertEqual(summary['total_votes'], 0)
+        self.assertEqual(summary['margin_of_victory'], {'votes': 0, 'share': 0.0})
+        self.assertIsNone(summary['effective_number_of_candidates'])
+        self.assertEqual(summary['party_shares'], {'Blue': 0.0, 'Green': 0.0, 'Red': 0.0})
+
+        Candidate.objects.all().delete()
+        summary = summarize(load_tallies())
+        self.assertEqual(summary['total_candidates'], 0)
+        self.assertIsNone(summary['margin_of_victory'])
+        self.assertEqual(summary['party_shares'], {})
+
+
+def utc(day, hour=0, minute=0):
+    """Return a UTC datetime on the given day of January 2025."""
+    return datetime.datetime(2025, 1, day, hour, minute, tzinfo=datetime.timezone.utc)
+
+
+class VoteRollupTests(TestCase):
+    """
+    Rollups follow vote writes, back the timeseries and can be rebuilt.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = Candidate.objects.create(name='Alice', party='Blue')
+        cls.bob = Candidate.objects.create(name='Bob', party='Green')
+        import_ballots(parse_ballots(io.StringIO(
+            'voter_uid,candidate_id,timestamp\n'
+            f'V1,{cls.alice.id},2025-01-01T09:15:30Z\n'
+            f'V2,{cls.alice.id},2025-01-01T09:15:50Z\n'
+            f'V3,{cls.bob.id},2025-01-01T09:47:00Z\n'
+            f'V4,{cls.alice.id},2025-01-01T11:05:00Z\n'
+            f'V5,{cls.bob.id},2025-01-02T08:00:00Z\n'
+        )))
+
+    def rollups(self, candidate):
+        return {
+            (granularity, bucket): vote_count
+            for granularity, bucket, vote_count in VoteRollup.objects
+            .filter(candidate=candidate, vote_count__gt=0)
+            .values_list('granularity', 'bucket', 'vote_count')
+        }
+
+    def test_record_upserts_buckets(self):
+        self.assertEqual(self.rollups(self.alice), {
+            ('minute', utc(1, 9, 15)): 2,
+            ('minute', utc(1, 11, 5)): 1,
+            ('hour', utc(1, 9)): 2,
+            ('hour', utc(1, 11)): 1,
+            ('day', utc(1)): 3,
+        })
+        # One statement adds to the existing buckets and creates the new ones
+        with self.assertNumQueries(1):
+            VoteRollup.record([
+                (self.alice.id, utc(1, 9, 15)),
+                (self.alice.id, utc(1, 9, 59)),
+            ])
+        rollups = self.rollups(self.alice)
+        self.assertEqual(rollups['minute', utc(1, 9, 15)], 3)
+        self.assertEqual(rollups['minute', utc(1, 9, 59)], 1)
+        self.assertEqual(rollups['hour', utc(1, 9)], 4)
+        self.assertEqual(rollups['day', utc(1)], 5)
+        with self.assertNumQueries(0):
+            VoteRollup.record([])
+
+    def test_deleted_votes_are_retracted(self):
+        Vote.objects.filter(voter__uid__in=['V1', 'V4']).delete()
+        self.assertEqual(self.rollups(self.alice), {
+            ('minute', utc(1, 9, 15)): 1,
+            ('hour', utc(1, 9)): 1,
+            ('day', utc(1)): 1,
+        })
+        # Emptied buckets stay behind with a count of zero
+        self.assertTrue(VoteRollup.objects.filter(candidate=self.alice, vote_count=0).exists())
+        self.assertEqual(verify_rollups(), [])
+
+        # Deleting the candidate cascades without recreating its rows
+        self.alice.delete()
+        self.assertFalse(VoteRollup.objects.filter(candidate_id=self.alice.id).exists())
+        self.assertEqual(verify_rollups(), [])
+
+    def test_vote_timeseries(self):
+        self.assertEqual(list(vote_timeseries('minute')), [
+            (utc(1, 9, 15), 2), (utc(1, 9, 47), 1), (utc(1, 11, 5), 1), (utc(2, 8), 1),
+        ])
+        self.assertEqual(list(vote_timeseries('hour')), [
+            (utc(1, 9), 3), (utc(1, 11), 1), (utc(2, 8), 1),
+        ])
+        self.assertEqual(list(vote_timeseries('day')), [(utc(1), 4), (utc(2), 1)])
+
+        # ``since`` is widened to its bucket, ``until`` is exclusive
+        self.assertEqual(
+            list(vote_timeseries('hour', since=utc(1, 9, 30), until=utc(1, 11))),
+            [(utc(1, 9), 3)],
+        )
+        self.assertEqual(list(vote_timeseries('day', candidate=self.bob.id)), [(utc(1), 1), (utc(2), 1)])
+
+    def test_fill_buckets(self):
+        rows = vote_timeseries('minute', since=utc(1, 9, 45), until=utc(1, 9, 48))
+        self.assertEqual(fill_buckets(rows, 'minute', utc(1, 9, 45), utc(1, 9, 48)), [
+            (utc(1, 9, 45), 0), (utc(1, 9, 46), 0), (utc(1, 9, 47), 1),
+        ])
+        rows = vote_timeseries('hour', since=utc(1, 9), until=utc(1, 12))
+        self.assertEqual(fill_buckets(rows, 'hour', utc(1, 9, 30), utc(1, 12)), [
+            (utc(1, 9), 3), (utc(1, 10), 0), (utc(1, 11), 1),
+        ])
+        rows = vote_timeseries('day')
+        self.assertEqual(fill_buckets(rows, 'day', utc(1), utc(4)), [
+            (utc(1), 4), (utc(2), 1), (utc(3), 0),
+        ])
+
+    def test_rebuild_rollups(self):
+        live = self.rollups(self.alice), self.rollups(self.bob)
+        VoteRollup.objects.filter(candidate=self.alice, granularity='day').update(vote_count=7)
+        VoteRollup.objects.filter(candidate=self.bob, granularity='minute').delete()
+        self.assertEqual(len(verify_rollups()), 3)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_rollups', verify=True, stdout=io.StringIO())
+
+        version = tally_version()
+        mismatches = rebuild_rollups()
+        self.assertEqual(
+            sorted((granularity, candidate_id) for granularity, _, candidate_id, _, _ in mismatches),
+            [('day', self.alice.id), ('minute', self.bob.id), ('minute', self.bob.id)],
+        )
+        self.assertEqual((self.rollups(self.alice), self.rollups(self.bob)), live)
+        self.assertEqual(verify_rollups(), [])
+        self.assertEqual(len(count_rollups()), VoteRollup.objects.count())
+        # Cached trend charts are re-rendered
+        self.assertGreater(tally_version(), version)
+
+
+class LazyImportTests(SimpleTestCase):
+    """
+    Serving votes doesn't load the numerical or plotting libraries.
+    """
+
+    def test_views_import_without_heavy_libraries(self):
+        # A fresh interpreter, since this one has loaded them for other tests
+        script = (
+            'import sys, django\n'
+            'django.setup()\n'
+            'import votes_app.views.voting, votes_app.urls\n'
+            'print(sorted(name for name in ("numpy", "matplotlib", "pyarrow") if name in sys.modules))\n'
+        )
+        result = subprocess.run(
+            [sys.executable, '-c', script],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=settings.BASE_DIR,
+            env={**os.environ, 'DJANGO_SETTINGS_MODULE': 'voting_project.settings'},
+        )
+        self.assertEqual(result.stdout.strip(), '[]')
@@ -4,10 +4,14 @@ URL configuration for the Voting System application.
 This module defines all URL patterns for the votes_app, including:
 - Home page (voting form)
 - Vote processing
+- Bulk ballot upload
 - Results display
-- Analytics dashboard
-- Chart generation
+- Analytics dashboard and its JSON statistics and vote timeseries
+- Live results stream
+- Chart generation and chart data for drawing in the browser
 - CSV export
+- Request metrics for Prometheus
+- Vote audit log digest and inclusion proofs
 """
 
 from django.urls import path
@@ -23,20 +27,42 @@ urlpatterns = [
     # Vote processing endpoint
     path('vote/', views.vote, name='vote'),
     
+    # Bulk ballot upload for polling stations (CSV/JSONL)
+    path('ballots/import/', views.upload_ballots, name='upload_ballots'),
+    
     # Results page
     path('results/', views.results, name='results'),
     
     # Analytics page with statistics and chart
     path('analytics/', views.analytics, name='analytics'),
     
-    # Chart generation endpoints (returns JSON with base64 image)
+    # Analytics statistics as JSON for the dashboard
+    path('analytics/stats/', views.analytics_stats, name='analytics_stats'),
+    
+    # Votes per minute/hour/day as JSON, read from the vote rollups
+    path('analytics/timeseries/', views.analytics_timeseries, name='analytics_timeseries'),
+    
+    # Server-sent events with live tally updates (a WebSocket variant is
+    # routed in voting_project.asgi)
+    path('results/live/', views.live_results, name='live_results'),
+    
+    # Chart generation endpoints (PNG/SVG with ?format=, else JSON with base64 image)
     path('chart/', views.generate_chart, name='generate_chart'),
     path('chart/pie/', views.generate_pie_chart, name='generate_pie_chart'),
     path('chart/horizontal/', views.generate_horizontal_bar_chart, name='generate_horizontal_chart'),
     path('chart/party/', views.generate_party_chart, name='generate_party_chart'),
     path('chart/line/', views.generate_line_chart, name='generate_line_chart'),
     
+    # The numbers behind every chart as JSON, drawn by the analytics page
+    path('chart/data/', views.chart_data, name='chart_data'),
+    
     # CSV export endpoint
     path('export/', views.export_results, name='export_results'),
+    
+    # Per-view request metrics, at Prometheus' default scrape path
+    path('metrics', views.metrics, name='metrics'),
+    
+    # Merkle root of the vote audit log, with ?seq= inclusion proofs
+    path('audit/', views.audit_digest, name='audit_digest'),
 ]
 
@@ -0,0 +1,57 @@
+"""
+Views for the Voting System application.
+
+The views are split by feature so that each module only imports what its
+views need; heavy libraries (numpy, pyarrow) are loaded on first use, and
+matplotlib only ever runs in the render farm's processes. A worker that just
+serves votes therefore starts with little more than Django loaded.
+
+- voting: home (voting form), vote (ballot submission), upload_ballots
+  (bulk import from a polling station, CSV/JSONL)
+- results: results (results page), live_results (server-sent tally updates)
+- analytics: analytics (statistics page), analytics_stats (the same
+  statistics as JSON), analytics_timeseries (votes per minute/hour/day as
+  JSON)
+- charts: generate_chart, generate_pie_chart, generate_horizontal_bar_chart,
+  generate_party_chart, generate_line_chart (PNG/SVG/JSON charts),
+  chart_data (the numbers behind every chart, for drawing in the browser)
+- export: export_results (streamed CSV, gzip, Parquet or Arrow)
+- metrics: metrics (per-view request metrics for Prometheus)
+- audit: audit_digest (Merkle root of the vote audit log and inclusion
+  proofs)
+"""
+
+from .analytics import analytics, analytics_stats, analytics_timeseries
+from .audit import audit_digest
+from .charts import (
+    chart_data,
+    generate_chart,
+    generate_horizontal_bar_chart,
+    generate_line_chart,
+    generate_party_chart,
+    generate_pie_chart,
+)
+from .export import export_results
+from .metrics import metrics
+from .results import live_results, results
+from .voting import home, upload_ballots, vote
+
+__all__ = [
+    'analytics',
+    'analytics_stats',
+    'analytics_timeseries',
+    'audit_digest',
+    'chart_data',
+    'export_results',
+    'generate_chart',
+    'generate_horizontal_bar_chart',
+    'generate_line_chart',
+    'generate_party_chart',
+    'generate_pie_chart',
+    'home',
+    'live_results',
+    'metrics',
+    'results',
+    'upload_ballots',
+    'vote',
+]
@@ -0,0 +1,126 @@
+"""
+Analytics views: statistics over the tallies, as a page and as JSON, and
+vote trends over time as JSON.
+
+The statistics come from ``stats``, which needs numpy; it is imported inside
+the views, so numpy is only loaded once analytics are first requested. The
+trends are read from the vote rollups (see ``rollups``) and need no numpy.
+"""
+
+from django.http import HttpResponse, HttpResponseBadRequest, JsonResponse
+from django.utils import timezone
+
+from ..fragments import fragment_cache
+from ..metrics import timed
+from ..models import VoteRollup
+from ..rollups import DEFAULT_GRANULARITY, MAX_BUCKETS, bucket_count, fill_buckets, parse_window, vote_timeseries
+from ..tallies import atally_version
+
+
+async def analytics(request):
+    """
+    Display analytics page with statistics and chart.
+    
+    Computes (see ``stats.summarize``):
+    - Mean, median and standard deviation of votes per candidate
+    - Margin of victory and effective number of parties
+    - Vote share per party
+    - Displays the charts, drawn in the browser from ``chart_data``
+      (``?render=server`` shows the server-rendered images instead)
+    
+    The rendered page is cached per tally version (see ``fragments``), so
+    the statistics are only recomputed after a vote.
+    """
+    client_charts = request.GET.get('render') != 'server'
+    version = await atally_version()
+    page = fragment_cache.get('analytics', version, client_charts)
+    if page is not None:
+        return HttpResponse(page)
+    
+    # numpy is loaded on first use, keeping it out of worker start-up
+    from ..stats import aload_tallies, summarize
+    
+    tallies = await aload_tallies()
+    summary = summarize(tallies)
+    
+    # Rows for the breakdown list, most votes first
+    candidate_votes = [
+        {'id': candidate_id, 'name': name, 'party': party, 'vote_count': int(vote_count)}
+        for candidate_id, name, party, vote_count in zip(
+            tallies['ids'], tallies['names'], tallies['parties'], tallies['votes'],
+        )
+    ]
+    
+    context = {
+        'candidate_votes': candidate_votes,
+        'mean_votes': summary['mean'],
+        'median_votes': summary['median'],
+        'total_candidates': summary['total_candidates'],
+        'stats': summary,
+        'client_charts': client_charts,
+    }
+    with timed('render'):
+        page = fragment_cache.render('analytics', 'votes_app/analytics.html', context, version, client_charts)
+    return HttpResponse(page)
+
+
+async def analytics_stats(request):
+    """
+    Return the analytics statistics as JSON (see ``stats.summarize``).
+    
+    Used by the analytics page to refresh its figures on live updates.
+    """
+    from ..stats import aload_tallies, summarize
+    
+    return JsonResponse(summarize(await aload_tallies()))
+
+
+async def analytics_timeseries(request):
+    """
+    Return the number of votes cast per time bucket as JSON.
+    
+    Buckets are read from the rollup table, so the cost grows with the
+    number of buckets returned, not with the number of ballots.
+    
+    Query parameters (all optional):
+        granularity: ``minute``, ``hour`` or ``day`` (default)
+        window: Only the last stretch of time, e.g. ``90m``, ``24h`` or
+            ``7d``; every bucket in the window is listed, including empty
+            ones (at most ``MAX_BUCKETS``). Without it, every bucket with
+            votes is listed.
+        candidate: Candidate id to count votes for (default: all)
+    """
+    granularity = request.GET.get('granularity', DEFAULT_GRANULARITY)
+    if granularity not in VoteRollup.GRANULARITIES:
+        return HttpResponseBadRequest(f"Unsupported granularity: {granularity}")
+    
+    try:
+        candidate = request.GET.get('candidate')
+        candidate = int(candidate) if candidate else None
+        window = request.GET.get('window')
+        window = parse_window(window) if window else None
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    
+    since = until = None
+    if window is not None:
+        until = timezone.now()
+        since = until - window
+        if bucket_count(granularity, since, until) > MAX_BUCKETS:
+            return HttpResponseBadRequest(
+                f"Window spans more than {MAX_BUCKETS} {granularity} buckets; "
+                "use a coarser granularity."
+            )
+    
+    rows = [row async for row in vote_timeseries(granularity, since, until, candidate)]
+    if window is not None:
+        rows = fill_buckets(rows, granularity, since, until)
+    
+    return JsonResponse({
+        'granularity': granularity,
+        'since': since,
+        'until': until,
+        'candidate': candidate,
+        'total_votes': sum(count for _, count in rows),
+        'buckets': [{'start': bucket, 'votes': count} for bucket, count in rows],
+    })
@@ -0,0 +1,35 @@
+"""
+Audit view: the vote log's Merkle root and inclusion proofs, read-only.
+"""
+
+from django.http import HttpResponseBadRequest, JsonResponse
+from django.views.decorators.http import require_safe
+
+from ..audit import AuditError, current_digest, inclusion_proof
+
+
+@require_safe
+def audit_digest(request):
+    """
+    Return the size and Merkle root of the vote audit log as JSON.
+    
+    Publishing the root (e.g. at the close of polls) commits to every vote
+    write so far: the log can't later be altered without changing it.
+    
+    Query parameters (optional):
+        seq: Entry to prove included; adds its inclusion proof under
+            ``proof`` (see ``audit.inclusion_proof``)
+        size: Prove inclusion in the tree of this many entries, e.g. one
+            whose root was published earlier (default: the current log)
+    """
+    payload = current_digest()
+    if 'seq' in request.GET:
+        try:
+            seq = int(request.GET['seq'])
+            size = int(request.GET['size']) if 'size' in request.GET else None
+            payload['proof'] = inclusion_proof(seq, size)
+        except ValueError:
+            return HttpResponseBadRequest("seq and size must be integers.")
+        except AuditError as e:
+            return JsonResponse({'error': str(e)}, status=404)
+    return JsonResponse(payload)
@@ -0,0 +1,202 @@
+"""
+Chart views: PNG/SVG (or base64 JSON) charts of the tallies, and the chart
+data as JSON for drawing them in the browser.
+
+Rendering happens in the render farm's worker processes, so neither this
+module nor anything it imports loads matplotlib.
+"""
+
+import base64
+import json
+
+from django.http import HttpResponse, JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+
+from ..chart_cache import chart_cache
+from ..charts import CHART_FORMATS, CHART_SIZES, DEFAULT_CHART_SIZE, achart_payload, aload_chart_data, arender_chart
+from ..metrics import timed
+from ..models import VoteRollup
+from ..render_farm import RenderUnavailable
+from ..rollups import DEFAULT_GRANULARITY
+from ..tallies import atally_version
+
+
+async def _chart_response(request, chart_type):
+    """
+    Return ``chart_type`` as an image, or as JSON with a base64-encoded PNG.
+    
+    Query parameters:
+        format: ``png`` or ``svg`` for the raw image, ``json`` (default)
+            for the legacy ``{'image': 'data:...'}`` payload
+        size: ``small``, ``medium`` (default) or ``large``
+        granularity: ``minute``, ``hour`` or ``day`` (default); line
+            chart only
+    
+    Rendered charts are cached per (chart type, size, format, granularity,
+    tally version), so viewers of unchanged results are served without
+    touching matplotlib.
+    Responses carry a strong ETag derived from the tally version; a matching
+    ``If-None-Match`` gets a 304 without loading or rendering anything.
+    
+    Queries go through the async ORM and rendering runs in the render farm's
+    worker processes, so a cache miss never blocks the event loop. If the
+    farm can't render right now, the newest cached version is served (with
+    its own ETag), or a 503 if there is none.
+    """
+    size = request.GET.get('size', DEFAULT_CHART_SIZE)
+    if size not in CHART_SIZES:
+        size = DEFAULT_CHART_SIZE
+    output = request.GET.get('format', 'json')
+    if output not in CHART_FORMATS and output != 'json':
+        output = 'json'
+    granularity = None
+    if chart_type == 'line':
+        granularity = request.GET.get('granularity', DEFAULT_GRANULARITY)
+        if granularity not in VoteRollup.GRANULARITIES:
+            granularity = DEFAULT_GRANULARITY
+    
+    # Every vote bumps the tally version, so it also versions the rollups
+    version = await atally_version()
+    tag = f"{chart_type}-{size}-{output}" + (f"-{granularity}" if granularity else "")
+    etag = f'"{tag}-v{version}"'
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response, served_version = await _render_chart_response(chart_type, size, output, granularity, version)
+        if served_version is None:
+            return response
+        etag = f'"{tag}-v{served_version}"'
+    
+    # Let browsers keep the chart but revalidate it on every use
+    response['ETag'] = etag
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+async def _render_chart_response(chart_type, size, output, granularity, version):
+    """
+    Build the full chart response, rendering on a cache miss.
+    
+    Returns:
+        tuple: The response and the tally version of the chart it contains
+        (None for an error response)
+    """
+    fmt = 'png' if output == 'json' else output
+    variant = f"{size}-{fmt}" + (f"-{granularity}" if granularity else "")
+    image = chart_cache.lookup(chart_type, variant, version)
+    if image is None:
+        data = await aload_chart_data(chart_type, granularity or DEFAULT_GRANULARITY)
+        try:
+            with timed('render'):
+                image = await arender_chart(
+                    chart_type,
+                    data,
+                    size,
+                    fmt,
+                    key=(chart_type, variant, version),
+                    on_done=lambda rendered: chart_cache.set(chart_type, variant, version, rendered),
+                )
+        except RenderUnavailable:
+            stale = chart_cache.latest(chart_type, variant)
+            if stale is None:
+                response = HttpResponse("Chart temporarily unavailable.", status=503)
+                response['Retry-After'] = '1'
+                return response, None
+            # Not ``version``: the on_done callback above still needs it
+            served_version, image = stale
+            return _chart_image_response(image, output, fmt), served_version
+    
+    return _chart_image_response(image, output, fmt), version
+
+
+def _chart_image_response(image, output, fmt):
+    """Wrap rendered chart bytes in an image or JSON response."""
+    if output == 'json':
+        # Encode image to base64
+        image_base64 = base64.b64encode(image).decode('utf-8')
+        return JsonResponse({'image': f'data:image/png;base64,{image_base64}'})
+    return HttpResponse(image, content_type=CHART_FORMATS[fmt])
+
+
+async def generate_chart(request):
+    """
+    Generate a matplotlib bar chart dynamically and return as image.
+    
+    Creates a bar chart showing votes per candidate and returns it as
+    PNG/SVG or a base64-encoded image (see ``_chart_response``).
+    """
+    return await _chart_response(request, 'bar')
+
+
+async def generate_pie_chart(request):
+    """
+    Generate a matplotlib pie chart showing vote distribution.
+    
+    Creates a pie chart showing percentage of votes per candidate.
+    """
+    return await _chart_response(request, 'pie')
+
+
+async def generate_horizontal_bar_chart(request):
+    """
+    Generate a horizontal bar chart showing votes per candidate.
+    
+    Creates a horizontal bar chart for better readability with many candidates.
+    """
+    return await _chart_response(request, 'horizontal')
+
+
+async def generate_party_chart(request):
+    """
+    Generate a bar chart showing votes grouped by political party.
+    
+    Creates a chart showing total votes per party.
+    """
+    return await _chart_response(request, 'party')
+
+
+async def generate_line_chart(request):
+    """
+    Generate a line chart showing voting trends over time.
+    
+    Creates a line chart showing votes cast per minute, hour or day (read
+    from the vote rollups), or the vote distribution by candidate while
+    there is only one bucket of data.
+    """
+    return await _chart_response(request, 'line')
+
+
+async def chart_data(request):
+    """
+    Return the numbers behind every chart as compact JSON.
+    
+    The analytics page draws its charts in the browser from this payload
+    (see ``charts.chart_payload``), so a chart costs a small JSON document
+    instead of a matplotlib render. The server-side images remain for
+    export and embedding.
+    
+    Query parameters:
+        granularity: ``minute``, ``hour`` or ``day`` (default) buckets for
+            the trend
+    
+    Like the images, the payload is cached per tally version and carries an
+    ETag, so unchanged data is answered with a 304.
+    """
+    granularity = request.GET.get('granularity', DEFAULT_GRANULARITY)
+    if granularity not in VoteRollup.GRANULARITIES:
+        granularity = DEFAULT_GRANULARITY
+    
+    version = await atally_version()
+    etag = f'"data-{granularity}-v{version}"'
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        payload = chart_cache.lookup('data', granularity, version)
+        if payload is None:
+            data = await achart_payload(granularity)
+            data['version'] = version
+            payload = json.dumps(data, separators=(',', ':')).encode()
+            chart_cache.set('data', granularity, version, payload)
+        response = HttpResponse(payload, content_type='application/json')
+    
+    response['ETag'] = etag
+    patch_cache_control(response, no_cache=True)
+    return response
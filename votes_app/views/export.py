@@ -0,0 +1,82 @@
+"""
+Export view: streams votes as CSV, gzip, Parquet or Arrow.
+
+pyarrow is only imported (by ``exports.stream_export``) when a columnar
+format is requested.
+"""
+
+import datetime
+
+from django.http import HttpResponseBadRequest, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from ..exports import EXPORT_FORMATS, export_rows, stream_export
+
+
+def export_results(request):
+    """
+    Export votes as a streamed download.
+    
+    Rows are read from the database in chunks and written out as they
+    arrive, so memory use doesn't grow with the number of votes.
+    
+    Query parameters (all optional):
+        format: ``csv`` (default), ``csv.gz``, ``parquet`` or ``arrow``
+        candidate: Candidate id to filter on
+        party: Party name to filter on
+        from / to: ISO 8601 date or datetime bounds on the vote timestamp;
+            ``from`` is inclusive and a ``to`` datetime exclusive, while a
+            ``to`` date includes that whole day
+    """
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        return HttpResponseBadRequest(f"Unsupported export format: {fmt}")
+    
+    try:
+        candidate = request.GET.get('candidate')
+        candidate = int(candidate) if candidate else None
+        start = _parse_export_bound(request.GET.get('from'))
+        end = _parse_export_bound(request.GET.get('to'), end=True)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    
+    rows = export_rows(
+        candidate=candidate,
+        party=request.GET.get('party') or None,
+        start=start,
+        end=end,
+    )
+    try:
+        content = stream_export(rows, fmt)
+    except ImportError:
+        return HttpResponseBadRequest("Parquet/Arrow export requires the pyarrow package.")
+    
+    content_type, extension = EXPORT_FORMATS[fmt]
+    response = StreamingHttpResponse(content, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="voting_results.{extension}"'
+    return response
+
+
+def _parse_export_bound(value, end=False):
+    """
+    Parse an ISO 8601 date or datetime query parameter into an aware datetime.
+    
+    A date is the start of that day, or with ``end`` the start of the next
+    one, so an exclusive upper bound still covers the whole day.
+    """
+    if not value:
+        return None
+    # Dates first: parse_datetime also accepts them, as midnight
+    day = parse_date(value)
+    if day is not None:
+        if end:
+            day += datetime.timedelta(days=1)
+        parsed = datetime.datetime.combine(day, datetime.time.min)
+    else:
+        parsed = parse_datetime(value)
+        if parsed is None:
+            raise ValueError(f"Invalid date: {value}")
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
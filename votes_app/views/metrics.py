@@ -0,0 +1,45 @@
+"""
+Metrics view: per-view request metrics for Prometheus.
+"""
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
+
+from ..fragments import fragment_cache
+from ..metrics import request_metrics
+
+# Prometheus text exposition format
+METRICS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def metrics(request):
+    """
+    Return this process's request metrics in the Prometheus text format,
+    followed by the fragment cache hit and miss counters.
+    
+    Requires ``Authorization: Bearer <REQUEST_METRICS['TOKEN']>`` (see
+    ``metrics.RequestMetrics``). Without a token the endpoint is only open
+    when ``DEBUG`` is on.
+    """
+    token = request_metrics.token
+    supplied = request.headers.get('Authorization', '').removeprefix('Bearer ')
+    allowed = constant_time_compare(supplied, token) if token else settings.DEBUG
+    if not allowed:
+        return HttpResponse("Invalid or missing metrics token.", status=403, content_type='text/plain')
+    
+    return HttpResponse(request_metrics.export() + _fragment_cache_metrics(), content_type=METRICS_CONTENT_TYPE)
+
+
+def _fragment_cache_metrics():
+    """Render the fragment cache counters in the Prometheus text format."""
+    stats = fragment_cache.stats()
+    lines = []
+    for counter, help_text in (
+        ('hits', 'Fragment lookups served from the cache.'),
+        ('misses', 'Fragment lookups that had to render.'),
+    ):
+        name = f'voting_fragment_cache_{counter}_total'
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+        lines.extend(f'{name}{{fragment="{fragment}"}} {counts[counter]}' for fragment, counts in stats.items())
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,78 @@
+"""
+Results views: the results page and the live tally stream.
+"""
+
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+
+from ..fragments import fragment_cache
+from ..live import broadcaster, stream_events
+from ..metrics import timed
+from ..snapshots import results_snapshot
+from ..tallies import atally_version, atotal_votes_cast, candidate_percentages
+
+
+async def results(request):
+    """
+    Display voting results page.
+    
+    Shows:
+    - Total number of votes
+    - Votes per candidate
+    - Percentage breakdown (computed by the database)
+    
+    Async so it runs on the event loop under ASGI; the queries are awaited
+    and the template is rendered from already-fetched rows. With results
+    snapshots enabled, the published page is served instead, without any
+    queries (see ``snapshots``). Otherwise the rendered page is cached per
+    tally version (see ``fragments``), so between votes a view costs only
+    the version lookup.
+    """
+    page = results_snapshot.page()
+    if page is not None:
+        response = FileResponse(open(page, 'rb'), content_type='text/html; charset=utf-8')
+        # Revalidate on every view; the snapshot changes with every vote
+        response['Cache-Control'] = 'no-cache'
+        return response
+    
+    version = await atally_version()
+    page = fragment_cache.get('results', version)
+    if page is None:
+        # Get total votes from the tally table
+        total_votes = await atotal_votes_cast()
+        
+        # Get votes per candidate with counts and percentages
+        candidate_votes = [
+            candidate async for candidate in
+            candidate_percentages(total_votes).order_by('-vote_count', 'name')
+        ]
+        
+        context = {
+            'total_votes': total_votes,
+            'candidate_votes': candidate_votes,
+        }
+        with timed('render'):
+            page = fragment_cache.render('results', 'votes_app/results.html', context, version)
+    return HttpResponse(page)
+
+
+async def live_results(request):
+    """
+    Stream tally updates to the results and analytics pages (SSE).
+    
+    The first event is a full snapshot of the tallies; after that, each
+    ``tally`` event carries only the candidates whose counts changed, with
+    bursts of votes coalesced (see ``live.TallyBroadcaster``).
+    
+    Needs the ASGI entry point to hold connections open without tying up a
+    worker thread each.
+    """
+    async def events():
+        async with broadcaster.subscribe() as subscription:
+            async for event in stream_events(subscription, broadcaster.keepalive):
+                yield event
+    
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,147 @@
+"""
+Voting views: the voting form, ballot casting and bulk ballot upload.
+
+This is the hot path, so the module imports nothing beyond Django and the
+app's own light modules.
+"""
+
+from django.conf import settings
+from django.contrib import messages
+from django.core.exceptions import ValidationError
+from django.http import JsonResponse
+from django.shortcuts import render, redirect
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+
+from ..ballots import BALLOT_FORMATS, AlreadyVoted, cast_vote, import_ballots, parse_ballots
+from ..fragments import fragment_cache
+from ..journal import vote_journal
+from ..metrics import timed
+from ..models import Candidate
+from ..voter_cache import voter_cache
+
+
+def home(request):
+    """
+    Home page view displaying the voting form.
+    
+    GET: Display form with voter UID input and candidate selection
+    
+    The voter is looked up through the voter cache, which also tells whether
+    they have already voted. The candidate dropdown comes from the fragment
+    cache, so a cached page needs no query at all.
+    """
+    # Options for all candidates in the dropdown
+    candidate_options = fragment_cache.get('candidate_options')
+    if candidate_options is None:
+        with timed('render'):
+            candidate_options = fragment_cache.render(
+                'candidate_options',
+                'votes_app/fragments/candidate_options.html',
+                {'candidates': Candidate.objects.all().order_by('name')},
+            )
+    
+    # Get voter name if UID is provided
+    voter_name = None
+    has_voted = False
+    voter_uid = request.GET.get('uid', '')
+    
+    if voter_uid:
+        voter = voter_cache.get(voter_uid)
+        if voter is None:
+            messages.error(request, "Voter UID not found. Please check your UID or register first.")
+        else:
+            voter_name = voter.name
+            has_voted = voter.has_voted
+    
+    context = {
+        'candidate_options': candidate_options,
+        'voter_name': voter_name,
+        'voter_uid': voter_uid,
+        'has_voted': has_voted,
+    }
+    with timed('render'):
+        return render(request, 'votes_app/index.html', context)
+
+
+def vote(request):
+    """
+    Process vote submission.
+    
+    POST: Save vote if valid, prevent duplicates
+    GET: Redirect to home page
+    
+    Duplicate prevention relies on the one-vote-per-voter database
+    constraint (see ``ballots.cast_vote``) rather than a separate check.
+    With the write-behind journal enabled, the ballot is journaled and
+    committed in the background instead (see ``journal``).
+    """
+    if request.method == 'POST':
+        voter_uid = request.POST.get('voter_uid')
+        candidate_id = request.POST.get('candidate_id')
+        voter_name = request.POST.get('voter_name')
+        
+        # Validate that required fields are present
+        if not all([voter_uid, candidate_id]):
+            messages.error(request, "Please provide all required information.")
+            return redirect('votes_app:home')
+        
+        try:
+            if vote_journal.enabled:
+                vote_journal.submit(voter_uid, candidate_id, voter_name)
+            else:
+                cast_vote(voter_uid, candidate_id, voter_name)
+        except AlreadyVoted as e:
+            messages.warning(request, str(e))
+            return redirect('votes_app:results')
+        except ValidationError as e:
+            messages.error(request, e.messages[0])
+            return redirect('votes_app:home')
+        except (Candidate.DoesNotExist, ValueError):
+            messages.error(request, "Selected candidate does not exist.")
+            return redirect('votes_app:home')
+        except Exception as e:
+            messages.error(request, f"Error processing vote: {str(e)}")
+            return redirect('votes_app:home')
+        
+        messages.success(request, "Your vote has been cast successfully!")
+        return redirect('votes_app:results')
+    
+    # GET request - redirect to home
+    return redirect('votes_app:home')
+
+
+@csrf_exempt
+@require_POST
+def upload_ballots(request):
+    """
+    Bulk-import ballots uploaded by an offline polling station.
+    
+    POST body: CSV (``text/csv``) or JSON lines (``application/x-ndjson``)
+    with ``voter_uid``, ``candidate_id`` and optional ``timestamp`` fields.
+    The format can also be forced with ``?format=csv|jsonl``.
+    
+    Requires ``Authorization: Bearer <BALLOT_IMPORT_TOKEN>``; the endpoint is
+    disabled when no token is configured.
+    
+    Returns a JSON report with accepted/rejected counts and one entry per row.
+    If the body can't be read to the end (e.g. it isn't valid UTF-8), the
+    rows before the failure are imported anyway and the report comes back
+    with status 400 and an ``error`` saying at which line the import stopped.
+    """
+    token = getattr(settings, 'BALLOT_IMPORT_TOKEN', '')
+    supplied = request.headers.get('Authorization', '').removeprefix('Bearer ')
+    if not token or not constant_time_compare(supplied, token):
+        return JsonResponse({'error': 'Invalid or missing import token.'}, status=403)
+    
+    fmt = request.GET.get('format')
+    if not fmt:
+        fmt = 'csv' if request.content_type == 'text/csv' else 'jsonl'
+    if fmt not in BALLOT_FORMATS:
+        return JsonResponse({'error': f"Unsupported ballot format: {fmt}"}, status=400)
+    
+    # Stream the body line by line rather than loading it into memory
+    lines = (line.decode('utf-8') for line in request)
+    result = import_ballots(parse_ballots(lines, fmt))
+    return JsonResponse(result, status=400 if 'error' in result else 200)
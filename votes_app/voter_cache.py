@@ -0,0 +1,201 @@
+"""
+Voter UID lookup cache for the Voting System application.
+
+During a rush the same few hundred voters at a polling station are looked up
+over and over: once when the voting form is opened with ``?uid=`` and again
+when the ballot is submitted. ``VoterCache`` maps a UID to a ``CachedVoter``
+(id, name and whether a ballot has been cast):
+- entries live in a bounded in-process LRU and expire after ``ttl`` seconds
+- an optional shared backend (any alias in ``settings.CACHES``) lets worker
+  processes reuse each other's lookups
+- entries are invalidated once a vote for the voter commits (see
+  ``ballots`` and ``signals``), so ``has_voted`` never lags behind a ballot
+  cast through this process or the shared backend; other processes' memory
+  catches up within ``ttl``
+- ``hits``, ``shared_hits`` and ``misses`` (see ``stats``) show how well the
+  cache is sized
+
+The cache is only a hint: ``has_voted`` is confirmed against the database
+before a ballot is rejected, and ballots are protected by the
+one-vote-per-voter constraint anyway.
+
+Configured through ``settings.VOTER_CACHE``.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+
+from .models import Vote, Voter
+
+# What the cache holds per UID
+CachedVoter = namedtuple('CachedVoter', ['id', 'name', 'has_voted'])
+
+
+class VoterCache:
+    """
+    Bounded LRU cache of voters by UID, with a TTL and an optional shared tier.
+    
+    Attributes:
+        max_entries (int): Maximum number of voters kept in memory
+        ttl (float): Seconds an entry stays valid
+        backend (str): Alias in ``settings.CACHES`` shared between processes,
+            or None for memory only
+        hits (int): Lookups served from memory
+        shared_hits (int): Lookups served from the shared backend
+        misses (int): Lookups found in neither tier (``get`` then loads
+            the voter from the database)
+        invalidations (int): Entries dropped because a vote changed
+    """
+    
+    def __init__(self, max_entries=4096, ttl=60.0, backend=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.backend = backend
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    @classmethod
+    def from_settings(cls):
+        """Build a cache from ``settings.VOTER_CACHE``."""
+        options = getattr(settings, 'VOTER_CACHE', {})
+        return cls(
+            max_entries=options.get('MAX_ENTRIES', 4096),
+            ttl=options.get('TTL', 60.0),
+            backend=options.get('BACKEND'),
+        )
+    
+    def get(self, uid):
+        """
+        Return the ``CachedVoter`` for ``uid``, loading it on a miss.
+        
+        Returns:
+            CachedVoter: The voter, or None if no voter has ``uid`` (unknown
+            UIDs aren't cached, so a voter registered meanwhile is found)
+        """
+        voter = self._lookup(uid)
+        if voter is not None:
+            self.hits += 1
+            return voter
+        
+        if self.backend:
+            voter = self._shared().get(self._key(uid))
+            if voter is not None:
+                voter = CachedVoter(*voter)
+                self.shared_hits += 1
+                self._remember(uid, voter)
+                return voter
+        
+        self.misses += 1
+        voter = _load_voter(uid)
+        if voter is not None:
+            self._remember(uid, voter)
+            if self.backend:
+                self._shared().set(self._key(uid), tuple(voter), self.ttl)
+        return voter
+    
+    def peek(self, uid):
+        """
+        Return the voter for ``uid`` if it is in memory, without loading it.
+        
+        Counted as a hit or a miss like ``get``, so the hit rate reflects
+        ``cast_vote``'s lookups too.
+        """
+        voter = self._lookup(uid)
+        if voter is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return voter
+    
+    def invalidate(self, *uids):
+        """Drop ``uids`` from memory and from the shared backend."""
+        with self._lock:
+            for uid in uids:
+                self._entries.pop(uid, None)
+            self.invalidations += len(uids)
+        if self.backend and uids:
+            self._shared().delete_many([self._key(uid) for uid in uids])
+    
+    def invalidate_on_commit(self, *uids):
+        """Invalidate ``uids`` once the current transaction commits."""
+        if uids:
+            transaction.on_commit(lambda: self.invalidate(*uids))
+    
+    def clear(self):
+        """Drop every entry held in memory."""
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self):
+        """
+        Return the counters and the overall hit rate.
+        
+        Returns:
+            dict: ``entries``, ``hits``, ``shared_hits``, ``misses``,
+            ``invalidations`` and ``hit_rate`` (0..1, None before any lookup)
+        """
+        lookups = self.hits + self.shared_hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'shared_hits': self.shared_hits,
+            'misses': self.misses,
+            'invalidations': self.invalidations,
+            'hit_rate': round((self.hits + self.shared_hits) / lookups, 4) if lookups else None,
+        }
+    
+    def _lookup(self, uid):
+        """Return the unexpired in-memory entry for ``uid``, or None (not counted)."""
+        with self._lock:
+            entry = self._entries.get(uid)
+            if entry is None:
+                return None
+            expires, voter = entry
+            if expires <= time.monotonic():
+                del self._entries[uid]
+                return None
+            self._entries.move_to_end(uid)
+            return voter
+    
+    def _remember(self, uid, voter):
+        """Store ``voter`` in memory, evicting the least recently used entries."""
+        with self._lock:
+            self._entries[uid] = (time.monotonic() + self.ttl, voter)
+            self._entries.move_to_end(uid)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def _shared(self):
+        """Return the shared Django cache."""
+        return caches[self.backend]
+    
+    @staticmethod
+    def _key(uid):
+        """Return the shared cache key for ``uid`` (hashed, as UIDs are free-form)."""
+        return 'voter-uid:' + hashlib.sha256(uid.encode()).hexdigest()
+
+
+def _load_voter(uid):
+    """Load a ``CachedVoter`` (or None) in one query."""
+    row = next(iter(
+        Voter.objects.filter(uid=uid)
+        .unordered()
+        .annotate(has_voted=Exists(Vote.objects.filter(voter=OuterRef('pk'))))
+        .values_list('id', 'name', 'has_voted')
+    ), None)
+    return CachedVoter(*row) if row else None
+
+
+# Process-wide cache used by the voting views
+voter_cache = VoterCache.from_settings()
@@ -0,0 +1,261 @@
+"""
+Electoral roll import for the Voting System application.
+
+Voters are otherwise registered one at a time: lazily when they first vote
+(see ``ballots``) or through the admin. Before polling opens the whole roll,
+often millions of voters, is loaded with ``manage.py import_voters``:
+- ``parse_roll`` streams a CSV or Parquet roll (Parquet requires the
+  optional ``pyarrow`` package) one row at a time and validates each row
+- ``import_voters`` deduplicates the UIDs of each chunk and inserts them
+  with multi-row ``INSERT ... ON CONFLICT (uid) DO NOTHING`` statements: the
+  ``uid`` unique index skips voters already registered (by an earlier
+  import, a previous chunk or concurrently by voting) instead of failing
+  the chunk, and the rows inserted are counted from the statements. This
+  is what ``bulk_create(ignore_conflicts=True)`` sends, without its
+  per-row model and SQL compilation, which took most of the time
+- ``bulk_load`` is the faster path for an initial load: secondary indexes on
+  the voter table are dropped and rebuilt at the end, and SQLite stops
+  syncing to disk (PostgreSQL stops waiting for commits to be flushed)
+
+Each chunk commits in its own transaction and the import is idempotent, so
+an interrupted import can simply be run again; the command also records how
+many rows were committed and resumes after them.
+"""
+
+import csv
+from contextlib import contextmanager
+from itertools import islice
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Voter
+
+# Default number of rows validated and inserted per transaction
+ROLL_CHUNK_SIZE = 5000
+
+# Supported roll formats
+ROLL_FORMATS = ('csv', 'parquet')
+
+# Column names accepted for the voter UID and name
+UID_COLUMNS = ('uid', 'voter_uid')
+NAME_COLUMNS = ('name', 'voter_name')
+
+# Rows read from a Parquet file per record batch
+PARQUET_BATCH_SIZE = 65536
+
+# SQLite settings for the duration of a bulk load: no fsync (a crash can
+# lose the last chunks, which a rerun restores) and a 256 MiB page cache
+SQLITE_BULK_PRAGMAS = {'synchronous': 'OFF', 'cache_size': -256 * 1024}
+
+
+def parse_roll(source, fmt='csv'):
+    """
+    Parse an electoral roll into ``(row_number, uid, name_or_error)``.
+    
+    CSV rolls need a header with a ``uid`` (or ``voter_uid``) column and may
+    have a ``name`` (or ``voter_name``) column; Parquet rolls need columns of
+    the same names. A missing name defaults to ``Voter <uid>``, as for
+    voters registered when they vote. Invalid rows are yielded with an
+    exception in place of the name so they show up in the report.
+    
+    Args:
+        source: Text lines of a CSV roll, or the path of a Parquet file
+        fmt (str): One of ``ROLL_FORMATS``
+    
+    Yields:
+        tuple: ``(row_number, uid, name_or_error)``; CSV row numbers are
+        line numbers, Parquet ones count rows from 1
+    """
+    if fmt not in ROLL_FORMATS:
+        raise ValueError(f"Unsupported roll format: {fmt}")
+    
+    uid_length = Voter._meta.get_field('uid').max_length
+    name_length = Voter._meta.get_field('name').max_length
+    if fmt == 'csv':
+        records = _csv_records(source)
+    else:
+        records = _parquet_records(source)
+    
+    for number, uid, name in records:
+        uid = (uid or '').strip()
+        name = (name or '').strip() or f"Voter {uid}"
+        if not uid:
+            yield number, None, ValueError("Missing uid")
+        elif len(uid) > uid_length:
+            yield number, uid[:uid_length], ValueError(f"uid longer than {uid_length} characters")
+        elif len(name) > name_length:
+            yield number, uid, ValueError(f"name longer than {name_length} characters")
+        else:
+            yield number, uid, name
+
+
+def _csv_records(lines):
+    """Yield ``(line_number, uid, name)`` from CSV lines with a header."""
+    reader = csv.DictReader(lines)
+    uid_column = _column(reader.fieldnames or [], UID_COLUMNS)
+    name_column = _column(reader.fieldnames or [], NAME_COLUMNS, required=False)
+    for number, record in enumerate(reader, start=2):
+        yield number, record.get(uid_column), record.get(name_column) if name_column else None
+
+
+def _parquet_records(path):
+    """Yield ``(row_number, uid, name)`` from a Parquet file, a batch at a time."""
+    import pyarrow.parquet as pq
+    
+    roll = pq.ParquetFile(path)
+    uid_column = _column(roll.schema_arrow.names, UID_COLUMNS)
+    name_column = _column(roll.schema_arrow.names, NAME_COLUMNS, required=False)
+    columns = [uid_column] + ([name_column] if name_column else [])
+    number = 0
+    for batch in roll.iter_batches(batch_size=PARQUET_BATCH_SIZE, columns=columns):
+        uids = batch.column(0).to_pylist()
+        names = batch.column(1).to_pylist() if name_column else [None] * len(uids)
+        for uid, name in zip(uids, names):
+            number += 1
+            yield number, None if uid is None else str(uid), name
+
+
+def _column(names, candidates, required=True):
+    """Return the first of ``candidates`` present in ``names``."""
+    for name in candidates:
+        if name in names:
+            return name
+    if required:
+        raise ValueError(f"The roll has no {' or '.join(candidates)} column")
+    return None
+
+
+def _import_chunk(rows):
+    """
+    Insert the new voters of one chunk of parsed rows in a single transaction.
+    
+    Returns:
+        dict: ``inserted``, ``existing``, ``duplicates`` and ``rejected``
+        counts, plus the ``rejected`` report entries under ``errors``
+    """
+    errors = []
+    duplicates = 0
+    names = {}
+    for number, uid, name in rows:
+        if isinstance(name, Exception):
+            errors.append({'row': number, 'uid': uid, 'reason': str(name)})
+        elif uid in names:
+            duplicates += 1
+        else:
+            names[uid] = name
+    
+    quote = connection.ops.quote_name
+    table = quote(Voter._meta.db_table)
+    columns = ['uid', 'name', 'registered_on']
+    registered_on = Voter._meta.get_field('registered_on').get_db_prep_value(timezone.now(), connection)
+    voters = [(uid, name, registered_on) for uid, name in names.items()]
+    batch_size = max(connection.ops.bulk_batch_size(columns, voters), 1)
+    inserted = 0
+    with transaction.atomic(), connection.cursor() as cursor:
+        for start in range(0, len(voters), batch_size):
+            batch = voters[start:start + batch_size]
+            cursor.execute(
+                f"INSERT INTO {table} ({', '.join(map(quote, columns))}) "
+                f"VALUES {', '.join(['(%s, %s, %s)'] * len(batch))} "
+                f"ON CONFLICT ({quote('uid')}) DO NOTHING",
+                [value for voter in batch for value in voter],
+            )
+            inserted += cursor.rowcount
+    
+    return {
+        'inserted': inserted,
+        'existing': len(voters) - inserted,
+        'duplicates': duplicates,
+        'rejected': len(errors),
+        'errors': errors,
+    }
+
+
+def import_voters(rows, chunk_size=ROLL_CHUNK_SIZE, skip=0, progress=None, report=None):
+    """
+    Register the voters of a parsed roll in chunks.
+    
+    A row is rejected if it is invalid (see ``parse_roll``); a UID already
+    registered (including by an earlier chunk) or repeated within its chunk
+    is skipped.
+    
+    Args:
+        rows (iterable): Rows as produced by ``parse_roll``
+        chunk_size (int): Rows validated and inserted per transaction
+        skip (int): Rows to skip first, e.g. those committed by an
+            interrupted run
+        progress (callable): Called with the totals so far (see Returns)
+            after each chunk commits
+        report (callable): Called with the report entry of each rejected row
+    
+    Returns:
+        dict: ``rows`` (including skipped ones), ``inserted``, ``existing``,
+        ``duplicates`` and ``rejected`` counts
+    """
+    totals = {'rows': skip, 'inserted': 0, 'existing': 0, 'duplicates': 0, 'rejected': 0}
+    rows = iter(rows)
+    # Skipped rows are still parsed, but never touch the database
+    for _ in islice(rows, skip):
+        pass
+    
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        result = _import_chunk(chunk)
+        totals['rows'] += len(chunk)
+        for key in ('inserted', 'existing', 'duplicates', 'rejected'):
+            totals[key] += result[key]
+        if report:
+            for entry in result['errors']:
+                report(entry)
+        if progress:
+            progress(totals)
+    
+    return totals
+
+
+@contextmanager
+def bulk_load():
+    """
+    Speed up a large initial load of the voter table for the block.
+    
+    Drops the voter table's secondary indexes (everything in
+    ``Voter._meta.indexes``; the ``uid`` unique index stays, as the import
+    deduplicates against it) and rebuilds them once at the end, which is cheaper than
+    maintaining them row by row. On SQLite, disk syncs are turned off
+    (``SQLITE_BULK_PRAGMAS``); on PostgreSQL, commits stop waiting for the
+    WAL flush. Meant for loads before polling opens: until the block exits,
+    queries ordered by registration date can't use their index.
+    
+    Indexes missing when the block starts (after an interrupted bulk load)
+    are rebuilt as well.
+    """
+    with connection.cursor() as cursor:
+        present = connection.introspection.get_constraints(cursor, Voter._meta.db_table)
+    with connection.schema_editor() as editor:
+        for index in Voter._meta.indexes:
+            if index.name in present:
+                editor.remove_index(Voter, index)
+    
+    with connection.cursor() as cursor:
+        saved = {}
+        if connection.vendor == 'sqlite':
+            for pragma, value in SQLITE_BULK_PRAGMAS.items():
+                cursor.execute(f'PRAGMA {pragma}')
+                saved[pragma] = cursor.fetchone()[0]
+                cursor.execute(f'PRAGMA {pragma} = {value}')
+        elif connection.vendor == 'postgresql':
+            cursor.execute('SET synchronous_commit TO OFF')
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            for pragma, value in saved.items():
+                cursor.execute(f'PRAGMA {pragma} = {value}')
+            if connection.vendor == 'postgresql':
+                cursor.execute('RESET synchronous_commit')
+        with connection.schema_editor() as editor:
+            for index in Voter._meta.indexes:
+                editor.add_index(Voter, index)
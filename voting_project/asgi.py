@@ -3,6 +3,10 @@ ASGI config for voting_project project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+HTTP requests go to Django; WebSocket connections to ``/ws/results/`` get
+live tally updates (see ``votes_app.live``). Run it with an ASGI server, e.g.
+``uvicorn voting_project.asgi:application``.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -13,4 +17,24 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'voting_project.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported after Django is set up, since it loads models
+from votes_app.live import LIVE_WEBSOCKET_PATH, websocket_results  # noqa: E402
+from votes_app.render_farm import start_with_first_request  # noqa: E402
+
+# Spawn and warm the chart render workers with this process's first request,
+# so the first chart request doesn't wait for them
+start_with_first_request()
+
+
+async def application(scope, receive, send):
+    """Route live results WebSockets to votes_app.live and the rest to Django."""
+    if scope['type'] == 'websocket':
+        if scope['path'] == LIVE_WEBSOCKET_PATH:
+            await websocket_results(scope, receive, send)
+        else:
+            await receive()
+            await send({'type': 'websocket.close'})
+        return
+    await django_application(scope, receive, send)
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -41,6 +42,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so the time spent in the other middleware is measured too
+    'votes_app.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -72,14 +75,64 @@ WSGI_APPLICATION = 'voting_project.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
+#
+# Chosen by the environment (compare configurations with
+# ``python -m benchmarks.bench_writers``). DB_ENGINE selects the backend:
+# - sqlite (default): DB_NAME is the database file. Every new connection
+#   switches to WAL (readers stop blocking the writer), waits up to
+#   DB_BUSY_TIMEOUT_MS for the write lock instead of failing with "database
+#   is locked", syncs only at checkpoints (synchronous=NORMAL, still durable
+#   against application crashes in WAL mode) and memory-maps up to
+#   DB_MMAP_SIZE bytes. Transactions start with BEGIN IMMEDIATE so concurrent
+#   writers queue on the busy timeout rather than failing a lock upgrade.
+#   DB_SQLITE_TUNING=0 keeps SQLite's defaults.
+# - postgresql: DB_NAME, DB_USER, DB_PASSWORD, DB_HOST and DB_PORT (needs
+#   psycopg 3). Set DB_POOL_MAX_SIZE to use a psycopg connection pool per
+#   process (needs psycopg[pool]).
+# Without a pool, connections are kept open for DB_CONN_MAX_AGE seconds and
+# health-checked before being reused.
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {},
     }
 }
 
+if os.environ.get('DB_ENGINE', 'sqlite') == 'postgresql':
+    DATABASES['default'].update({
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.environ.get('DB_NAME', 'voting'),
+        'USER': os.environ.get('DB_USER', ''),
+        'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+        'HOST': os.environ.get('DB_HOST', ''),
+        'PORT': os.environ.get('DB_PORT', ''),
+    })
+    if os.environ.get('DB_POOL_MAX_SIZE'):
+        # Django refuses pooling together with persistent connections
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+            'max_size': int(os.environ['DB_POOL_MAX_SIZE']),
+            'timeout': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+        }
+else:
+    DATABASES['default'].update({
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get('DB_NAME') or BASE_DIR / 'db.sqlite3',
+    })
+    if os.environ.get('DB_SQLITE_TUNING', '1') != '0':
+        DATABASES['default']['OPTIONS'] = {
+            'init_command': ';'.join([
+                'PRAGMA journal_mode=WAL',
+                f"PRAGMA busy_timeout={int(os.environ.get('DB_BUSY_TIMEOUT_MS', 20000))}",
+                'PRAGMA synchronous=NORMAL',
+                f"PRAGMA mmap_size={int(os.environ.get('DB_MMAP_SIZE', 256 * 1024 * 1024))}",
+            ]),
+            'transaction_mode': 'IMMEDIATE',
+        }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -122,6 +175,112 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'  # Directory for collected static files
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Bearer token required by the bulk ballot upload endpoint (disabled if empty)
+BALLOT_IMPORT_TOKEN = os.environ.get('BALLOT_IMPORT_TOKEN', '')
+
+# Rendered chart cache (see votes_app.chart_cache). Set CHART_CACHE_DIR to
+# persist charts across worker restarts.
+CHART_CACHE = {
+    'MAX_ENTRIES': 64,
+    'MAX_BYTES': 32 * 1024 * 1024,
+    'DIRECTORY': os.environ.get('CHART_CACHE_DIR') or None,
+}
+
+# Chart render farm (see votes_app.render_farm): matplotlib runs in WORKERS
+# separate processes; at most MAX_QUEUE renders wait for a free worker and
+# callers wait TIMEOUT seconds before falling back to the last cached chart.
+CHART_RENDERER = {
+    'WORKERS': int(os.environ.get('CHART_RENDER_WORKERS', 2)),
+    'MAX_QUEUE': 8,
+    'TIMEOUT': 10.0,
+}
+
+# Live results push (see votes_app.live): updates are coalesced to at most
+# MAX_UPDATES_PER_SECOND, and other workers' votes are polled every
+# POLL_INTERVAL seconds.
+LIVE_RESULTS = {
+    'MAX_UPDATES_PER_SECOND': 2,
+    'POLL_INTERVAL': 1.0,
+    'KEEPALIVE': 15,
+}
+
+# Django caches. 'fragments' holds rendered page fragments; it is kept in
+# process memory unless FRAGMENT_CACHE_DIR points it at a directory, which
+# shares fragments (and their invalidation) between the worker processes of
+# a host.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'fragments': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'fragments',
+    },
+}
+if os.environ.get('FRAGMENT_CACHE_DIR'):
+    CACHES['fragments'] = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ['FRAGMENT_CACHE_DIR'],
+    }
+
+# Voter UID lookup cache (see votes_app.voter_cache): each process keeps up to
+# MAX_ENTRIES voters for TTL seconds. Set VOTER_CACHE_BACKEND to an alias in
+# CACHES (e.g. a shared Redis or Memcached cache) to share lookups between
+# worker processes.
+VOTER_CACHE = {
+    'MAX_ENTRIES': 4096,
+    'TTL': 60.0,
+    'BACKEND': os.environ.get('VOTER_CACHE_BACKEND') or None,
+}
+
+# Rendered fragment cache (see votes_app.fragments): the candidate options of
+# the voting form and the results and analytics pages are kept in the BACKEND
+# cache for up to TIMEOUT seconds, which also bounds how long other processes
+# can show a candidate edited through a process-local backend.
+FRAGMENT_CACHE = {
+    'BACKEND': os.environ.get('FRAGMENT_CACHE_BACKEND') or 'fragments',
+    'TIMEOUT': 300,
+}
+
+# Write-behind vote journal (see votes_app.journal). When PATH is set, the
+# vote view appends ballots to that file and acknowledges them once fsynced;
+# a background thread commits them in batches of up to BATCH_SIZE every
+# FLUSH_INTERVAL seconds. Only one process may ingest ballots in this mode.
+VOTE_JOURNAL = {
+    'PATH': os.environ.get('VOTE_JOURNAL_PATH') or None,
+    'BATCH_SIZE': 500,
+    'FLUSH_INTERVAL': 0.2,
+}
+
+# Vote audit log (see votes_app.audit): vote writes are staged and sealed
+# into the log in batches of up to SEAL_BATCH_SIZE, SEAL_DELAY seconds after
+# the first of them commits, so the log's head is locked once per batch.
+AUDIT_LOG = {
+    'SEAL_DELAY': 0.5,
+    'SEAL_BATCH_SIZE': 5000,
+}
+
+# Public results snapshot (see votes_app.snapshots): when ENABLED, the results
+# page, its tallies as JSON and the charts are published to DIRECTORY
+# DEBOUNCE seconds after the tallies change, and /results/ serves the
+# published page. Point the reverse proxy at DIRECTORY to serve it without
+# Django.
+RESULTS_SNAPSHOT = {
+    'ENABLED': os.environ.get('RESULTS_SNAPSHOT', '0') == '1',
+    'DIRECTORY': os.environ.get('RESULTS_SNAPSHOT_DIR') or MEDIA_ROOT / 'results',
+    'DEBOUNCE': 1.0,
+}
+
+# Request metrics (see votes_app.metrics): latency, queries, render time and
+# response size per view for a SAMPLE_RATE share of requests, served at
+# /metrics (behind a bearer TOKEN; without one, only when DEBUG is on) and in
+# Server-Timing headers.
+REQUEST_METRICS = {
+    'SAMPLE_RATE': float(os.environ.get('REQUEST_METRICS_SAMPLE_RATE', 1.0)),
+    'SERVER_TIMING': True,
+    'TOKEN': os.environ.get('REQUEST_METRICS_TOKEN', ''),
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
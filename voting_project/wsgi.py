@@ -14,3 +14,10 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'voting_project.settings')
 
 application = get_wsgi_application()
+
+# Imported after Django is set up, since it reads settings. Spawn and warm
+# the chart render workers with this process's first request, so the first
+# chart request doesn't wait for them
+from votes_app.render_farm import start_with_first_request  # noqa: E402
+
+start_with_first_request()